@@ -0,0 +1,438 @@
+#!/usr/bin/env python3
+
+# Attention: Do not import the ev3dev.ev3 module in this file
+import argparse
+import gc
+import json
+import math
+import random
+import statistics
+import sys
+import tracemalloc
+from time import perf_counter
+from typing import Dict, List, Optional, Tuple
+
+from planet import Planet, Direction
+from planet_generator import generate_planet, simulate_exploration
+
+
+def shortest_path_linear(planet: Planet, start: Tuple[int, int], target: Tuple[int, int]) -> Optional[
+        List[Tuple[Tuple[int, int], Direction]]]:
+    """
+    Reference implementation of the tutor shortest path with a linear minimum search (O(V^2))
+    Only used to compare the results and the runtime of Planet.shortest_path_tutor
+    """
+    if target == start:
+        return []
+    distance: Dict[Tuple[int, int], float] = dict()
+    predecessor: Dict[Tuple[int, int], Optional[Tuple[int, int]]] = dict()
+    all_paths = planet.get_paths()
+    unchecked_verts = set(all_paths.keys())
+    if target not in unchecked_verts:
+        return None
+    for tup in unchecked_verts:
+        distance[tup] = math.inf
+        predecessor[tup] = None
+    distance[start] = 0
+    while unchecked_verts:
+        cur_vertex = None
+        min_dist = math.inf
+        for tup in unchecked_verts:
+            if distance[tup] < min_dist:
+                min_dist = distance[tup]
+                cur_vertex = tup
+        if cur_vertex is None:
+            return None
+        unchecked_verts.remove(cur_vertex)
+        if cur_vertex == target:
+            break
+        for neighbor, weight in planet.get_neighbor_tutor(cur_vertex, all_paths):
+            if neighbor in unchecked_verts and distance[cur_vertex] + weight < distance[neighbor]:
+                distance[neighbor] = distance[cur_vertex] + weight
+                predecessor[neighbor] = cur_vertex
+    return planet.build_shortest_path_tutor(target, predecessor, all_paths)
+
+
+def direction_frontier_per_node(planet: Planet) -> Optional[Direction]:
+    """
+    Reference implementation of Planet.get_direction_djikstra_list with one shortest path query per frontier node
+    """
+    for dir in planet.paths[planet.start[0]]:
+        if planet.paths[planet.start[0]][dir][2] in [0, -2]:
+            return dir
+    unknown_node_distance: Dict[Tuple[int, int], int] = {}
+    unknown_node_dir: Dict[Tuple[int, int], Direction] = {}
+    for node in planet.get_paths_detected_unknown():
+        path_steps = planet.shortest_path_tutor(planet.start[0], node)
+        if path_steps is None:
+            continue
+        unknown_node_distance[node] = sum(planet.paths[step[0]][step[1]][2] for step in path_steps)
+        unknown_node_dir[node] = path_steps[0][1]
+    if unknown_node_distance == {}:
+        return None
+    return unknown_node_dir[min(unknown_node_distance, key=unknown_node_distance.get)]
+
+
+def explored_start_nodes(planet: Planet, count: int, seed: int) -> List[Tuple[int, int]]:
+    """
+    Returns up to count random nodes without unexplored paths, the frontier search starts at such nodes
+    """
+    nodes = [node for node in planet.paths if not planet.has_unexplored_path(node)]
+    random.Random(seed).shuffle(nodes)
+    return nodes[:count]
+
+
+def bench_frontier(sizes: List[int], queries: int, seed: int):
+    """
+    Compares the single search of Planet.get_direction_djikstra_list with one search per frontier node
+    """
+    print(f"{'nodes':>8} {'single [ms]':>12} {'per node [ms]':>14} {'speedup':>8}")
+    for size in sizes:
+        planet = generate_planet(size, seed, explored=0.5)
+        starts = explored_start_nodes(planet, queries, seed)
+
+        single_results = []
+        begin = perf_counter()
+        for node in starts:
+            planet.set_start(node, Direction.NORTH)
+            single_results.append(planet.get_direction_djikstra_list())
+        single_time = (perf_counter() - begin) / len(starts)
+
+        per_node_results = []
+        begin = perf_counter()
+        for node in starts:
+            planet.set_start(node, Direction.NORTH)
+            per_node_results.append(direction_frontier_per_node(planet))
+        per_node_time = (perf_counter() - begin) / len(starts)
+
+        if single_results != per_node_results:
+            raise AssertionError(f"Different directions on planet with {size} nodes")
+        print(f"{size:>8} {single_time * 1000:>12.3f} {per_node_time * 1000:>14.3f} "
+              f"{per_node_time / single_time:>8.1f}")
+
+
+def bench_explore(sizes: List[int], seed: int):
+    """
+    Compares a complete exploration with Planet.get_direction_djikstra_list and Planet.dfs
+    """
+    print(f"{'nodes':>8} {'strategy':>10} {'paths':>8} {'weight':>10} {'per decision [ms]':>18}")
+    for size in sizes:
+        truth = generate_planet(size, seed)
+        for use_dfs in (False, True):
+            begin = perf_counter()
+            _, driven = simulate_exploration(truth, (0, 0), use_dfs)
+            per_decision = (perf_counter() - begin) / (len(driven) + 1)
+            weight = sum(truth.paths[node][dir][2] for node, dir in driven)
+            print(f"{size:>8} {'dfs' if use_dfs else 'djikstra':>10} {len(driven):>8} {weight:>10} "
+                  f"{per_decision * 1000:>18.3f}")
+
+
+def planet_memory(size: int, seed: int, compact: bool) -> int:
+    """
+    Returns the bytes allocated by a generated, half explored planet
+    """
+    tracemalloc.start()
+    planet = generate_planet(size, seed, explored=0.5, compact=compact)
+    allocated, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del planet
+    return allocated
+
+
+def bench_memory(sizes: List[int], seed: int):
+    """
+    Compares the memory of the dict storage and the CompactPaths storage of Planet
+    """
+    print(f"{'nodes':>8} {'dict [B/node]':>14} {'compact [B/node]':>17} {'reduction':>10}")
+    for size in sizes:
+        dict_memory = planet_memory(size, seed, compact=False)
+        compact_memory = planet_memory(size, seed, compact=True)
+        print(f"{size:>8} {dict_memory / size:>14.0f} {compact_memory / size:>17.0f} "
+              f"{1 - compact_memory / dict_memory:>10.0%}")
+
+
+def route_weight(planet: Planet, route: Optional[List[Tuple[Tuple[int, int], Direction]]]) -> Optional[int]:
+    """
+    Returns the summed weight of a route
+    """
+    if route is None:
+        return None
+    return sum(planet.paths[node][dir][2] for node, dir in route)
+
+
+def long_range_pairs(planet: Planet, count: int, seed: int) -> List[Tuple[Tuple[int, int], Tuple[int, int]]]:
+    """
+    Returns random node pairs in opposite quarters of a generated planet
+    """
+    rng = random.Random(seed)
+    nodes = list(planet.paths)
+    width = max(x for x, _ in nodes) + 1
+    low = [node for node in nodes if node[0] < width / 4 and node[1] < width / 4]
+    high = [node for node in nodes if node[0] >= 3 * width / 4 and node[1] >= 3 * width / 4]
+    return [(rng.choice(low), rng.choice(high)) for _ in range(count)]
+
+
+def compare_strategies(sizes: List[int], queries: int, seed: int, strategies: List[str]):
+    """
+    Compares expanded nodes and runtime of Planet.shortest_path strategies on long-range queries
+    """
+    print(f"{'nodes':>8} {'strategy':>14} {'expanded':>10} {'time [ms]':>10}")
+    for size in sizes:
+        planet = generate_planet(size, seed, min_weight=10, max_weight=20)
+        pairs = long_range_pairs(planet, queries, seed)
+        weights = None
+        for strategy in strategies:
+            expanded = 0
+            results = []
+            begin = perf_counter()
+            for start, target in pairs:
+                results.append(route_weight(planet, planet.shortest_path(start, target, strategy)))
+                expanded += planet.expanded_nodes
+            duration = (perf_counter() - begin) / queries
+            if weights is not None and results != weights:
+                raise AssertionError(f"{strategy} returned longer routes on planet with {size} nodes")
+            weights = results
+            print(f"{size:>8} {strategy:>14} {expanded / queries:>10.0f} {duration * 1000:>10.3f}")
+
+
+def mission_time(truth: Planet, driven: List[Tuple[Tuple[int, int], Direction]], seconds_per_weight: float,
+                 seconds_per_turn: float, heading: Direction = Direction.NORTH) -> float:
+    """
+    Estimates the driving time of all driven paths including the 90 degree turns at the nodes
+    """
+    seconds = 0.0
+    for node, direction in driven:
+        end_direction, weight = truth.paths[node][direction][1:]
+        seconds += weight * seconds_per_weight + ((direction - heading) % 360) // 90 * seconds_per_turn
+        heading = Direction((end_direction + 180) % 360)
+    return seconds
+
+
+def bench_turns(sizes: List[int], seed: int, seconds_per_weight: float, seconds_per_turn: float):
+    """
+    Compares the estimated mission time of an exploration with and without turn costs
+    """
+    turn_cost = seconds_per_turn / seconds_per_weight
+    print(f"{'nodes':>8} {'turn cost':>10} {'paths':>8} {'mission [s]':>12} {'per decision [ms]':>18}")
+    for size in sizes:
+        truth = generate_planet(size, seed)
+        for cost in (0.0, turn_cost):
+            begin = perf_counter()
+            _, driven = simulate_exploration(truth, (0, 0), turn_cost=cost)
+            per_decision = (perf_counter() - begin) / (len(driven) + 1)
+            seconds = mission_time(truth, driven, seconds_per_weight, seconds_per_turn)
+            print(f"{size:>8} {cost:>10.1f} {len(driven):>8} {seconds:>12.0f} {per_decision * 1000:>18.3f}")
+
+
+SUITE_PLANET = dict(explored=0.5, self_loop_chance=0.1, blocked_chance=0.1, island_share=0.05)
+"""Parameters of generate_planet for the benchmark suite"""
+
+
+def suite_calls(planet: Planet, queries: int, seed: int) -> Dict[str, List]:
+    """
+    Returns the calls measured by the benchmark suite for a planet, every call is a function without arguments
+    """
+    rng = random.Random(seed)
+    nodes = list(planet.get_paths())
+    starts = explored_start_nodes(planet, queries, seed) or nodes[:queries]
+    pairs = [(rng.choice(nodes), rng.choice(nodes)) for _ in range(queries)]
+
+    def next_direction(start: Tuple[int, int], target: Tuple[int, int]):
+        def call():
+            planet.set_start(start, Direction.NORTH)
+            planet.target = target
+            planet.version += 1  # measure planning, not the route cache
+            return planet.get_next_direction()
+        return call
+
+    def frontier_direction(start: Tuple[int, int]):
+        def call():
+            planet.set_start(start, Direction.NORTH)
+            planet.target = None
+            return planet.get_direction_djikstra_list()
+        return call
+
+    return {
+        "shortest_path_tutor": [lambda start=start, target=target: planet.shortest_path_tutor(start, target)
+                                for start, target in pairs],
+        "get_direction_djikstra_list": [frontier_direction(start) for start in starts],
+        "get_next_direction": [next_direction(start, target) for start, target in pairs],
+    }
+
+
+def call_latency(call, repeat: int) -> float:
+    """
+    Returns the fastest of repeat runs of call after one warm-up run, like timeit, slower runs measure other load
+    As in timeit the garbage collector is off while timing, its pauses depend on the earlier calls.
+    """
+    call()
+    fastest = math.inf
+    gc.disable()
+    try:
+        for _ in range(repeat):
+            begin = perf_counter()
+            call()
+            fastest = min(fastest, perf_counter() - begin)
+    finally:
+        gc.enable()
+    return fastest
+
+
+def run_suite(sizes: List[int], queries: int, seed: int, repeat: int = 7) -> Dict[str, Dict[str, float]]:
+    """
+    Measures the latency and the peak memory of every planning call on generated planets
+    The latency of a call is the median over the queries of the fastest of repeat runs per query.
+    :return: Dict[case, Dict[metric, value]], the case is "<call>/<nodes>"
+    """
+    results: Dict[str, Dict[str, float]] = {}
+    for size in sizes:
+        planet = generate_planet(size, seed, **SUITE_PLANET)
+        for name, calls in suite_calls(planet, queries, seed).items():
+            latencies = [call_latency(call, repeat) for call in calls]
+            # peak memory of a single call, traced separately because tracemalloc slows down the calls
+            tracemalloc.start()
+            calls[0]()
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            results[f"{name}/{size}"] = {"latency_ms": statistics.median(latencies) * 1000, "peak_kib": peak / 1024}
+        tracemalloc.start()
+        generate_planet(size, seed, **SUITE_PLANET)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        results[f"generate_planet/{size}"] = {"peak_kib": peak / 1024}
+    return results
+
+
+def compare_baseline(results: Dict[str, Dict[str, float]], baseline: Dict[str, Dict[str, float]],
+                     tolerance: float, min_latency_delta: float = 0.05) -> List[str]:
+    """
+    Returns a description of every metric which is worse than the baseline by more than tolerance
+    Latencies must also be worse by more than min_latency_delta milliseconds, smaller differences of the calls on
+    small planets are noise of the scheduler.
+    """
+    regressions = []
+    for case, metrics in results.items():
+        for metric, value in metrics.items():
+            reference = baseline.get(case, {}).get(metric)
+            if reference is None or metric == "latency_ms" and value - reference <= min_latency_delta:
+                continue
+            if value > reference * (1 + tolerance):
+                regressions.append(f"{case} {metric}: {value:.3f} (baseline {reference:.3f})")
+    return regressions
+
+
+def bench_suite(sizes: List[int], queries: int, seed: int, repeat: int, output: Optional[str],
+                baseline: Optional[str], tolerance: float) -> int:
+    """
+    Runs the benchmark suite, optionally saves the results as baseline or compares them with a baseline
+    :return: Integer: exit code, 1 if a regression was found
+    """
+    results = run_suite(sizes, queries, seed, repeat)
+    print(f"{'case':>36} {'latency [ms]':>13} {'peak [KiB]':>11}")
+    for case, metrics in results.items():
+        latency = metrics.get("latency_ms")
+        print(f"{case:>36} {'-' if latency is None else f'{latency:.3f}':>13} {metrics['peak_kib']:>11.1f}")
+    if output is not None:
+        with open(output, mode="w") as file:
+            json.dump({"seed": seed, "queries": queries, "repeat": repeat, "results": results}, file, indent=2)
+    if baseline is not None:
+        with open(baseline, mode="r") as file:
+            regressions = compare_baseline(results, json.load(file)["results"], tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        return 1 if regressions else 0
+    return 0
+
+
+def bench_dijkstra(sizes: List[int], queries: int, seed: int):
+    """
+    Compares Planet.shortest_path_tutor with the linear reference implementation
+    """
+    print(f"{'nodes':>8} {'heap [ms]':>12} {'linear [ms]':>12} {'speedup':>8}")
+    for size in sizes:
+        planet = generate_planet(size, seed)
+        rng = random.Random(seed)
+        nodes = list(planet.paths)
+        pairs = [(rng.choice(nodes), rng.choice(nodes)) for _ in range(queries)]
+
+        begin = perf_counter()
+        heap_results = [planet.shortest_path_tutor(start, target) for start, target in pairs]
+        heap_time = (perf_counter() - begin) / queries
+
+        begin = perf_counter()
+        linear_results = [shortest_path_linear(planet, start, target) for start, target in pairs]
+        linear_time = (perf_counter() - begin) / queries
+
+        if heap_results != linear_results:
+            raise AssertionError(f"Different routes on planet with {size} nodes")
+        print(f"{size:>8} {heap_time * 1000:>12.3f} {linear_time * 1000:>12.3f} {linear_time / heap_time:>8.1f}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmarks for the planning algorithms of the robot")
+    subparsers = parser.add_subparsers(dest="benchmark", required=True)
+
+    dijkstra_parser = subparsers.add_parser("dijkstra", help="heap Dijkstra vs. linear minimum search")
+    dijkstra_parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 10000])
+    dijkstra_parser.add_argument("--queries", type=int, default=3)
+    dijkstra_parser.add_argument("--seed", type=int, default=0)
+
+    frontier_parser = subparsers.add_parser("frontier", help="single frontier search vs. one search per node")
+    frontier_parser.add_argument("--sizes", type=int, nargs="+", default=[100, 400, 1000])
+    frontier_parser.add_argument("--queries", type=int, default=3)
+    frontier_parser.add_argument("--seed", type=int, default=0)
+
+    explore_parser = subparsers.add_parser("explore", help="exploration with djikstra list vs. dfs")
+    explore_parser.add_argument("--sizes", type=int, nargs="+", default=[100, 400, 1000])
+    explore_parser.add_argument("--seed", type=int, default=0)
+
+    memory_parser = subparsers.add_parser("memory", help="dict storage vs. CompactPaths storage")
+    memory_parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 10000, 50000])
+    memory_parser.add_argument("--seed", type=int, default=0)
+
+    astar_parser = subparsers.add_parser("astar", help="expanded nodes of A* vs. Dijkstra on long-range targets")
+    astar_parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 10000])
+    astar_parser.add_argument("--queries", type=int, default=10)
+    astar_parser.add_argument("--seed", type=int, default=0)
+
+    bidirectional_parser = subparsers.add_parser("bidirectional",
+                                                 help="expanded nodes of bidirectional vs. one-directional Dijkstra")
+    bidirectional_parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 10000])
+    bidirectional_parser.add_argument("--queries", type=int, default=10)
+    bidirectional_parser.add_argument("--seed", type=int, default=0)
+
+    turns_parser = subparsers.add_parser("turns", help="mission time of an exploration with and without turn costs")
+    turns_parser.add_argument("--sizes", type=int, nargs="+", default=[100, 400, 1000])
+    turns_parser.add_argument("--seed", type=int, default=0)
+    turns_parser.add_argument("--seconds-per-weight", type=float, default=0.5)
+    # Follow.turn: 280 motor degrees at 200 degrees per second, polled every 100 ms
+    turns_parser.add_argument("--seconds-per-turn", type=float, default=1.5)
+
+    suite_parser = subparsers.add_parser("suite", help="latency and memory of all planning calls, JSON baseline")
+    suite_parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000, 10000, 50000])
+    suite_parser.add_argument("--queries", type=int, default=5)
+    suite_parser.add_argument("--seed", type=int, default=0)
+    suite_parser.add_argument("--repeat", type=int, default=7, help="timed runs per query after a warm-up run")
+    suite_parser.add_argument("--output", help="save the results as JSON baseline")
+    suite_parser.add_argument("--baseline", help="compare the results with this JSON baseline, e.g. "
+                                                 "../benchmark_baseline.json")
+    suite_parser.add_argument("--tolerance", type=float, default=0.25, help="allowed relative regression")
+
+    args = parser.parse_args()
+    if args.benchmark == "dijkstra":
+        bench_dijkstra(args.sizes, args.queries, args.seed)
+    elif args.benchmark == "frontier":
+        bench_frontier(args.sizes, args.queries, args.seed)
+    elif args.benchmark == "explore":
+        bench_explore(args.sizes, args.seed)
+    elif args.benchmark == "memory":
+        bench_memory(args.sizes, args.seed)
+    elif args.benchmark == "astar":
+        compare_strategies(args.sizes, args.queries, args.seed, ["tutor", "astar"])
+    elif args.benchmark == "bidirectional":
+        compare_strategies(args.sizes, args.queries, args.seed, ["tutor", "bidirectional"])
+    elif args.benchmark == "turns":
+        bench_turns(args.sizes, args.seed, args.seconds_per_weight, args.seconds_per_turn)
+    elif args.benchmark == "suite":
+        sys.exit(bench_suite(args.sizes, args.queries, args.seed, args.repeat, args.output, args.baseline,
+                             args.tolerance))
@@ -0,0 +1,434 @@
+#!/usr/bin/env python3
+
+# Attention: Do not import the ev3dev.ev3 module in this file
+import argparse
+import json
+import logging
+import random
+import statistics
+import threading
+import timeit
+import unittest.mock
+from concurrent.futures import Future
+from time import monotonic, perf_counter, process_time, sleep
+from typing import List
+
+import paho.mqtt.client as mqtt
+
+from codec import encode_message, encode_path, encode_path_select, encode_ready, load_codec, stdlib_codec
+from communication import Communication
+from mothership import LocalClient, LocalMothership, explore, load_planet
+from planet import Planet, Direction
+from planet_generator import generate_planet
+
+
+class EchoClient:
+    """
+    Stand-in for paho.mqtt.client.Client which echoes every published message after a delay in its own thread,
+    like the mothership does
+    """
+
+    def __init__(self, delay: float, work: int = 0):
+        """
+        :param delay: Float: seconds until the echo arrives
+        :param work: Integer: JSON round trips done by the network thread before delivering, simulates paho's work
+        """
+        self.delay = delay
+        self.work = work
+        self.on_message = None
+        self.on_connect = None
+        self.on_disconnect = None
+        # time at which the echo was due, the network thread may be late if it does not get the CPU
+        self.due_at: List[float] = []
+
+    def publish(self, topic, payload=None, qos=0):
+        self.due_at.append(perf_counter() + self.delay)
+        threading.Timer(self.delay, self.deliver, (topic, payload)).start()
+
+    def deliver(self, topic, payload):
+        for _ in range(self.work):
+            json.loads(json.dumps(json.loads(payload)))
+        message = mqtt.MQTTMessage(topic=topic.encode())
+        message.payload = payload.encode() if isinstance(payload, str) else payload
+        self.on_message(self, None, message)
+
+    def tls_set(self, *args, **kwargs):
+        pass
+
+    def enable_logger(self, *args, **kwargs):
+        pass
+
+    def username_pw_set(self, *args, **kwargs):
+        pass
+
+    def connect(self, *args, **kwargs):
+        pass
+
+    def connect_async(self, *args, **kwargs):
+        self.on_connect(self, None, {}, 0)
+
+    def reconnect_delay_set(self, *args, **kwargs):
+        pass
+
+    def subscribe(self, *args, **kwargs):
+        pass
+
+    def loop_start(self):
+        pass
+
+
+class LossyClient(EchoClient):
+    """
+    EchoClient which loses messages and its connection on demand
+    """
+
+    def __init__(self, delay: float, lose: int = 0):
+        """
+        :param delay: Float: seconds until the echo arrives
+        :param lose: Integer: number of the next published messages which get lost
+        """
+        super().__init__(delay)
+        self.lose = lose
+        self.online = True
+        self.published = 0
+
+    def publish(self, topic, payload=None, qos=0):
+        self.published += 1
+        if not self.online or self.lose > 0:
+            self.lose -= 1
+            return
+        super().publish(topic, payload, qos)
+
+    def drop_connection(self, seconds: float):
+        """
+        Disconnects now and reconnects after seconds, like paho's network thread after a Wi-Fi drop
+        """
+        self.online = False
+        self.on_disconnect(self, None, 1)
+        threading.Timer(seconds, self.reconnect).start()
+
+    def reconnect(self):
+        self.online = True
+        self.on_connect(self, None, {}, 0)
+
+
+class CorrectingClient(EchoClient):
+    """
+    EchoClient which answers a pathSelect message with a correction to another direction, like the mothership does
+    if the selected path is already known to lead somewhere else
+    """
+
+    def __init__(self, delay: float, correction_chance: float, seed: int = 0):
+        """
+        :param delay: Float: seconds until the echo and the correction arrive
+        :param correction_chance: Float: probability of a correction per pathSelect message
+        """
+        super().__init__(delay)
+        self.correction_chance = correction_chance
+        self.rng = random.Random(seed)
+
+    def publish(self, topic, payload=None, qos=0):
+        super().publish(topic, payload, qos)
+        message = json.loads(payload)
+        if message["type"] == "pathSelect" and self.rng.random() < self.correction_chance:
+            correction = dict(message["payload"], startDirection=(message["payload"]["startDirection"] + 90) % 360)
+            correction = json.dumps({"from": "server", "type": "pathSelect", "payload": correction})
+            threading.Timer(self.delay, self.deliver, (topic, correction)).start()
+
+
+class SpinningCommunication(Communication):
+    """
+    Communication with the busy waiting of former versions, reference for the measurements
+    """
+
+    def wait_for(self, future: Future, description: str):
+        while not future.done():
+            continue
+        return future.result()
+
+
+def create_communication(client: EchoClient, spinning: bool = False) -> Communication:
+    """
+    Creates a Communication which uses client instead of a connection to the mothership
+    """
+    logger = logging.getLogger('RoboLab')
+    cls = SpinningCommunication if spinning else Communication
+    with unittest.mock.patch("communication.mqtt.Client", return_value=client):
+        communication = cls(None, '217', logger, Planet())
+    communication.debug.debug_lvl = 0
+    communication.planet.debug.debug_lvl = 0
+    return communication
+
+
+def bench_waits(exchanges: int, delay: float, work: int):
+    """
+    Measures the CPU use and the reply latency of send_robot_message with busy and with event based waiting
+
+    The latency is the time from the moment the echo was due until send_robot_message returns.
+    """
+    print(f"{'waiting':>8} {'CPU [%]':>8} {'latency median [ms]':>20} {'latency max [ms]':>17}")
+    payload = json.dumps({"from": "client", "type": "ready"})
+    for spinning in (True, False):
+        client = EchoClient(delay, work)
+        communication = create_communication(client, spinning)
+        latencies = []
+        begin_wall = perf_counter()
+        begin_cpu = process_time()
+        for _ in range(exchanges):
+            communication.send_robot_message(payload, "explorer/217")
+            latencies.append(perf_counter() - client.due_at[-1])
+            sleep(0.001)
+        cpu = (process_time() - begin_cpu) / (perf_counter() - begin_wall)
+        print(f"{'busy' if spinning else 'event':>8} {cpu * 100:>8.1f} {statistics.median(latencies) * 1000:>20.3f} "
+              f"{max(latencies) * 1000:>17.3f}")
+
+
+def bench_quiet(windows: int, quiet_period: float):
+    """
+    Measures the CPU use and how late timeout() returns after the end of the correction window
+    """
+    communication = create_communication(EchoClient(0))
+    communication.quiet_period = quiet_period
+    late = []
+    begin_wall = perf_counter()
+    begin_cpu = process_time()
+    for _ in range(windows):
+        communication.last_connection_time = monotonic()
+        communication.timeout()
+        late.append(monotonic() - communication.last_connection_time - quiet_period)
+    cpu = (process_time() - begin_cpu) / (perf_counter() - begin_wall)
+    print(f"CPU: {cpu * 100:.1f} %, returned late by {statistics.median(late) * 1000:.3f} ms (median), "
+          f"{max(late) * 1000:.3f} ms (max)")
+
+
+def bench_outage(exchanges: int, outage: float):
+    """
+    Sends messages while the connection drops for outage seconds, reports retries and the seconds until the echo
+    """
+    client = LossyClient(0.01)
+    communication = create_communication(client)
+    payload = json.dumps({"from": "client", "type": "ready"})
+    begin = perf_counter()
+    for exchange in range(exchanges):
+        if exchange == exchanges // 2:
+            client.drop_connection(outage)
+        elif exchange == exchanges // 2 + 1:
+            # this message is lost before paho noticed the connection is gone, it is sent again after the reconnect
+            client.lose = 1
+            echo = communication.publish("ready", payload, "explorer/217")
+            client.drop_connection(outage)
+            communication.wait_for(echo, "echo of the sent message")
+            continue
+        communication.send_robot_message(payload, "explorer/217")
+    stats = communication.outbox.stats()
+    print(f"{exchanges} messages in {perf_counter() - begin:.2f} s with an outage of {outage:.2f} s: "
+          f"{stats['published']} publishes, {stats['retries']} retries")
+    print(f"seconds until the echo: median {stats['latency_median']:.3f}, max {stats['latency_max']:.3f}")
+
+
+def bench_speculation(nodes: int, quiet_period: float, correction_chance: float, rollback: float):
+    """
+    Compares the seconds from the path selection until the robot drives off, waiting for the correction window
+    against driving off at once and returning to the node after a correction
+    """
+    print(f"{'mode':>11} {'seconds per node':>17} {'wrong':>6}")
+    for speculative in (False, True):
+        communication = create_communication(CorrectingClient(0.01, correction_chance))
+        communication.quiet_period = quiet_period
+        communication.planet.planet_name = "Bench"
+        communication.planet.set_start((0, 0), 0)
+        total = 0.0
+        wrong = 0
+        for _ in range(nodes):
+            begin = perf_counter()
+            if speculative:
+                correction = communication.speculate_path_select(((0, 0), 0))
+                total += perf_counter() - begin
+                if correction.result() is not None:
+                    # the robot drove for the whole window, drives back and turns into the corrected path
+                    wrong += 1
+                    total += quiet_period + rollback
+            else:
+                communication.send_path_select(((0, 0), 0))
+                total += perf_counter() - begin
+        rate = f"{wrong / nodes:.0%}" if speculative else "-"
+        print(f"{'speculative' if speculative else 'waiting':>11} {total / nodes:>17.3f} {rate:>6}")
+
+
+def bench_mission(nodes: int, planet_file: str, latency: float, quiet_period: float, correction_chance: float,
+                  unveil_chance: float):
+    """
+    Explores a planet end to end through Communication and a local mothership, reports wall and CPU time
+    """
+    if planet_file:
+        truth, name, start, target = load_planet(planet_file)
+    else:
+        truth, name, target = generate_planet(nodes, blocked_chance=0.2), "Bench", None
+        start = ((0, 0), Direction.NORTH)
+    mothership = LocalMothership(truth, name, start, target, correction_chance, unveil_chance)
+    planet = Planet()
+    planet.debug.debug_lvl = 0
+    communication = Communication(LocalClient(mothership, latency), '217', logging.getLogger('RoboLab'), planet,
+                                  reply_timeout=10, quiet_period=quiet_period, tls=False)
+    communication.debug.debug_lvl = 0
+    begin_wall = perf_counter()
+    begin_cpu = process_time()
+    driven = explore(communication, mothership)
+    wall = perf_counter() - begin_wall
+    cpu = process_time() - begin_cpu
+    messages = sum(mothership.received.values())
+    print(f"{len(driven)} paths driven, {messages} messages sent, error: {communication.error_msg_received}")
+    print(f"wall: {wall:.3f} s ({wall / max(len(driven), 1) * 1000:.3f} ms per path), CPU: {cpu:.3f} s")
+
+
+def bench_codec(number: int):
+    """
+    Measures encode and decode throughput per message type: building a dict and json.dumps against the payload
+    templates, and json.loads against the installed codecs
+    """
+    start = ((12, -3), Direction.EAST)
+    target = ((13, -3), Direction.WEST)
+    encoders = {
+        "ready": (lambda: json.dumps({"from": "client", "type": "ready"}), encode_ready),
+        "path": (lambda: json.dumps({"from": "client", "type": "path", "payload": {
+            "startX": start[0][0], "startY": start[0][1], "startDirection": start[1], "endX": target[0][0],
+            "endY": target[0][1], "endDirection": target[1], "pathStatus": "free"}}),
+                 lambda: encode_path(start, target, "free")),
+        "pathSelect": (lambda: json.dumps({"from": "client", "type": "pathSelect", "payload": {
+            "startX": start[0][0], "startY": start[0][1], "startDirection": start[1]}}),
+                       lambda: encode_path_select(start)),
+        "targetReached": (lambda: json.dumps({"from": "client", "type": "targetReached",
+                                              "payload": {"message": "Finish"}}),
+                          lambda: encode_message("targetReached")),
+    }
+    print(f"encode [messages/s] {'dict + json':>12} {'template':>10}")
+    for name, (legacy, template) in encoders.items():
+        rates = [number / timeit.timeit(encode, number=number) for encode in (legacy, template)]
+        print(f"{name:>19} {rates[0]:>12.0f} {rates[1]:>10.0f}")
+
+    messages = {message["type"]: json.dumps(message).encode() for message in (
+        {"from": "server", "type": "planet",
+         "payload": {"planetName": "Anin", "startX": 12, "startY": -3, "startOrientation": 90}},
+        {"from": "server", "type": "path", "payload": {
+            "startX": 12, "startY": -3, "startDirection": 90, "endX": 13, "endY": -3, "endDirection": 270,
+            "pathStatus": "free", "pathWeight": 3}},
+        {"from": "server", "type": "pathSelect", "payload": {"startDirection": 180}},
+        {"from": "server", "type": "done", "payload": {"message": "Target reached!"}},
+    )}
+    codecs = [stdlib_codec()] + [codec for codec in (load_codec((name,)) for name in ("orjson", "ujson"))
+                                 if codec.name != "json"]
+    print("decode [messages/s] " + " ".join(f"{codec.name:>10}" for codec in codecs))
+    for name, payload in messages.items():
+        rates = [number / timeit.timeit(lambda: codec.loads(payload), number=number) for codec in codecs]
+        print(f"{name:>19} " + " ".join(f"{rate:>10.0f}" for rate in rates))
+
+
+class UncheckedValidator:
+    """
+    Validator which only splits the message, reference for the cost of the validation
+    """
+
+    def validate(self, message):
+        return message["from"], message["type"], message.get("payload", {})
+
+
+def server_traffic(node_count: int) -> List[mqtt.MQTTMessage]:
+    """
+    Encodes the messages the mothership sends while a generated planet is unveiled: the planet message, then
+    pathUnveiled, target and pathSelect messages for every path
+    """
+    truth = generate_planet(node_count)
+    start = next(iter(truth.get_paths()))
+    payloads = [{"from": "server", "type": "planet",
+                 "payload": {"planetName": "Bench", "startX": start[0], "startY": start[1], "startOrientation": 0}}]
+    for node, paths in truth.get_paths().items():
+        for direction, (target, target_direction, weight) in paths.items():
+            payloads.append({"from": "server", "type": "pathUnveiled", "payload": {
+                "startX": node[0], "startY": node[1], "startDirection": int(direction),
+                "endX": target[0], "endY": target[1], "endDirection": int(target_direction), "pathWeight": weight}})
+            payloads.append({"from": "server", "type": "target", "payload": {"targetX": node[0], "targetY": node[1]}})
+            payloads.append({"from": "server", "type": "pathSelect", "payload": {
+                "startX": node[0], "startY": node[1], "startDirection": int(direction)}})
+    messages = []
+    for payload in payloads:
+        message = mqtt.MQTTMessage(topic=b"planet/Bench/217")
+        message.payload = json.dumps(payload).encode()
+        messages.append(message)
+    return messages
+
+
+def bench_dispatch(node_count: int, rounds: int):
+    """
+    Measures how many server messages per second on_message handles, with and without validation
+    """
+    messages = server_traffic(node_count)
+    print(f"{len(messages)} messages per round")
+    for name, validator in (("unchecked", UncheckedValidator()), ("validated", None)):
+        best = float("inf")
+        for _ in range(rounds):
+            communication = create_communication(unittest.mock.MagicMock())
+            if validator is not None:
+                communication.validator = validator
+            begin = perf_counter()
+            for message in messages:
+                communication.on_message(None, None, message)
+            best = min(best, perf_counter() - begin)
+        print(f"{name:>9}: {len(messages) / best:>10.0f} messages/s")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmarks for the communication with the mothership")
+    subparsers = parser.add_subparsers(dest="benchmark", required=True)
+
+    waits_parser = subparsers.add_parser("waits", help="busy waiting vs. event based waiting for replies")
+    waits_parser.add_argument("--exchanges", type=int, default=50)
+    waits_parser.add_argument("--delay", type=float, default=0.05, help="seconds until the reply arrives")
+    waits_parser.add_argument("--work", type=int, default=200, help="JSON round trips of the network thread")
+
+    quiet_parser = subparsers.add_parser("quiet", help="CPU use and wake-up delay of the correction window wait")
+    quiet_parser.add_argument("--windows", type=int, default=10)
+    quiet_parser.add_argument("--quiet-period", type=float, default=0.2)
+
+    dispatch_parser = subparsers.add_parser("dispatch", help="messages per second through on_message")
+    dispatch_parser.add_argument("--nodes", type=int, default=200)
+    dispatch_parser.add_argument("--rounds", type=int, default=5)
+
+    speculation_parser = subparsers.add_parser("speculation", help="waiting for the correction window vs. "
+                                                                   "speculative driving")
+    speculation_parser.add_argument("--nodes", type=int, default=20)
+    speculation_parser.add_argument("--quiet-period", type=float, default=0.3)
+    speculation_parser.add_argument("--correction-chance", type=float, default=0.1)
+    speculation_parser.add_argument("--rollback", type=float, default=0.3,
+                                    help="seconds to turn around, to drive back and to turn again after a correction")
+
+    mission_parser = subparsers.add_parser("mission", help="exploration through a local mothership")
+    mission_parser.add_argument("--nodes", type=int, default=200, help="nodes of the generated planet")
+    mission_parser.add_argument("--planet", default="", help="planet definition instead of a generated planet")
+    mission_parser.add_argument("--latency", type=float, default=0.0, help="seconds until an answer arrives")
+    mission_parser.add_argument("--quiet-period", type=float, default=0.0)
+    mission_parser.add_argument("--correction-chance", type=float, default=0.0)
+    mission_parser.add_argument("--unveil-chance", type=float, default=0.0)
+
+    outage_parser = subparsers.add_parser("outage", help="retries and latency when the connection drops")
+    outage_parser.add_argument("--exchanges", type=int, default=20)
+    outage_parser.add_argument("--outage", type=float, default=0.5, help="seconds without connection")
+
+    codec_parser = subparsers.add_parser("codec", help="encode and decode throughput per message type")
+    codec_parser.add_argument("--number", type=int, default=100000)
+
+    args = parser.parse_args()
+    if args.benchmark == "waits":
+        bench_waits(args.exchanges, args.delay, args.work)
+    elif args.benchmark == "quiet":
+        bench_quiet(args.windows, args.quiet_period)
+    elif args.benchmark == "dispatch":
+        bench_dispatch(args.nodes, args.rounds)
+    elif args.benchmark == "speculation":
+        bench_speculation(args.nodes, args.quiet_period, args.correction_chance, args.rollback)
+    elif args.benchmark == "mission":
+        bench_mission(args.nodes, args.planet, args.latency, args.quiet_period, args.correction_chance,
+                      args.unveil_chance)
+    elif args.benchmark == "outage":
+        bench_outage(args.exchanges, args.outage)
+    elif args.benchmark == "codec":
+        bench_codec(args.number)
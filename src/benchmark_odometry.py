@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+
+# Attention: Do not import the ev3dev.ev3 module in this file
+import argparse
+import math
+import random
+from time import perf_counter, process_time
+from typing import List, Tuple
+
+import odometry
+from mothership import LocalMothership
+from odometry import Odometry
+from planet import Planet, Direction
+from planet_generator import generate_planet
+
+
+def generate_ticks(samples: int, seed: int = 0) -> List[Tuple[int, int]]:
+    """
+    Generates motor degree deltas (right, left) of a robot following a line at about 250 degree/s
+
+    The robot drives curves of random length and curvature, like on a path between two nodes.
+    :param samples: Integer: number of samples, the control loop takes about 100 samples per second
+    :param seed: Integer: seed for the random generator
+    :return: List of 2-Tuples
+    """
+    rng = random.Random(seed)
+    ticks = []
+    curvature = 0
+    while len(ticks) < samples:
+        if rng.random() < 0.02:
+            curvature = rng.randint(-2, 2)
+        base = rng.randint(2, 4)
+        ticks.append((base + curvature + rng.randint(-1, 1), base - curvature + rng.randint(-1, 1)))
+    return ticks
+
+
+def create_odometry(fixed_point: bool = False) -> Odometry:
+    odometry = Odometry(gamma=0, pos_x=0, pos_y=0, dist_btw_wheels=9.2, fixed_point=fixed_point)
+    odometry.debug.debug_lvl = 0
+    return odometry
+
+
+def bench_node(samples: int):
+    """
+    Compares the work at the node: replaying the movement list against finishing a path integrated while driving
+    """
+    ticks = generate_ticks(samples)
+    batch = create_odometry()
+    begin = perf_counter()
+    batch.calculate_new_position(ticks)
+    batch_time = perf_counter() - begin
+
+    streaming = create_odometry()
+    m1 = m2 = 0
+    begin = perf_counter()
+    for right, left in ticks:
+        m1 += right
+        m2 += left
+        streaming.add_sample(m1, m2)
+    driving_time = perf_counter() - begin
+    begin = perf_counter()
+    streaming.finish_path()
+    node_time = perf_counter() - begin
+    print(f"{samples} samples")
+    print(f"movement list: {batch_time * 1000:.3f} ms at the node")
+    print(f"streaming:     {node_time * 1000:.3f} ms at the node, {driving_time / samples * 1e6:.2f} us per sample "
+          f"while driving")
+    print(f"same pose: {(batch.posX, batch.posY, batch.gamma) == (streaming.posX, streaming.posY, streaming.gamma)}")
+
+
+def bench_batch(samples: int):
+    """
+    Compares replaying a tick log sample by sample with calculate_part against calculate_parts with numpy
+    """
+    if odometry.numpy is None:
+        raise SystemExit("numpy is not installed")
+    ticks = generate_ticks(samples)
+    scalar = create_odometry()
+    xs = []
+    ys = []
+    begin = perf_counter()
+    for right, left in ticks:
+        scalar.calculate_part(right, left)
+        xs.append(scalar.posX)
+        ys.append(scalar.posY)
+    scalar_time = perf_counter() - begin
+
+    right, left = odometry.numpy.array(ticks).T
+    batch_time = float("inf")
+    for _ in range(3):
+        # the first call also pays for allocating the memory of the arrays
+        batch = create_odometry()
+        begin = perf_counter()
+        x, y, _ = batch.calculate_parts(right, left)
+        batch_time = min(batch_time, perf_counter() - begin)
+    deviation = max(float(abs(x - odometry.numpy.array(xs)).max()), float(abs(y - odometry.numpy.array(ys)).max()))
+    print(f"{samples} samples")
+    print(f"calculate_part:  {scalar_time:.3f} s ({scalar_time / samples * 1e6:.2f} us per sample)")
+    print(f"calculate_parts: {batch_time:.3f} s ({batch_time / samples * 1e6:.3f} us per sample), "
+          f"{scalar_time / batch_time:.0f} times faster")
+    print(f"maximum deviation of the position: {deviation:.2e} cm")
+
+
+def bench_kernel(samples: int, paths: int):
+    """
+    Compares the CPU time per sample of add_sample with calculate_part and with the FixedPointKernel, the CPU time of
+    the bare calls, and the deviation of the fixed point pose after paths of samples each
+    """
+    times = {}
+    calls = {}
+    for fixed_point in (False, True):
+        ticks = generate_ticks(samples)
+        times[fixed_point] = calls[fixed_point] = float("inf")
+        for _ in range(3):
+            odometry = create_odometry(fixed_point)
+            call = odometry.kernel.step if fixed_point else odometry.calculate_part
+            begin = process_time()
+            for right, left in ticks:
+                call(right, left)
+            calls[fixed_point] = min(calls[fixed_point], process_time() - begin)
+
+            odometry = create_odometry(fixed_point)
+            m1 = m2 = 0
+            begin = process_time()
+            for right, left in ticks:
+                m1 += right
+                m2 += left
+                odometry.add_sample(m1, m2)
+            times[fixed_point] = min(times[fixed_point], process_time() - begin)
+
+    position = heading = 0.0
+    for seed in range(paths):
+        poses = []
+        for fixed_point in (False, True):
+            odometry = create_odometry(fixed_point)
+            m1 = m2 = 0
+            for right, left in generate_ticks(samples // paths, seed):
+                m1 += right
+                m2 += left
+                odometry.add_sample(m1, m2)
+            poses.append(odometry.pose())
+        (x, y, gamma), (fixed_x, fixed_y, fixed_gamma) = poses
+        position = max(position, math.hypot(fixed_x - x, fixed_y - y))
+        heading = max(heading, abs((fixed_gamma - gamma + math.pi) % (2 * math.pi) - math.pi))
+    print(f"{samples} samples")
+    print(f"calculate_part:   {times[False] / samples * 1e6:.2f} us CPU per sample, "
+          f"{calls[False] / samples * 1e6:.2f} us per bare call")
+    print(f"FixedPointKernel: {times[True] / samples * 1e6:.2f} us CPU per sample, "
+          f"{calls[True] / samples * 1e6:.2f} us per bare call")
+    print(f"maximum deviation after {samples // paths} samples: {position:.2e} cm, {heading:.2e} rad")
+
+
+def bench_snap(node_count: int, position_error: float, heading_error: float, explored: float, seed: int):
+    """
+    Compares rounding a noisy end pose against NodeGrid.snap for every unexplored path of a generated planet
+    All nodes are scanned and a share of the paths is explored, like in the middle of an exploration.
+    """
+    truth = generate_planet(node_count, seed=seed)
+    mothership = LocalMothership(truth, "benchmark", ((0, 0), Direction.NORTH))
+    planet = Planet()
+    planet.debug.debug_lvl = 0
+    for node in truth.paths:
+        planet.set_attached_paths(node, mothership.scan(node))
+    rng = random.Random(seed)
+    paths = [(node, direction) for node in truth.paths for direction in mothership.scan(node)]
+    for node, direction in paths:
+        end, end_dir, weight = truth.paths[node][direction]
+        if rng.random() < explored and not planet.is_known_path(node, direction):
+            planet.add_path((node, direction), (end, Direction(end_dir)), weight)
+    ends = [((node, direction), truth.paths[node][direction][:2]) for node, direction in paths
+            if not planet.is_known_path(node, direction) and truth.paths[node][direction][2] > 0]
+    rounded = snapped = 0
+    snap_time = 0.0
+    for start, (end, end_dir) in ends:
+        x = end[0] + rng.gauss(0, position_error)
+        y = end[1] + rng.gauss(0, position_error)
+        heading = end_dir + 180 + rng.gauss(0, heading_error)
+        if ((round(x), round(y)), Direction((round(heading / 90) * 90 + 180) % 360)) == (end, end_dir):
+            rounded += 1
+        begin = perf_counter()
+        result = planet.node_grid.snap(x, y, heading, exclude=start)
+        snap_time += perf_counter() - begin
+        if result == (end, end_dir):
+            snapped += 1
+    print(f"{len(ends)} unexplored paths on {len(truth.paths)} nodes, position error {position_error} grid units, "
+          f"heading error {heading_error} degree")
+    print(f"round: {len(ends) - rounded} wrong ends ({(len(ends) - rounded) / len(ends):.1%})")
+    print(f"snap:  {len(ends) - snapped} wrong ends ({(len(ends) - snapped) / len(ends):.1%}), "
+          f"{snap_time / len(ends) * 1e6:.1f} us per pose")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmarks for the odometry of the robot")
+    subparsers = parser.add_subparsers(dest="benchmark", required=True)
+
+    node_parser = subparsers.add_parser("node", help="movement list vs. streaming integration")
+    node_parser.add_argument("--samples", type=int, default=20000)
+
+    batch_parser = subparsers.add_parser("batch", help="calculate_part vs. calculate_parts with numpy")
+    batch_parser.add_argument("--samples", type=int, default=1000000)
+
+    kernel_parser = subparsers.add_parser("kernel", help="calculate_part vs. FixedPointKernel in add_sample")
+    kernel_parser.add_argument("--samples", type=int, default=200000)
+    kernel_parser.add_argument("--paths", type=int, default=100)
+
+    snap_parser = subparsers.add_parser("snap", help="rounding vs. NodeGrid.snap of noisy end poses")
+    snap_parser.add_argument("--nodes", type=int, default=400)
+    snap_parser.add_argument("--position-error", type=float, default=0.3)
+    snap_parser.add_argument("--heading-error", type=float, default=20)
+    snap_parser.add_argument("--explored", type=float, default=0.5)
+    snap_parser.add_argument("--seed", type=int, default=0)
+
+    args = parser.parse_args()
+    if args.benchmark == "node":
+        bench_node(args.samples)
+    elif args.benchmark == "batch":
+        bench_batch(args.samples)
+    elif args.benchmark == "kernel":
+        bench_kernel(args.samples, args.paths)
+    elif args.benchmark == "snap":
+        bench_snap(args.nodes, args.position_error, args.heading_error, args.explored, args.seed)
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+
+# Attention: Do not import the ev3dev.ev3 module in this file
+import importlib
+import json
+from typing import Callable, Sequence, Tuple
+
+from planet import Direction
+
+
+class Codec:
+    """
+    JSON encoder and decoder of one library, loads accepts bytes and str, dumps returns compact str
+    """
+
+    def __init__(self, name: str, loads: Callable, dumps: Callable[[object], str]):
+        self.name = name
+        self.loads = loads
+        self.dumps = dumps
+
+
+def stdlib_codec() -> Codec:
+    return Codec("json", json.loads, lambda obj: json.dumps(obj, separators=(',', ':')))
+
+
+def load_codec(names: Sequence[str] = ("orjson", "ujson")) -> Codec:
+    """
+    Returns the codec of the first installed library of names, the json module of the standard library otherwise
+    :param names: Sequence: "orjson" and "ujson" are supported
+    """
+    for name in names:
+        try:
+            module = importlib.import_module(name)
+        except ImportError:
+            continue
+        if name == "orjson":
+            return Codec(name, module.loads, lambda obj, dumps=module.dumps: dumps(obj).decode('utf-8'))
+        if name == "ujson":
+            return Codec(name, module.loads, module.dumps)
+    return stdlib_codec()
+
+
+CODEC = load_codec()
+
+# messages of the robot, only the numbers are filled in when sending
+READY = '{"from":"client","type":"ready"}'
+PATH_TEMPLATE = ('{"from":"client","type":"path","payload":{"startX":%d,"startY":%d,"startDirection":%d,'
+                 '"endX":%d,"endY":%d,"endDirection":%d,"pathStatus":"%s"}}')
+PATH_SELECT_TEMPLATE = '{"from":"client","type":"pathSelect","payload":{"startX":%d,"startY":%d,"startDirection":%d}}'
+MESSAGE_TEMPLATE = '{"from":"client","type":"%s","payload":{"message":%s}}'
+PATH_STATUS = ("free", "blocked")
+
+
+def encode_ready() -> str:
+    return READY
+
+
+def encode_path(start: Tuple[Tuple[int, int], Direction], target: Tuple[Tuple[int, int], Direction],
+                status: str) -> str:
+    """
+    Encodes a path message
+    :param status: String: "free" or "blocked"
+    """
+    if status not in PATH_STATUS:
+        raise ValueError(f"Unknown path status {status!r}")
+    return PATH_TEMPLATE % (start[0][0], start[0][1], start[1], target[0][0], target[0][1], target[1], status)
+
+
+def encode_path_select(path: Tuple[Tuple[int, int], Direction]) -> str:
+    return PATH_SELECT_TEMPLATE % (path[0][0], path[0][1], path[1])
+
+
+def encode_message(msg_type: str, message: str = "Finish") -> str:
+    """
+    Encodes a targetReached or explorationCompleted message, the text is escaped by the codec
+    """
+    return MESSAGE_TEMPLATE % (msg_type, CODEC.dumps(message))
@@ -2,17 +2,24 @@
 
 # Attention: Do not import the ev3dev.ev3 module in this file
 import json
+import math
 import platform
 import ssl
+import threading
+from collections import deque
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
 
 import debug
 import time
 import uuid
-from typing import Tuple
+from typing import Tuple, Optional, Dict, Deque, Callable, List
 
 import paho.mqtt.client as mqtt
 
+from codec import CODEC, encode_message, encode_path, encode_path_select, encode_ready
 from color import ColorPrint as Color
+from journal import MessageJournal
+from message_schema import MessageError, MessageValidator, load_schema
 from planet import Direction
 
 # Fix: SSL certificate problem on macOS
@@ -20,44 +27,301 @@ if all(platform.mac_ver()):
     from OpenSSL import SSL
 
 
+class CommunicationError(Exception):
+    """
+    Raised if an expected message of the mothership does not arrive in time or could not be handled
+    """
+    pass
+
+
+class ServerError(CommunicationError):
+    """
+    Raised in the futures of pending requests if the mothership answered with an error message
+    """
+    pass
+
+
+class OutboundMessage:
+    """
+    Message which was not echoed by the mothership yet
+    """
+    __slots__ = ("topic", "payload", "queued_at", "attempts", "due")
+
+    def __init__(self, topic: str, payload: str):
+        self.topic = topic
+        self.payload = payload
+        self.queued_at = time.monotonic()
+        # number of publishes, the next one is due at due, after a reconnect
+        self.attempts = 0
+        self.due = math.inf
+
+
+class Outbox:
+    """
+    Bounded queue of the sent messages until the mothership echoed them
+
+    Messages are published at once while connected and kept while the connection is lost. After a reconnect all
+    messages without echo are published again. While connected QoS 1 delivers them, a timed retry would send a
+    message with a slow echo twice, and path or ready messages are not idempotent.
+    A message published more than once may be echoed more than once, the later echoes are dropped for
+    duplicate_window seconds after the first one, unless an identical message was sent since.
+    """
+
+    def __init__(self, client, max_queued: int = 32, duplicate_window: float = 5.0):
+        """
+        :param client: paho.mqtt.client.Client
+        :param max_queued: Integer: maximum number of messages without echo
+        :param duplicate_window: Float: seconds in which another echo of an acknowledged message is dropped
+        """
+        self.client = client
+        self.max_queued = max_queued
+        self.duplicate_window = duplicate_window
+        self.messages: Deque[OutboundMessage] = deque()
+        # (topic, payload) -> expected echoes of messages published more than once, and when they expire
+        self.duplicates: Dict[Tuple[str, bytes], List[float]] = {}
+        # reentrant, the echo may be delivered inside client.publish
+        self.condition = threading.Condition(threading.RLock())
+        self.connected = False
+        self.running = False
+        # counters: publishes including retries, retries, echoed messages and their seconds until the echo
+        self.published = 0
+        self.retries = 0
+        self.acknowledged = 0
+        self.latencies: List[float] = []
+
+    def put(self, topic: str, payload: str, echo: Future):
+        """
+        Queues a message and publishes it if connected
+        :param echo: Future: resolved by the echo of the message, ends the retries
+        :raises CommunicationError: if max_queued messages are still waiting for their echo
+        """
+        message = OutboundMessage(topic, payload)
+        with self.condition:
+            if len(self.messages) >= self.max_queued:
+                raise CommunicationError(f"{len(self.messages)} sent messages are waiting for their echo")
+            self.messages.append(message)
+            # an echo of an earlier identical message cannot be told apart, it may as well acknowledge this one
+            self.duplicates.pop((topic, payload.encode()), None)
+            send = self.connected
+            if send:
+                self.schedule(message)
+            self.condition.notify()
+        echo.add_done_callback(lambda _: self.acknowledge(message))
+        if send:
+            self.client.publish(topic, payload=payload, qos=1)
+
+    def schedule(self, message: OutboundMessage):
+        """
+        Counts a publish of message, it is published again only after a reconnect, the caller holds the lock
+        """
+        if message.attempts:
+            self.retries += 1
+        self.published += 1
+        message.due = math.inf
+        message.attempts += 1
+
+    def acknowledge(self, message: OutboundMessage):
+        with self.condition:
+            try:
+                self.messages.remove(message)
+            except ValueError:
+                return
+            now = time.monotonic()
+            self.acknowledged += 1
+            self.latencies.append(now - message.queued_at)
+            if message.attempts > 1:
+                expected = self.duplicates.setdefault((message.topic, message.payload.encode()), [])
+                expected += [now + self.duplicate_window] * (message.attempts - 1)
+
+    def is_duplicate(self, topic: str, payload: bytes) -> bool:
+        """
+        Returns whether a received message is another echo of an acknowledged message, which is then dropped
+        """
+        with self.condition:
+            if not self.duplicates:
+                return False
+            now = time.monotonic()
+            for key in [key for key, expires in self.duplicates.items() if expires[-1] < now]:
+                del self.duplicates[key]
+            expires = self.duplicates.get((topic, payload))
+            if not expires:
+                return False
+            expires.pop(0)
+            if not expires:
+                del self.duplicates[(topic, payload)]
+            return True
+
+    def set_connected(self, connected: bool):
+        """
+        Called by the connection callbacks, after a reconnect every message without echo is due at once
+        """
+        with self.condition:
+            self.connected = connected
+            if connected:
+                now = time.monotonic()
+                for message in self.messages:
+                    message.due = now
+            self.condition.notify()
+
+    def start(self):
+        """
+        Starts the thread which publishes the due messages
+        """
+        with self.condition:
+            if self.running:
+                return
+            self.running = True
+        threading.Thread(target=self.run, daemon=True).start()
+
+    def stop(self):
+        with self.condition:
+            self.running = False
+            self.condition.notify()
+
+    def run(self):
+        while True:
+            with self.condition:
+                while True:
+                    if not self.running:
+                        return
+                    now = time.monotonic()
+                    next_due = min((message.due for message in self.messages), default=math.inf)
+                    if self.connected and next_due <= now:
+                        break
+                    # all messages were published since the last reconnect
+                    self.condition.wait()
+                due = [message for message in self.messages if message.due <= now]
+                for message in due:
+                    self.schedule(message)
+            for message in due:
+                self.client.publish(message.topic, payload=message.payload, qos=1)
+
+    def stats(self) -> Dict[str, float]:
+        """
+        Returns the counters and the seconds until the echo arrived
+        """
+        with self.condition:
+            latencies = sorted(self.latencies)
+            return {"queued": len(self.messages), "published": self.published, "retries": self.retries,
+                    "acknowledged": self.acknowledged,
+                    "latency_median": latencies[len(latencies) // 2] if latencies else 0.0,
+                    "latency_max": latencies[-1] if latencies else 0.0}
+
+
+PATH_FIELDS = ("startX", "startY", "startDirection", "endX", "endY", "endDirection", "pathWeight")
+# payload fields read by the handlers of Communication, checked before a handler is called
+MESSAGE_FIELDS = {
+    ("server", "planet"): ("planetName", "startX", "startY", "startOrientation"),
+    ("server", "path"): PATH_FIELDS,
+    ("server", "pathSelect"): ("startDirection",),
+    ("server", "target"): ("targetX", "targetY"),
+    ("server", "pathUnveiled"): PATH_FIELDS,
+    ("server", "done"): ("message",),
+}
+VALIDATOR = MessageValidator(load_schema(), MESSAGE_FIELDS)
+
+
 class Communication:
     """
     Class to hold the MQTT client communication
     """
 
-    def __init__(self, mqtt_client, group, logger, planet):
+    def __init__(self, mqtt_client, group, logger, planet, reply_timeout: Optional[float] = None,
+                 quiet_period: float = 3, journal: Optional[MessageJournal] = None,
+                 host: str = 'mothership.inf.tu-dresden.de', port: int = 8883, tls: bool = True):
         """
         Initializes communication module, connect to server, subscribe, etc.
-        :param mqtt_client: paho.mqtt.client.Client
+        :param mqtt_client: paho.mqtt.client.Client: None creates a paho client
         :param logger: logging.Logger
         :param planet: Planet
+        :param reply_timeout: Float: seconds to wait for a reply of the server, None waits forever
+        :param quiet_period: Float: seconds after the last message in which the server may send corrections
+        :param journal: MessageJournal: records all sent and received messages, defaults to the RoboLab.journal logger
+        :param host: String: address of the MQTT broker
+        :param port: Integer: port of the MQTT broker
+        :param tls: bool: connect with TLS
         """
         self.group = group
         self.planet = planet
-        self.wait = False
-        self.wait_send_finish = False
+        self.reply_timeout = reply_timeout
+        # futures waiting for a message, key is (sender, type), resolved by on_message in the paho thread
+        self.pending: Dict[Tuple[str, str], Deque[Future]] = {}
+        self.pending_lock = threading.Lock()
         self.timeout_complete = True
-        self.last_connection_time = time.time()
+        self.quiet_period = quiet_period
+        self.last_connection_time = time.monotonic()
+        # seconds spent in timeout() per node, node is the start of the planet while waiting
+        self.quiet_wait_time: Dict[Optional[Tuple[int, int]], float] = {}
         self.error_msg_received = False
+        self.validator = VALIDATOR
+        # handlers of the messages which change the planet, see MESSAGE_FIELDS for the fields they read
+        self.handlers: Dict[Tuple[str, str], Callable[[dict], None]] = {
+            ("server", "planet"): self.handle_planet,
+            ("server", "path"): self.handle_path,
+            ("server", "pathSelect"): self.handle_path_select,
+            ("server", "target"): self.handle_target,
+            ("server", "pathUnveiled"): self.handle_path_unveiled,
+            ("server", "done"): self.handle_done,
+            ("debug", "error"): self.handle_error,
+        }
 
         self.debug = debug.Debug()
+        self.journal = journal if journal is not None else MessageJournal()
         self.logger = logger
         self.logger.debug(f"Group-ID: {self.group}")
 
         # MQTT client setup
         self.client = mqtt_client
-        self.client = mqtt.Client(client_id=self.group + str(uuid.uuid4()),  # Unique Client-ID to recognize our program
-                                  clean_session=True,  # We want a clean session after disconnect or abort/crash
-                                  protocol=mqtt.MQTTv311  # Define MQTT protocol version
-                                  )
-        self.client.tls_set(tls_version=ssl.PROTOCOL_TLS)
+        if self.client is None:
+            # Unique Client-ID to recognize our program
+            self.client = mqtt.Client(client_id=self.group + str(uuid.uuid4()),
+                                      clean_session=True,  # We want a clean session after disconnect or abort/crash
+                                      protocol=mqtt.MQTTv311  # Define MQTT protocol version
+                                      )
+        if tls:
+            self.client.tls_set(tls_version=ssl.PROTOCOL_TLS)
         self.client.on_message = self.safe_on_message_handler
+        self.client.on_connect = self.on_connect
+        self.client.on_disconnect = self.on_disconnect
         self.client.enable_logger(logger)
         self.client.username_pw_set(self.group, 'eYa0NxbLnI')
-        self.client.connect('mothership.inf.tu-dresden.de', port=8883)
-        self.client.subscribe("explorer/" + self.group, qos=1)
+        # topics subscribed again after a reconnect
+        self.subscriptions: List[str] = ["explorer/" + self.group]
+        self.outbox = Outbox(self.client)
+        self.outbox.start()
+        # the network thread of paho connects and reconnects, a lost connection does not end the mission
+        self.client.reconnect_delay_set(min_delay=1, max_delay=16)
+        self.client.connect_async(host, port=port)
         self.client.loop_start()  # Start listening to incoming messages
 
+    def on_connect(self, client, data, flags, rc):
+        """
+        Subscribes to all topics again and publishes the messages which were not echoed
+        :param rc: Integer: 0 if the connection was accepted
+        """
+        if rc != 0:
+            self.logger.warning(f"Connection refused: {rc}")
+            return
+        for topic in self.subscriptions:
+            self.client.subscribe(topic, qos=1)
+        self.outbox.set_connected(True)
+
+    def on_disconnect(self, client, data, rc):
+        """
+        Keeps the sent messages until paho reconnected
+        :param rc: Integer: 0 if disconnect() was called
+        """
+        self.logger.warning(f"Connection lost: {rc}")
+        self.outbox.set_connected(False)
+
+    def subscribe(self, topic: str):
+        """
+        Subscribes to topic now and after every reconnect
+        """
+        if topic not in self.subscriptions:
+            self.subscriptions.append(topic)
+        self.client.subscribe(topic, qos=1)
+
     # DO NOT EDIT THE METHOD SIGNATURE
     def on_message(self, client, data, message):
         """
@@ -67,58 +331,80 @@ class Communication:
         :param message: Object
         :return: void
         """
-        self.last_connection_time = time.time()
+        try:
+            self.handle_message(message)
+        except MessageError as error:
+            # a bad message must not end the mission, it is dropped
+            self.logger.error(f"Dropped message on {message.topic}: {error}")
+        except Exception:
+            # handle_message already rejected the future waiting for the message, the network thread goes on
+            self.logger.exception(f"Handling message on {message.topic} failed")
+
+    def handle_message(self, message):
+        """
+        Updates the planet according to a message of the mothership and resolves the futures waiting for it
+        :param message: Object
+        :return: void
+        :raises MessageError: if the message is no JSON or does not match schema.json
+        """
+        self.last_connection_time = time.monotonic()
         self.timeout_complete = False
-        payload = json.loads(message.payload.decode('utf-8'))
-        self.logger.debug(json.dumps(payload, indent=2))
-        msg_from = payload["from"]
-        msg_type = payload["type"]
-        # self.debug.bprint(json.dumps(payload, indent=2))
-        # self.debug.bprint(msg_from, msg_type, "on_message")
-
-        if msg_from == "server":
-            payload = payload["payload"]
-            if msg_type == "planet":
-                self.planet.planet_name = payload["planetName"]
-                self.debug.bprint(f"Robot is on Planet {self.planet.planet_name}")
-                self.client.subscribe("planet/" + self.planet.planet_name + "/" + self.group, qos=1)
-                self.logger.debug("Planet name: " + self.planet.planet_name)
-                self.planet.set_start((payload["startX"], payload["startY"]), payload["startOrientation"])
-                start_path_dir = (payload["startOrientation"] + 180) % 360
-                self.planet.add_path(((payload["startX"], payload["startY"]), start_path_dir),
-                                     ((payload["startX"], payload["startY"]), start_path_dir), -1)
-
-                self.debug.bprint(f"robot starts at: {self.planet.start}")
-                self.wait = False
-            elif msg_type == "path":
-                self.planet.add_path(((payload["startX"], payload["startY"]), payload["startDirection"]),
-                                     ((payload["endX"], payload["endY"]), payload["endDirection"]),
-                                     payload["pathWeight"])
-                self.planet.set_start((payload["endX"], payload["endY"]),
-                                      Direction((payload["endDirection"] + 180) % 360))
-                self.wait = False
-            elif msg_type == "pathSelect":
-                self.planet.set_start_direction(payload["startDirection"])
-                msg = "PathSelect Correction:" + str(payload["startDirection"])
-                self.debug.bprint(msg)
-            elif msg_type == "target":
-                self.planet.target = (payload["targetX"], payload["targetY"])
-                self.debug.bprint(f"Target is set {self.planet.target}")
-            elif msg_type == "pathUnveiled":
-                self.planet.add_path(((payload["startX"], payload["startY"]), payload["startDirection"]),
-                                     ((payload["endX"], payload["endY"]), payload["endDirection"]),
-                                     payload["pathWeight"])
-            elif msg_type == "done":
-                self.wait = False
-                self.debug.bprint(payload["message"])
-        elif msg_from == "client":
-            self.wait_send_finish = False
-        elif msg_from == "debug":
-            if msg_type == "error":
-                self.debug.bprint(json.dumps(payload, indent=2))
-                self.error_msg_received = True
-                self.wait = False
-                self.wait_send_finish = False
+        self.journal.record("in", message.topic, message.payload)
+        try:
+            decoded = CODEC.loads(message.payload)
+        except ValueError as error:
+            raise MessageError(f"Message is no JSON: {error}") from None
+        try:
+            msg_from, msg_type, payload = self.validator.validate(decoded)
+            handler = self.handlers.get((msg_from, msg_type))
+            if handler is not None:
+                handler(payload)
+        except Exception as error:
+            # only the thread waiting for this message raises the error again
+            if isinstance(decoded, dict):
+                self.fail(decoded.get("from"), decoded.get("type"), error)
+            raise
+        if msg_from == "client" and self.outbox.is_duplicate(message.topic, message.payload):
+            # the echo of a message published again after a reconnect, the first echo already resolved the future
+            return
+        if msg_from != "debug":
+            self.resolve(msg_from, msg_type, payload)
+
+    def handle_planet(self, payload: dict):
+        self.planet.planet_name = payload["planetName"]
+        self.debug.bprint(f"Robot is on Planet {self.planet.planet_name}")
+        self.subscribe("planet/" + self.planet.planet_name + "/" + self.group)
+        self.logger.debug("Planet name: " + self.planet.planet_name)
+        self.planet.set_start((payload["startX"], payload["startY"]), payload["startOrientation"])
+        start_path_dir = (payload["startOrientation"] + 180) % 360
+        self.planet.add_path(((payload["startX"], payload["startY"]), start_path_dir),
+                             ((payload["startX"], payload["startY"]), start_path_dir), -1)
+        self.debug.bprint(f"robot starts at: {self.planet.start}")
+
+    def handle_path(self, payload: dict):
+        self.handle_path_unveiled(payload)
+        self.planet.set_start((payload["endX"], payload["endY"]), Direction((payload["endDirection"] + 180) % 360))
+
+    def handle_path_select(self, payload: dict):
+        self.planet.set_start_direction(payload["startDirection"])
+        self.debug.bprint("PathSelect Correction:" + str(payload["startDirection"]))
+
+    def handle_target(self, payload: dict):
+        self.planet.target = (payload["targetX"], payload["targetY"])
+        self.debug.bprint(f"Target is set {self.planet.target}")
+
+    def handle_path_unveiled(self, payload: dict):
+        self.planet.add_path(((payload["startX"], payload["startY"]), payload["startDirection"]),
+                             ((payload["endX"], payload["endY"]), payload["endDirection"]),
+                             payload["pathWeight"])
+
+    def handle_done(self, payload: dict):
+        self.debug.bprint(payload["message"])
+
+    def handle_error(self, payload: dict):
+        self.debug.bprint(json.dumps(payload, indent=2))
+        self.error_msg_received = True
+        self.fail_pending(ServerError(payload.get("message", "error message")))
 
     # DO NOT EDIT THE METHOD SIGNATURE
     #
@@ -131,9 +417,8 @@ class Communication:
         :param message: Object
         :return: void
         """
-        self.last_connection_time = time.time()
-        self.logger.debug('Send to: ' + topic)
-        self.logger.debug(json.dumps(message, indent=2))
+        self.last_connection_time = time.monotonic()
+        self.journal.record("out", topic, message)
 
     # DO NOT EDIT THE METHOD SIGNATURE OR BODY
     #
@@ -154,102 +439,147 @@ class Communication:
             traceback.print_exc()
             raise
 
-    def send_ready(self):
-        payload = {"from": "client", "type": "ready"}
-        payload = json.dumps(payload)
+    def request_ready(self) -> Future:
+        """
+        Sends the ready message without waiting
+        :return: Future: resolves with the payload of the planet message
+        """
         self.debug.bprint("Send Ready")
-        self.wait = True
-        self.send_robot_message(payload, "explorer/" + self.group)
+        reply = self.expect("server", "planet")
+        self.publish("ready", encode_ready(), "explorer/" + self.group)
         self.planet.new_planet = False
-        while self.wait:
-            continue
+        return reply
+
+    def send_ready(self):
+        self.wait_for(self.request_ready(), "planet message")
         self.timeout()
 
+    def request_path(self, start: Tuple[Tuple[int, int], Direction], target: Tuple[Tuple[int, int], Direction],
+                     status: str) -> Future:
+        """
+        Sends the driven path without waiting
+        :return: Future: resolves with the payload of the path message of the server
+        """
+        reply = self.expect("server", "path")
+        self.publish("path", encode_path(start, target, status), "planet/" + self.planet.planet_name + "/" + self.group)
+        return reply
+
     def send_path(self, start: Tuple[Tuple[int, int], Direction], target: Tuple[Tuple[int, int], Direction],
-                  status: str):
+                  status: str, wait_quiet: bool = True):
         """
         sends selected path to server
         start -- ((startX, startY), startDirection)
         target -- ((endX, endY), endDirection)
         status -- either "free"
+        wait_quiet -- wait for the end of the correction window, otherwise the caller has to call timeout()
         """
-        payload = {"from": "client",
-                   "type": "path",
-                   "payload": {
-                       "startX": start[0][0],
-                       "startY": start[0][1],
-                       "startDirection": start[1],
-                       "endX": target[0][0],
-                       "endY": target[0][1],
-                       "endDirection": target[1],
-                       "pathStatus": status
-                   }
-                   }
-        payload = json.dumps(payload)
-        topic = "planet/" + self.planet.planet_name + "/" + self.group
-        self.wait = True
-        self.send_robot_message(payload, topic)
-        while self.wait:
-            continue
+        self.wait_for(self.request_path(start, target, status), "path message")
         server_target = (self.planet.paths[start[0]][start[1]][0], Direction(self.planet.paths[start[0]][start[1]][1]))
         if server_target == target:
             self.debug.bprint(f"{Color.green}Odometry success{Color.reset}")
         else:
             self.debug.bprint(f"{Color.yellow}Odometry error! "
                   f"Odometry target: {target}, server target: {server_target}{Color.reset}")
-        self.timeout()
+        if wait_quiet:
+            self.timeout()
 
-    def send_path_select(self, path: Tuple[Tuple[int, int], Direction]):
-        payload = {
-            "from": "client",
-            "type": "pathSelect",
-            "payload": {
-                "startX": path[0][0],
-                "startY": path[0][1],
-                "startDirection": path[1]
-            }
-        }
-        payload = json.dumps(payload)
-        topic = "planet/" + self.planet.planet_name + "/" + self.group
-        self.send_robot_message(payload, topic)
+    def request_path_select(self, path: Tuple[Tuple[int, int], Direction]) -> Future:
+        """
+        Sends the selected direction without waiting, a correction of the server arrives as pathSelect message
+        :return: Future: resolves with the echo of the message
+        """
+        echo = self.publish("pathSelect", encode_path_select(path),
+                            "planet/" + self.planet.planet_name + "/" + self.group)
         self.planet.start = path
-        self.timeout()
+        return echo
+
+    def send_path_select(self, path: Tuple[Tuple[int, int], Direction]):
+        # the correction window is already running while the echo is on its way
+        echo = self.request_path_select(path)
+        quiet = self.request_quiet()
+        self.wait_for(echo, "echo of the sent message")
+        quiet.result()
+
+    def speculate_path_select(self, path: Tuple[Tuple[int, int], Direction]) -> Future:
+        """
+        Sends the selected direction and returns at once, so the robot can drive off during the correction window
+        :return: Future: resolves with the payload of the pathSelect correction of the server, or with None if the
+                 correction window closed without one
+        """
+        correction = self.expect("server", "pathSelect")
+        self.request_path_select(path)
+        # the robot drives during this wait, it is no waiting time at the node
+        self.request_quiet(record=False).add_done_callback(lambda _: self.forget("server", "pathSelect", correction))
+        return correction
+
+    def request_target_reached(self) -> Future:
+        """
+        Sends the target reached message without waiting
+        :return: Future: resolves with the payload of the done message
+        """
+        reply = self.expect("server", "done")
+        self.publish("targetReached", encode_message("targetReached"), "explorer/" + self.group)
+        return reply
 
     def send_target_reached(self):
-        payload = {
-            "from": "client",
-            "type": "targetReached",
-            "payload": {
-                "message": "Finish",
-            }
-        }
-        payload = json.dumps(payload)
-        topic = "explorer/" + self.group
-        self.wait = True
-        self.send_robot_message(payload, topic)
-        while self.wait:
-            continue
+        self.wait_for(self.request_target_reached(), "done message")
         self.timeout()
 
+    def request_exploration_completed(self) -> Future:
+        """
+        Sends the exploration completed message without waiting
+        :return: Future: resolves with the payload of the done message
+        """
+        reply = self.expect("server", "done")
+        self.publish("explorationCompleted", encode_message("explorationCompleted"), "explorer/" + self.group)
+        return reply
+
     def send_exploration_completed(self):
-        payload = {
-            "from": "client",
-            "type": "explorationCompleted",
-            "payload": {
-                "message": "Finish",
-            }
-        }
-        payload = json.dumps(payload)
-        topic = "explorer/" + self.group
-        self.wait = True
-        self.send_robot_message(payload, topic)
-        while self.wait:
-            continue
+        self.wait_for(self.request_exploration_completed(), "done message")
         self.timeout()
 
-    def timeout(self):
-        while time.time() - self.last_connection_time < 3:
-            continue
+    def request_quiet(self, record: bool = True) -> Future:
+        """
+        Waits for the end of the correction window in a background thread
+        :param record: bool: add the time to quiet_wait_time, only if the robot waits at the node meanwhile
+        :return: Future: resolves with None as soon as timeout() returned
+        """
+        quiet = Future()
+        quiet.set_running_or_notify_cancel()
+
+        def wait():
+            self.timeout(record)
+            quiet.set_result(None)
+
+        threading.Thread(target=wait, daemon=True).start()
+        return quiet
+
+    def quiet_remaining(self) -> float:
+        """
+        Returns the seconds until the correction window of the server closes, 0 if it is already closed
+        """
+        return max(0.0, self.last_connection_time + self.quiet_period - time.monotonic())
+
+    def is_quiet(self) -> bool:
+        """
+        Returns whether the server can not send corrections anymore, lets the caller work while waiting
+        """
+        return self.quiet_remaining() == 0
+
+    def timeout(self, record: bool = True):
+        """
+        Sleeps until no message was sent or received for quiet_period seconds
+        A message which arrives in the meantime extends the window.
+        :param record: bool: add the time to quiet_wait_time of the current node
+        """
+        begin = time.monotonic()
+        remaining = self.quiet_remaining()
+        while remaining > 0:
+            time.sleep(remaining)
+            remaining = self.quiet_remaining()
+        if record:
+            node = self.planet.start[0] if self.planet.start is not None else None
+            self.quiet_wait_time[node] = self.quiet_wait_time.get(node, 0.0) + time.monotonic() - begin
         if not self.timeout_complete:
             # TODO: get Sound
             self.timeout_complete = True
@@ -262,7 +592,97 @@ class Communication:
         :param payload: String: payload in JSON of MQTT message
         :param topic: String: topic of MQTT message
         """
-        self.wait_send_finish = True
-        self.client.publish(topic, payload=payload, qos=1)
-        while self.wait_send_finish:
-            continue
+        echo = self.expect("client", CODEC.loads(payload).get("type"))
+        self.send_message(topic, payload)
+        self.outbox.put(topic, payload, echo)
+        self.wait_for(echo, "echo of the sent message")
+
+    def publish(self, msg_type: str, payload: str, topic: str) -> Future:
+        """
+        Sends a message to the mothership without waiting
+        :param msg_type: String: type of the message, its echo resolves the returned future
+        :param payload: String: message encoded to JSON, e.g. by an encoder of the codec module
+        :param topic: String: topic of MQTT message
+        :return: Future: resolves with the echo of the message
+        """
+        echo = self.expect("client", msg_type)
+        self.send_message(topic, payload)
+        self.outbox.put(topic, payload, echo)
+        return echo
+
+    def expect(self, sender: str, msg_type: str) -> Future:
+        """
+        Registers a future for the next message of sender with the given type
+        Futures of the same kind resolve in the order they were registered.
+        :param sender: String: "server" for replies, "client" for echoes of our own messages
+        :param msg_type: String: type of the expected message
+        :return: Future
+        """
+        future = Future()
+        future.set_running_or_notify_cancel()
+        with self.pending_lock:
+            self.pending.setdefault((sender, msg_type), deque()).append(future)
+        return future
+
+    def resolve(self, sender: str, msg_type: str, payload):
+        """
+        Resolves the oldest future waiting for this message, messages nobody waits for are ignored
+        """
+        with self.pending_lock:
+            futures = self.pending.get((sender, msg_type))
+            future = futures.popleft() if futures else None
+        if future is not None:
+            future.set_result(payload)
+
+    def forget(self, sender: str, msg_type: str, future: Future):
+        """
+        Stops waiting for a message which did not arrive, the future resolves with None
+        """
+        with self.pending_lock:
+            futures = self.pending.get((sender, msg_type))
+            if futures is None or future not in futures:
+                return
+            futures.remove(future)
+        future.set_result(None)
+
+    def fail(self, sender, msg_type, error: Exception):
+        """
+        Rejects the oldest future waiting for this message with error, other futures keep waiting
+        """
+        if not isinstance(sender, str) or not isinstance(msg_type, str):
+            return
+        with self.pending_lock:
+            futures = self.pending.get((sender, msg_type))
+            future = futures.popleft() if futures else None
+        if future is not None:
+            future.set_exception(error)
+
+    def fail_pending(self, error: Exception):
+        """
+        Rejects all futures waiting for a message with error
+        """
+        with self.pending_lock:
+            futures = [future for waiting in self.pending.values() for future in waiting]
+            self.pending.clear()
+        for future in futures:
+            future.set_exception(error)
+
+    def wait_for(self, future: Future, description: str):
+        """
+        Blocks without using the CPU until on_message resolves the future
+        An error message of the server ends the wait without a result, error_msg_received tells the caller.
+        :param future: Future: returned by a request method, expect() or publish()
+        :param description: String: expected message, used in the error message
+        :return: payload of the message, None after an error message of the server
+        :raises CommunicationError: if the message does not arrive within reply_timeout or could not be handled
+        """
+        try:
+            return future.result(self.reply_timeout)
+        except FutureTimeoutError:
+            raise CommunicationError(f"No {description} within {self.reply_timeout} s") from None
+        except ServerError:
+            return None
+        except CommunicationError:
+            raise
+        except Exception as error:
+            raise CommunicationError(f"Handling a message failed while waiting for {description}") from error
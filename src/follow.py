@@ -10,9 +10,8 @@ import debug
 
 
 class Follow:
-    def __init__(self, robot: Robot, movement: list) -> None:
+    def __init__(self, robot: Robot) -> None:
         self.robot = robot
-        self.movement = movement
         self.debug = debug.Debug(3)
 
         self.rgb_black = (34, 78, 33)
@@ -181,6 +180,22 @@ class Follow:
                         sleep(.02)
             self.robot.stop_motor()
 
+    def return_to_node(self, optimal, baseSpeed, is_node):
+        """
+        turns around and follows the line back to the node the robot came from
+        used to undo a path which was started before the server confirmed the direction
+        optimal -- medium value between calibrated white and black
+        baseSpeed -- how fast should the robot go
+        is_node -- function which returns whether a rgb value is the color of a node
+        """
+        self.turn(2)
+        while True:
+            self.robot.cs.mode = "RGB-RAW"
+            if is_node(self.robot.cs.bin_data("hhh")):
+                break
+            self.follow(optimal, baseSpeed)
+        self.robot.stop_motor()
+
     def find_attached_paths(self) -> List[Direction]:
         """
         finds attached paths to discovered knots by turning 360° and repositions the robot to the next viable path
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+
+# Attention: Do not import the ev3dev.ev3 module in this file
+import json
+import logging
+import time
+from logging.handlers import QueueHandler, QueueListener
+from queue import Queue
+from typing import Iterable, Iterator, Tuple, Union
+
+
+class JournalEntry:
+    """
+    A sent or received MQTT message, serialised to a line only when a handler writes it
+    """
+    __slots__ = ("timestamp", "direction", "topic", "payload")
+
+    def __init__(self, timestamp: float, direction: str, topic: str, payload: Union[bytes, str]):
+        """
+        :param timestamp: Float: time.monotonic() when the message was sent or received
+        :param direction: String: "in" for received, "out" for sent messages
+        :param topic: String: topic of the message
+        :param payload: Bytes or String: payload as on the wire
+        """
+        self.timestamp = timestamp
+        self.direction = direction
+        self.topic = topic
+        self.payload = payload
+
+    def __str__(self):
+        payload = self.payload
+        if isinstance(payload, bytes):
+            payload = payload.decode('utf-8', 'backslashreplace')
+        return json.dumps([round(self.timestamp, 6), self.direction, self.topic, payload], separators=(',', ':'))
+
+
+class LazyQueueHandler(QueueHandler):
+    """
+    QueueHandler which leaves formatting to the listener thread, QueueHandler formats in the calling thread
+    The message of a record must not change after logging, which holds for JournalEntry and strings.
+    """
+
+    def prepare(self, record):
+        return record
+
+
+def start_queue_logging(logger: logging.Logger, handler: logging.Handler) -> QueueListener:
+    """
+    Lets handler write the records of logger in a background thread
+    :param logger: logging.Logger: records are only put into a queue in the logging thread
+    :param handler: logging.Handler: e.g. a FileHandler, runs in the thread of the returned listener
+    :return: QueueListener: already started, stop() writes the remaining records
+    """
+    queue = Queue(-1)
+    logger.addHandler(LazyQueueHandler(queue))
+    listener = QueueListener(queue, handler, respect_handler_level=True)
+    listener.start()
+    return listener
+
+
+class MessageJournal:
+    """
+    Records the MQTT messages of Communication as line delimited JSON arrays: [timestamp, direction, topic, payload]
+    The paths the robot scanned at a node are recorded with direction "scan", so a session can be replayed.
+    """
+
+    def __init__(self, logger: logging.Logger = None):
+        """
+        :param logger: logging.Logger: defaults to RoboLab.journal, records are logged with level INFO
+        """
+        self.logger = logger if logger is not None else logging.getLogger('RoboLab.journal')
+
+    def record(self, direction: str, topic: str, payload: Union[bytes, str]):
+        """
+        Logs a message, does nothing but the level check if the logger discards it
+        :param direction: String: "in" or "out"
+        :param topic: String: topic of the message
+        :param payload: Bytes or String: payload as on the wire
+        """
+        if self.logger.isEnabledFor(logging.INFO):
+            self.logger.info(JournalEntry(time.monotonic(), direction, topic, payload))
+
+    def record_scan(self, node: Tuple[int, int], directions: Iterable[int]):
+        """
+        Logs the directions of the paths scanned at node
+        """
+        if self.logger.isEnabledFor(logging.INFO):
+            self.logger.info(JournalEntry(time.monotonic(), "scan", "",
+                                          json.dumps({"x": node[0], "y": node[1], "directions": list(directions)})))
+
+
+def open_session(path: str) -> Tuple[MessageJournal, QueueListener]:
+    """
+    Creates a journal which writes to its own file, e.g. to record a session for replay.py
+    :return: 2-Tuple: journal for Communication, listener for close_session
+    """
+    logger = logging.getLogger('RoboLab.session.' + path)
+    logger.propagate = False
+    logger.setLevel(logging.INFO)
+    logger.handlers.clear()
+    return MessageJournal(logger), start_queue_logging(logger, logging.FileHandler(path, mode="w"))
+
+
+def close_session(listener: QueueListener):
+    """
+    Writes the remaining records of a session opened with open_session and closes its file
+    """
+    listener.stop()
+    for handler in listener.handlers:
+        handler.close()
+
+
+def read_journal(path: str) -> Iterator[Tuple[float, str, str, bytes]]:
+    """
+    Reads the records of a journal file written with the format '%(message)s'
+    :return: Iterator: timestamp, direction, topic and payload of every message
+    """
+    with open(path) as file:
+        for line in file:
+            if line.strip():
+                timestamp, direction, topic, payload = json.loads(line)
+                yield timestamp, direction, topic, payload.encode('utf-8')
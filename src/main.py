@@ -1,17 +1,19 @@
 #!/usr/bin/env python3
 import argparse
+import atexit
 import logging
 import math
 import os
 import debug as dg
 from pprint import pprint
 from time import sleep, time
-from typing import Tuple, List
+from typing import List
 
 from color import ColorPrint as Color
 from communication import Communication
 from follow import Follow
-from odometry import Odometry
+from journal import start_queue_logging
+from odometry import Odometry, OdometryCalibration
 from planet import Planet, Direction
 from robot import Robot
 from specials import star_wars_sound
@@ -19,18 +21,25 @@ from specials import star_wars_sound
 client = None  # DO NOT EDIT
 
 
-def run(calibrate=False):
+def run(calibrate=False, speculative=False):
     # DO NOT CHANGE THESE VARIABLES
     #
     # The deploy-script uses the variable "client" to stop the mqtt-client after your program stops or crashes.
     # Your script isn't able to close the client after crashing.
     global client
 
-    log_file = os.path.realpath(__file__) + '/../../logs/project.log'
-    logging.basicConfig(filename=log_file,  # Define log file
-                        level=logging.INFO,  # Define default mode
-                        format='%(asctime)s: %(message)s'  # Define default logging format
-                        )
+    log_dir = os.path.realpath(__file__) + '/../../logs/'
+    # the files are written by background threads, so waiting for the SD card does not block driving
+    log_handler = logging.FileHandler(log_dir + 'project.log')  # Define log file
+    log_handler.setFormatter(logging.Formatter('%(asctime)s: %(message)s'))  # Define default logging format
+    logging.getLogger().setLevel(logging.INFO)  # Define default mode
+    log_listener = start_queue_logging(logging.getLogger(), log_handler)
+    atexit.register(log_listener.stop)
+    # sent and received messages, one line per message
+    journal_logger = logging.getLogger('RoboLab.journal')
+    journal_logger.propagate = False
+    journal_listener = start_queue_logging(journal_logger, logging.FileHandler(log_dir + 'messages.log'))
+    atexit.register(journal_listener.stop)
     logger = logging.getLogger('RoboLab')
 
     # THIS IS WHERE PARADISE BEGINS
@@ -38,12 +47,15 @@ def run(calibrate=False):
     robot = Robot()
     planet = Planet()
     mqttc = Communication(client, '217', logger, planet)
-    movement: List[Tuple[int, int]] = []
     debug = dg.Debug(3)
-    # used to save all movement values gathered while line following for odometry calculations
 
-    follow = Follow(robot, movement)
-    odo = Odometry(gamma=0, pos_x=0, pos_y=0, dist_btw_wheels=9.2)
+    follow = Follow(robot)
+    # wheel distance and circumference fitted to the paths confirmed by the server in earlier runs
+    calibration_path = "/home/robot/src/odometry.json"
+    calibration = OdometryCalibration.load(calibration_path, dist_btw_wheels=9.2)
+    odo = Odometry(gamma=0, pos_x=0, pos_y=0, dist_btw_wheels=9.2, calibration=calibration)
+    # written once when the program ends, not on the SD card while the robot waits at a node
+    atexit.register(calibration.save, calibration_path)
     robot.reset_motor()
 
     try:
@@ -75,23 +87,72 @@ def run(calibrate=False):
         rgb_white = (245, 392, 258)
         optimal = 171.5
 
+    def is_node(rgb) -> bool:
+        return follow.is_color(rgb, rgb_red, 25) or follow.is_color(rgb, rgb_blue, 30)
+
     run = True
     node_count = 0
+    # speculative mode: the robot drives off at once, speculation resolves with the correction of the server or None
+    speculation = None
+    speculated_direction = None
+    # per node: node, seconds from the detection until the robot drove off, whether the speculation was corrected
+    node_timing: List[list] = []
+
+    def undo_speculation(correction: dict) -> Direction:
+        """
+        drives back to the node the speculated path started at and turns into the corrected direction
+        returns the new orientation of the robot
+        """
+        debug.bprint(f"{Color.yellow}Speculation corrected to {correction['startDirection']}{Color.reset}")
+        node_timing[-1][2] = True
+        follow.return_to_node(optimal, 250, is_node)
+        follow.turn(((correction["startDirection"] - speculated_direction - 180) % 360) / 90)
+        odo.gamma = math.radians(planet.start[1])
+        odo.start_path()
+        robot.m1.position = 0
+        robot.m2.position = 0
+        return planet.start[1]
+
+    def target_reached() -> bool:
+        """
+        sends targetReached if the robot is at the target
+        returns whether the mission is over
+        """
+        if planet.target is None or planet.target != planet.start[0]:
+            return False
+        mqttc.send_target_reached()
+        debug.bprint("Target reached")
+        pprint(planet.paths, indent=2)
+        driving_time = time() - start_time
+        print(f"Robot is {int(driving_time // 60)}:{driving_time % 60}")
+        robot.sd.tone(star_wars_sound)
+        return True
+
     while run:
 
         robot.cs.mode = "RGB-RAW"
         current_color = robot.cs.bin_data("hhh")
 
-        if follow.is_color(current_color, rgb_red, 25) or follow.is_color(current_color, rgb_blue, 30):
+        if is_node(current_color):
             # discovers node
             node_count += 1
+            node_begin = time()
             robot.stop_motor()
             robot.stop_motor()
+            if speculation is not None:
+                # the node was reached before the correction window closed
+                correction = mqttc.wait_for(speculation, "end of the correction window")
+                speculation = None
+                if (not mqttc.error_msg_received and correction is not None
+                        and correction["startDirection"] != speculated_direction):
+                    # wrong guess: the robot drove the wrong path, back to its start and into the corrected one
+                    node_count -= 1
+                    old_orientation = undo_speculation(correction)
+                    continue
             debug.bprint(f"{Color.byellow}{node_count}.node{Color.reset}")
             if planet.new_planet:
                 # first node discovered
                 mqttc.send_ready()
-                mqttc.timeout()
                 sleep(1)
 
                 # only works because while loops is very fast... the faster the while the slower the less does the robot roll
@@ -109,7 +170,7 @@ def run(calibrate=False):
                     # sends blocked path when ultrasonic sensor detected an obstacle (uses old values for target)
                     mqttc.send_path(((old_nodeX, old_nodeY), old_orientation),
                                     ((old_nodeX, old_nodeY), old_orientation),
-                                    status="blocked")
+                                    status="blocked", wait_quiet=False)
                     follow.path_blocked = False
 
                 else:
@@ -117,10 +178,13 @@ def run(calibrate=False):
                     if planet.is_known_path((old_nodeX, old_nodeY), old_orientation):
                         mqttc.send_path(((old_nodeX, old_nodeY), old_orientation),
                                         planet.get_path_target((old_nodeX, old_nodeY), old_orientation),
-                                        "free")
+                                        "free", wait_quiet=False)
+                        odo.confirm_path(((old_nodeX, old_nodeY), old_orientation),
+                                         planet.get_path_target((old_nodeX, old_nodeY), old_orientation))
                     else:
                         # any other node discovered
-                        odo.calculate_new_position(movement)
+                        # the path was integrated while driving, its end is snapped to the known nodes of the planet
+                        odo.finish_path(planet.node_grid, ((old_nodeX, old_nodeY), old_orientation))
                         debug.bprint(
                             f"{Color.reset}BEFORE: odoX and odoY{odo.posX, odo.posY} aswell as oldNodeX and oldNodeY {old_nodeX, old_nodeY}{Color.reset}")
                         odo.posX += old_nodeX
@@ -137,18 +201,10 @@ def run(calibrate=False):
                             f"odoDirection ={Color.reset} {odo.gamma}")
                         mqttc.send_path(((old_nodeX, old_nodeY), old_orientation),
                                         ((round(odo.posX), round(odo.posY)), odo.gamma_to_direction(odo.gamma + 180)),
-                                        "free")
-
-            # Target reached
-            if planet.target is not None:
-                if planet.target == planet.start[0]:
-                    mqttc.send_target_reached()
-                    debug.bprint("Target reached")
-                    pprint(planet.paths, indent=2)
-                    driving_time = time() - start_time
-                    print(f"Robot is {int(driving_time // 60)}:{driving_time % 60}")
-                    robot.sd.tone(star_wars_sound)
-                    break
+                                        "free", wait_quiet=False)
+                        # the server answered with the real end of the path, also after an odometry error
+                        odo.confirm_path(((old_nodeX, old_nodeY), old_orientation),
+                                         planet.get_path_target((old_nodeX, old_nodeY), old_orientation))
 
             # updated planet data: current position + facing
             old_nodeX = planet.start[0][0]
@@ -160,17 +216,30 @@ def run(calibrate=False):
             odo.posY = planet.start[0][1] / 50
             odo.gamma = planet.start[1]
 
+            # a known target is reported at once, without scanning the node first
+            if target_reached():
+                break
+
             # scan knots
             if not planet.is_known_node(planet.start[0]):
                 # debug.bprint("Node unknown")
                 relative_paths = follow.find_attached_paths()
                 absolute_paths = follow.gamma_rel_to_abs(relative_paths, old_orientation)
                 planet.set_attached_paths((old_nodeX, old_nodeY), absolute_paths)
+                mqttc.journal.record_scan((old_nodeX, old_nodeY), absolute_paths)
             else:
                 robot.m1.run_to_rel_pos(speed_sp=200, position_sp=280)
                 robot.m2.run_to_rel_pos(speed_sp=-200, position_sp=280)
                 # debug.bprint("Node already known")
                 sleep(.4)
+
+            # the node is scanned while the server may still send corrections, wait for the rest of the window
+            mqttc.timeout()
+
+            # Target reached, the target may have arrived during the correction window
+            if target_reached():
+                break
+
             # update stack to remove all known weighted paths
             # discovered = planet.getPathsWithWrongWeight()
             # planet.updateStack(discovered)
@@ -198,7 +267,12 @@ def run(calibrate=False):
 
             # sends selected path
             # might cause planet update which leads to us needing to update our internal orientation
-            mqttc.send_path_select(((old_nodeX, old_nodeY), dir_abs))
+            if speculative:
+                # drive off at once, a correction arriving within the window is undone while following the line
+                speculation = mqttc.speculate_path_select(((old_nodeX, old_nodeY), dir_abs))
+                speculated_direction = dir_abs
+            else:
+                mqttc.send_path_select(((old_nodeX, old_nodeY), dir_abs))
 
             if mqttc.error_msg_received:
                 mqttc.send_exploration_completed()
@@ -218,6 +292,7 @@ def run(calibrate=False):
             print("Status of path to be explored: ", planet.paths[planet.start[0]][dir_abs])
 
             # debug.bprint(f"Turn right {dir_rel / 90} times")
+            node_timing.append([planet.start[0], time() - node_begin, False])
             follow.turn(dir_rel / 90)
             odo.gamma = math.radians(dir_abs)
 
@@ -228,15 +303,23 @@ def run(calibrate=False):
                 debug.bprint("\u001b[34mBLUE\u001b[0m")
                 robot.set_led(robot.ColorLED.GREEN)
 
-            odo.old_m1 = 0
-            odo.old_m2 = 0
-            odo.new_m1 = 0
-            odo.new_m2 = 0
+            odo.start_path()
             robot.m1.position = 0
             robot.m2.position = 0
-            movement = []
         else:
             # if not node detected
+            if speculation is not None and speculation.done():
+                correction = mqttc.wait_for(speculation, "end of the correction window")
+                speculation = None
+                if mqttc.error_msg_received:
+                    robot.stop_motor()
+                    mqttc.send_exploration_completed()
+                    debug.bprint("Error message received")
+                    break
+                if correction is not None and correction["startDirection"] != speculated_direction:
+                    # wrong guess: back to the node and into the corrected path
+                    old_orientation = undo_speculation(correction)
+
             follow.follow(optimal, 250)
 
             if robot.us.value() < 150:
@@ -257,11 +340,24 @@ def run(calibrate=False):
 
                 robot.stop_motor()
 
-            odo.old_m1 = odo.new_m1
-            odo.old_m2 = odo.new_m2
-            odo.new_m1 = robot.m1.position
-            odo.new_m2 = robot.m2.position
-            movement.append((odo.new_m1 - odo.old_m1, odo.new_m2 - odo.old_m2))
+            odo.add_sample(robot.m1.position, robot.m2.position)
+
+    waited = sum(mqttc.quiet_wait_time.values())
+    debug.bprint(f"Waited {waited:.1f} s for the correction window at {len(mqttc.quiet_wait_time)} nodes")
+    for node, seconds in mqttc.quiet_wait_time.items():
+        debug.bprint(f"  {node}: {seconds:.1f} s")
+    outbox = mqttc.outbox.stats()
+    debug.bprint(f"Sent {outbox['acknowledged']} messages with {outbox['retries']} retries, echo after "
+                 f"{outbox['latency_median']:.2f} s (median), {outbox['latency_max']:.2f} s (max)")
+    if node_timing:
+        debug.bprint(f"Drove off {sum(seconds for _, seconds, _ in node_timing) / len(node_timing):.1f} s after "
+                     f"reaching a node on average")
+        if speculative:
+            corrected = sum(1 for _, _, wrong in node_timing if wrong)
+            debug.bprint(f"Speculation was wrong at {corrected} of {len(node_timing)} nodes "
+                         f"({corrected / len(node_timing):.0%})")
+        for node, seconds, wrong in node_timing:
+            debug.bprint(f"  {node}: {seconds:.1f} s{' (corrected)' if wrong else ''}")
 
 
 # PLS EDIT
@@ -269,6 +365,8 @@ def run(calibrate=False):
 if __name__ == '__main__':
     parser = argparse.ArgumentParser()
     parser.add_argument("-c", "--calibrate", action="store_true")
+    parser.add_argument("-s", "--speculative", action="store_true",
+                        help="drive off before the server confirmed the selected path")
     args = parser.parse_args()
 
-    run(calibrate=args.calibrate)
+    run(calibrate=args.calibrate, speculative=args.speculative)
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+
+# Attention: Do not import the ev3dev.ev3 module in this file
+import json
+import os
+import re
+from typing import Dict, FrozenSet, Iterable, Optional, Tuple
+
+# schema.json lies next to the src directory, it is not deployed to the robot
+SCHEMA_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "schema.json")
+
+
+class MessageError(ValueError):
+    """
+    Raised if a message does not match schema.json or misses a field its handler needs
+    """
+    pass
+
+
+def load_schema(path: str = SCHEMA_PATH) -> Optional[Dict[str, Tuple[FrozenSet[str], Dict[str, type]]]]:
+    """
+    Reads the message types and the payload field types per sender from schema.json
+    The file is a template: numbers are unquoted placeholders like <Xs>, alternative types are separated by | or ,
+    :param path: String: path of schema.json
+    :return: Dict: sender -> (message types, field -> type), None if the file does not exist
+    """
+    try:
+        with open(path) as file:
+            text = file.read()
+    except FileNotFoundError:
+        return None
+    text = re.sub(r'(?<!")<\w+>(?!")', '0', text)
+    schema = {}
+    for entry in json.loads(text):
+        types = frozenset(re.split(r"[|,]", entry["type"]))
+        fields = {key: type(value) for key, value in entry.get("payload", {}).items()}
+        schema[entry["from"]] = (types, fields)
+    return schema
+
+
+class MessageValidator:
+    """
+    Checks decoded messages with the key and type checks compiled from schema.json once
+    """
+
+    def __init__(self, schema: Optional[Dict[str, Tuple[FrozenSet[str], Dict[str, type]]]],
+                 required: Dict[Tuple[str, str], Iterable[str]]):
+        """
+        :param schema: Dict: result of load_schema, None only checks the required fields exist
+        :param required: Dict: (sender, type) -> payload fields the handler of the message reads
+        """
+        # (sender, type) -> ((field, type), ...), every message type of the schema has an entry
+        self.checks: Dict[Tuple[str, str], Tuple[Tuple[str, type], ...]] = {}
+        if schema is not None:
+            for sender, (types, _) in schema.items():
+                for msg_type in types:
+                    self.checks[(sender, msg_type)] = ()
+        for key, fields in required.items():
+            if schema is None:
+                self.checks[key] = tuple((field, object) for field in fields)
+                continue
+            if key not in self.checks:
+                raise MessageError(f"{key[0]} message {key[1]} is not defined in schema.json")
+            known = schema[key[0]][1]
+            unknown = [field for field in fields if field not in known]
+            if unknown:
+                raise MessageError(f"Fields {unknown} of {key[0]} message {key[1]} are not defined in schema.json")
+            kinds = tuple((field, known[field]) for field in fields)
+            self.checks[key] = kinds
+        self.strict = schema is not None
+
+    def validate(self, message) -> Tuple[str, str, dict]:
+        """
+        Checks a decoded message
+        :param message: Object: result of json.loads
+        :return: Tuple: sender, type and payload, the payload is empty if the message has none
+        :raises MessageError: if the message is malformed
+        """
+        if not isinstance(message, dict):
+            raise MessageError(f"Message is not an object: {message!r}")
+        msg_from = message.get("from")
+        msg_type = message.get("type")
+        checks = self.checks.get((msg_from, msg_type))
+        if checks is None:
+            if self.strict:
+                raise MessageError(f"Unknown message {msg_type!r} from {msg_from!r}")
+            checks = ()
+        payload = message.get("payload", {})
+        if not isinstance(payload, dict):
+            raise MessageError(f"Payload of {msg_from} message {msg_type} is not an object")
+        for field, kind in checks:
+            value = payload.get(field)
+            if value is None or not isinstance(value, kind):
+                raise MessageError(f"{msg_from} message {msg_type} needs field {field} of type {kind.__name__}, "
+                                   f"got {value!r}")
+        return msg_from, msg_type, payload
@@ -0,0 +1,297 @@
+#!/usr/bin/env python3
+
+# Attention: Do not import the ev3dev.ev3 module in this file
+import heapq
+import json
+import random
+import threading
+import time
+from typing import List, Optional, Tuple
+
+import paho.mqtt.client as mqtt
+
+from planet import Planet, Direction
+
+
+def load_planet(path: str) -> Tuple[Planet, str, Tuple[Tuple[int, int], Direction], Optional[Tuple[int, int]]]:
+    """
+    Reads a planet definition written by save_planet
+    The file is a JSON object: {"name": ..., "start": [x, y, orientation], "target": [x, y] or null,
+    "paths": [[startX, startY, startDirection, endX, endY, endDirection, weight], ...]}
+    :return: 4-Tuple: planet with all paths known, planet name, start node and orientation, target or None
+    """
+    with open(path) as file:
+        definition = json.load(file)
+    planet = Planet()
+    planet.debug.debug_lvl = 0
+    for start_x, start_y, start_dir, end_x, end_y, end_dir, weight in definition["paths"]:
+        planet.add_path(((start_x, start_y), Direction(start_dir)), ((end_x, end_y), Direction(end_dir)), weight)
+    start_x, start_y, orientation = definition["start"]
+    target = tuple(definition["target"]) if definition.get("target") is not None else None
+    return planet, definition["name"], ((start_x, start_y), Direction(orientation)), target
+
+
+def save_planet(path: str, planet: Planet, name: str, start: Tuple[Tuple[int, int], Direction],
+                target: Optional[Tuple[int, int]] = None):
+    """
+    Writes the known paths of planet as planet definition, every path once
+    """
+    paths = []
+    for node, directions in planet.paths.items():
+        for direction, (end, end_dir, weight) in directions.items():
+            if (weight > 0 or weight == -1) and (node, direction) <= (end, end_dir):
+                paths.append([node[0], node[1], int(direction), end[0], end[1], int(end_dir), weight])
+    with open(path, "w") as file:
+        json.dump({"name": name, "start": [start[0][0], start[0][1], int(start[1])],
+                   "target": list(target) if target is not None else None, "paths": paths}, file)
+
+
+class LocalMothership:
+    """
+    Stand-in for the mothership which answers the messages of a robot from a planet with all paths known
+    """
+
+    def __init__(self, truth: Planet, name: str, start: Tuple[Tuple[int, int], Direction],
+                 target: Optional[Tuple[int, int]] = None, correction_chance: float = 0.0,
+                 unveil_chance: float = 0.0, seed: int = 0):
+        """
+        :param truth: Planet: planet with all paths known, e.g. from load_planet or generate_planet
+        :param name: String: planet name of the planet message
+        :param start: 2-Tuple: start node and orientation of the robot
+        :param target: 2-Tuple: target sent after the planet message, None sends no target
+        :param correction_chance: Float: probability that a pathSelect message is answered with another direction
+        :param unveil_chance: Float: probability that a path message is followed by a pathUnveiled message
+        :param seed: Integer: seed for corrections and unveiled paths
+        """
+        self.truth = truth
+        self.name = name
+        self.start = start
+        self.target = target
+        self.correction_chance = correction_chance
+        self.unveil_chance = unveil_chance
+        self.rng = random.Random(seed)
+        self.unveiled = set()
+        # number of handled client messages per type
+        self.received = {}
+
+    def scan(self, node: Tuple[int, int]) -> List[Direction]:
+        """
+        Returns the directions in which a robot at node sees a path, blocked paths look like free ones
+        """
+        paths = self.truth.paths.get(node, {})
+        return [direction for direction in Direction
+                if direction in paths and (paths[direction][2] > 0 or paths[direction][2] == -1)]
+
+    def drive(self, node: Tuple[int, int], direction: Direction) -> Tuple[Tuple[Tuple[int, int], Direction], str]:
+        """
+        Returns where a robot ends which leaves node in direction and the path status it reports
+        The robot turns around in front of an obstacle and ends at node again.
+        """
+        end, end_dir, weight = self.truth.paths[node][direction]
+        if weight == -1:
+            return (node, direction), "blocked"
+        return (end, Direction(end_dir)), "free"
+
+    def handle(self, topic: str, message: dict) -> List[Tuple[str, dict]]:
+        """
+        Answers a message of the robot like the mothership
+        :param topic: String: topic the robot published on
+        :param message: Dict: decoded message
+        :return: List: topic and message of every answer, starting with the echo
+        """
+        group = topic.split("/")[-1]
+        planet_topic = "planet/" + self.name + "/" + group
+        msg_type = message.get("type")
+        payload = message.get("payload", {})
+        self.received[msg_type] = self.received.get(msg_type, 0) + 1
+        answers = [(topic, message)]
+        if msg_type == "ready":
+            answers.append((topic, server("planet", planetName=self.name, startX=self.start[0][0],
+                                          startY=self.start[0][1], startOrientation=int(self.start[1]))))
+            if self.target is not None:
+                answers.append((planet_topic, server("target", targetX=self.target[0], targetY=self.target[1])))
+        elif msg_type == "path":
+            node = (payload["startX"], payload["startY"])
+            direction = payload["startDirection"]
+            if direction not in self.scan(node):
+                return answers + [(topic, debug_error("Path does not exist"))]
+            (end, end_dir), _ = self.drive(node, Direction(direction))
+            weight = self.truth.paths[node][direction][2]
+            if payload["pathStatus"] == "blocked":
+                end, end_dir, weight = node, direction, -1
+            answers.append((topic, server("path", startX=node[0], startY=node[1], startDirection=direction,
+                                          endX=end[0], endY=end[1], endDirection=int(end_dir),
+                                          pathStatus="blocked" if weight == -1 else "free", pathWeight=weight)))
+            self.unveiled.add((node, direction))
+            self.unveiled.add((end, end_dir))
+            if self.rng.random() < self.unveil_chance:
+                answers += [(topic, unveiled) for unveiled in self.unveil()]
+        elif msg_type == "pathSelect":
+            node = (payload["startX"], payload["startY"])
+            others = [direction for direction in self.scan(node) if direction != payload["startDirection"]]
+            if others and self.rng.random() < self.correction_chance:
+                answers.append((topic, server("pathSelect", startX=node[0], startY=node[1],
+                                              startDirection=int(self.rng.choice(others)))))
+        elif msg_type == "targetReached":
+            answers.append((topic, server("done", message="Target reached!")))
+        elif msg_type == "explorationCompleted":
+            answers.append((topic, server("done", message="Exploration completed!")))
+        elif msg_type != "testplanet":
+            answers.append((topic, debug_error(f"Unknown message type {msg_type}")))
+        return answers
+
+    def unveil(self) -> List[dict]:
+        """
+        Returns a pathUnveiled message for a random path the robot did not report yet, or nothing
+        """
+        hidden = [(node, direction) for node, directions in self.truth.paths.items() for direction in directions
+                  if (node, direction) not in self.unveiled and (directions[direction][2] > 0
+                                                                 or directions[direction][2] == -1)]
+        if not hidden:
+            return []
+        node, direction = self.rng.choice(hidden)
+        end, end_dir, weight = self.truth.paths[node][direction]
+        self.unveiled.add((node, direction))
+        self.unveiled.add((end, end_dir))
+        return [server("pathUnveiled", startX=node[0], startY=node[1], startDirection=int(direction), endX=end[0],
+                       endY=end[1], endDirection=int(end_dir), pathStatus="blocked" if weight == -1 else "free",
+                       pathWeight=weight)]
+
+
+def server(msg_type: str, **payload) -> dict:
+    return {"from": "server", "type": msg_type, "payload": payload}
+
+
+def debug_error(message: str) -> dict:
+    return {"from": "debug", "type": "error", "payload": {"message": message}}
+
+
+class LocalClient:
+    """
+    Stand-in for paho.mqtt.client.Client which is connected to a LocalMothership instead of a broker
+
+    With latency 0 the answers are delivered in the publishing thread before publish returns, which keeps CPU
+    benchmarks free of thread switches. Otherwise a network thread started by loop_start delivers every answer
+    latency seconds after the message was published.
+    """
+
+    def __init__(self, mothership: LocalMothership, latency: float = 0.0):
+        """
+        :param mothership: LocalMothership: answers the published messages
+        :param latency: Float: seconds from publishing a message until its answers arrive
+        """
+        self.mothership = mothership
+        self.latency = latency
+        self.on_message = None
+        self.on_connect = None
+        self.on_disconnect = None
+        self.subscriptions = set()
+        # (due time, sequence number, topic, payload) of the answers not delivered yet
+        self.queue: List[Tuple[float, int, str, bytes]] = []
+        self.sequence = 0
+        self.condition = threading.Condition()
+        self.running = False
+
+    def tls_set(self, *args, **kwargs):
+        pass
+
+    def enable_logger(self, *args, **kwargs):
+        pass
+
+    def username_pw_set(self, *args, **kwargs):
+        pass
+
+    def connect(self, host, port=1883, *args, **kwargs):
+        pass
+
+    def connect_async(self, *args, **kwargs):
+        self.on_connect(self, None, {}, 0)
+
+    def reconnect_delay_set(self, *args, **kwargs):
+        pass
+
+    def disconnect(self):
+        pass
+
+    def subscribe(self, topic, qos=0):
+        self.subscriptions.add(topic)
+
+    def unsubscribe(self, topic):
+        self.subscriptions.discard(topic)
+
+    def publish(self, topic, payload=None, qos=0):
+        answers = self.mothership.handle(topic, json.loads(payload))
+        if self.latency == 0:
+            for answer_topic, answer in answers:
+                self.deliver(answer_topic, json.dumps(answer).encode())
+            return
+        due = time.monotonic() + self.latency
+        with self.condition:
+            for answer_topic, answer in answers:
+                self.sequence += 1
+                heapq.heappush(self.queue, (due, self.sequence, answer_topic, json.dumps(answer).encode()))
+            self.condition.notify()
+
+    def deliver(self, topic: str, payload: bytes):
+        if topic not in self.subscriptions:
+            return
+        message = mqtt.MQTTMessage(topic=topic.encode())
+        message.payload = payload
+        self.on_message(self, None, message)
+
+    def loop_start(self):
+        if self.latency == 0 or self.running:
+            return
+        self.running = True
+        threading.Thread(target=self.loop, daemon=True).start()
+
+    def loop_stop(self):
+        with self.condition:
+            self.running = False
+            self.condition.notify()
+
+    def loop(self):
+        """
+        Network thread: delivers the answers in the order they are due
+        """
+        while True:
+            with self.condition:
+                while self.running and (not self.queue or self.queue[0][0] > time.monotonic()):
+                    self.condition.wait(self.queue[0][0] - time.monotonic() if self.queue else None)
+                if not self.running:
+                    return
+                _, _, topic, payload = heapq.heappop(self.queue)
+            self.deliver(topic, payload)
+
+
+def explore(communication, mothership: LocalMothership) -> List[Tuple[Tuple[int, int], Direction]]:
+    """
+    Explores the planet of mothership through communication like main.run does, with perfect odometry
+    :param communication: Communication: connected to mothership by a LocalClient
+    :param mothership: LocalMothership
+    :return: List: all driven paths
+    """
+    planet = communication.planet
+    communication.send_ready()
+    driven: List[Tuple[Tuple[int, int], Direction]] = []
+    while True:
+        node = planet.start[0]
+        if not planet.is_known_node(node):
+            planet.set_attached_paths(node, mothership.scan(node))
+            communication.journal.record_scan(node, mothership.scan(node))
+        communication.timeout()
+        if planet.target is not None and planet.target == node:
+            communication.send_target_reached()
+            return driven
+        direction = planet.get_next_direction()
+        if direction is None:
+            communication.send_exploration_completed()
+            return driven
+        communication.send_path_select((node, direction))
+        if communication.error_msg_received:
+            return driven
+        # the server may have corrected the direction
+        direction = planet.start[1]
+        end, status = mothership.drive(node, direction)
+        communication.send_path((node, direction), end, status, wait_quiet=False)
+        driven.append((node, direction))
@@ -1,18 +1,246 @@
 # !/usr/bin/env python3
+import json
 import math
+import os
+from array import array
 from typing import List, Tuple
 
 import debug
-from planet import Direction
+from planet import Direction, NodeGrid
 from color import ColorPrint as Color
 
+try:
+    import numpy
+except ImportError:  # not installed on the robot, only needed for calculate_parts
+    numpy = None
+
+
+class FixedPointKernel:
+    """
+    Integrates motor degree deltas like Odometry.calculate_part with lookup tables and integer arithmetic
+
+    The heading is an integer phase, the position is kept in units of 2^-POS_BITS cm. The straight distance of every
+    pair of deltas within -RANGE..RANGE degree is precomputed, sin and cos are read from a table with STEPS entries.
+    Error against calculate_part:
+    - the direction of every step is rounded to the table, this moves the position by at most
+      driven distance * pi / STEPS (0.01 cm on a 50 cm path)
+    - the turn per degree is rounded to a phase unit, this adds at most pi / 2^(log2(STEPS) + FRAC_BITS) radians to
+      the heading per degree of difference between the wheels (3e-5 radians after 10000 degree)
+    - the position is rounded down by at most 2^-POS_BITS cm per sample (0.001 cm after a million samples)
+    The CPU time saved is small: with CPython 3 a sample through add_sample takes up to 10% less time than with
+    calculate_part (benchmark_odometry.py kernel), which is about the noise between runs on a busy machine.
+    """
+    STEPS = 16384
+    FRAC_BITS = 16
+    POS_BITS = 30
+    RANGE = 32
+
+    def __init__(self, cm_per_degree: float, dist_btw_wheels: float):
+        """
+        :param cm_per_degree: Float: distance travelled by a wheel per motor degree
+        :param dist_btw_wheels: Float: distance between the wheels in cm
+        """
+        self.cm_per_degree = cm_per_degree
+        self.dist_btw_wheels = dist_btw_wheels
+        self.full = self.STEPS << self.FRAC_BITS
+        self.full_mask = self.full - 1
+        # rounds the phase to the nearest table entry
+        self.half = 1 << (self.FRAC_BITS - 1)
+        self.mask = self.STEPS - 1
+        self.quarter = self.STEPS // 4
+        # phase units per degree the left wheel travelled more than the right one
+        self.unit = round(cm_per_degree / dist_btw_wheels * self.full / (2 * math.pi))
+        scale = 1 << self.POS_BITS
+        self.sin = array('q', (round(math.sin(2 * math.pi * i / self.STEPS) * scale) for i in range(self.STEPS)))
+        self.width = 2 * self.RANGE + 1
+        # (phase offset of the direction, phase turn, straight distance) of every pair of deltas within RANGE
+        self.moves = [self.move(right, left) for right in range(-self.RANGE, self.RANGE + 1)
+                      for left in range(-self.RANGE, self.RANGE + 1)]
+        self.x = 0
+        self.y = 0
+        self.phase = 0
+
+    def straight_distance(self, dist_right: int, dist_left: int) -> float:
+        """
+        length of the chord of one sample in cm, as in calculate_part
+        """
+        dist_right = dist_right * self.cm_per_degree
+        dist_left = dist_left * self.cm_per_degree
+        alpha = (dist_left - dist_right) / self.dist_btw_wheels
+        if alpha != 0:
+            return (dist_right + dist_left) / alpha * math.sin(alpha / 2)
+        return dist_right
+
+    def move(self, dist_right: int, dist_left: int) -> Tuple[int, int, int]:
+        turn = (dist_left - dist_right) * self.unit
+        distance = round(self.straight_distance(dist_right, dist_left) * (1 << self.POS_BITS))
+        # half a table entry is added to round the direction to the nearest entry
+        return (turn >> 1) + self.half, turn, distance
+
+    def load(self, pos_x: float, pos_y: float, gamma: float):
+        scale = 1 << self.POS_BITS
+        self.x = round(pos_x * scale)
+        self.y = round(pos_y * scale)
+        self.phase = round(gamma * self.full / (2 * math.pi)) % self.full
+
+    def pose(self) -> Tuple[float, float, float]:
+        """
+        returns x and y in cm and gamma in radians in range 0..2pi
+        """
+        scale = 1 << self.POS_BITS
+        return self.x / scale, self.y / scale, self.phase * 2 * math.pi / self.full
+
+    def step(self, dist_right: int, dist_left: int):
+        """
+        integrates one sample, deltas outside RANGE are computed instead of looked up
+        """
+        right = dist_right + self.RANGE
+        left = dist_left + self.RANGE
+        if 0 <= right < self.width and 0 <= left < self.width:
+            offset, turn, distance = self.moves[right * self.width + left]
+        else:
+            offset, turn, distance = self.move(dist_right, dist_left)
+        # the step goes in direction gamma + alpha / 2 like in calculate_part
+        index = ((self.phase + offset) >> self.FRAC_BITS) & self.mask
+        sin = self.sin
+        self.x += (sin[index] * distance) >> self.POS_BITS
+        self.y += (sin[(index + self.quarter) & self.mask] * distance) >> self.POS_BITS
+        self.phase = (self.phase - turn) & self.full_mask
+
+
+class OdometryCalibration:
+    """
+    Estimates the distance between the wheels and the wheel circumference from the paths the server confirmed
+
+    Both are fitted by recursive least squares over the paths, the turn per motor degree from the end direction and
+    the distance per motor degree from the end node. Older paths are weighted down by FORGET, because their distance
+    fit used the turn estimate of their time. The defaults count as PRIOR_PATHS paths, so one bad path does not spoil
+    the parameters.
+    """
+    FORGET = 0.9
+    PRIOR_PATHS = 2
+    # motor degrees the left wheel turns more than the right one for a turn by 90 degree
+    PRIOR_TURN = 550
+    # motor degrees per wheel for one grid unit of 50 cm
+    PRIOR_DISTANCE = 1900
+    # observations whose end pose is further off are not caused by the parameters, e.g. a different line was followed
+    MAX_HEADING_ERROR = math.pi / 4
+    MAX_POSITION_ERROR = 25
+
+    def __init__(self, dist_btw_wheels: float = 9.2, wheel_circumference: float = 3 * math.pi):
+        """
+        :param dist_btw_wheels: Float: distance between the wheels in cm used until paths are observed
+        :param wheel_circumference: Float: wheel circumference in cm used until paths are observed
+        """
+        cm_per_degree = wheel_circumference / 360
+        # sums of the least squares fits: turn = turn_rate * degree difference, distance = cm_per_degree * degree
+        self.turn_weight = self.PRIOR_PATHS * self.PRIOR_TURN ** 2
+        self.turn_sum = self.turn_weight * cm_per_degree / dist_btw_wheels
+        self.distance_weight = self.PRIOR_PATHS * self.PRIOR_DISTANCE ** 2
+        self.distance_sum = self.distance_weight * cm_per_degree
+        self.paths = 0
+
+    @property
+    def turn_rate(self) -> float:
+        return self.turn_sum / self.turn_weight
+
+    @property
+    def cm_per_degree(self) -> float:
+        return self.distance_sum / self.distance_weight
+
+    def parameters(self) -> Tuple[float, float]:
+        """
+        returns the estimated distance between the wheels and wheel circumference in cm
+        """
+        return self.cm_per_degree / self.turn_rate, self.cm_per_degree * 360
+
+    def observe(self, right: List[int], left: List[int], start: Tuple[float, float, float],
+                end: Tuple[float, float, float]) -> bool:
+        """
+        adds a driven path to the fit
+        right -- motor degrees of the right wheel per sample
+        left -- motor degrees of the left wheel per sample
+        start -- x and y in cm and gamma in radians where the path started
+        end -- x and y in cm and gamma in radians of the robot at the end of the path as confirmed by the server
+        returns whether the path was used
+        """
+        difference = sum(left) - sum(right)
+        turn = start[2] - end[2]
+        # the end direction only tells the turn modulo 2 pi
+        turn += 2 * math.pi * round((self.turn_rate * difference - turn) / (2 * math.pi))
+        if abs(turn - self.turn_rate * difference) > self.MAX_HEADING_ERROR:
+            return False
+        turn_weight = self.FORGET * self.turn_weight + difference * difference
+        turn_sum = self.FORGET * self.turn_sum + difference * turn
+        turn_rate = turn_sum / turn_weight
+
+        # way of the path in motor degrees with the new turn estimate, each sample like in Odometry.calculate_part:
+        # the chord of the arc in the direction gamma + beta, gamma turns by alpha = 2 * beta afterwards
+        way_x = way_y = 0.0
+        gamma = start[2]
+        for dist_right, dist_left in zip(right, left):
+            beta = turn_rate * (dist_left - dist_right) / 2
+            chord = (dist_right + dist_left) / 2 * (math.sin(beta) / beta if beta != 0 else 1)
+            way_x += chord * math.sin(gamma + beta)
+            way_y += chord * math.cos(gamma + beta)
+            gamma -= 2 * beta
+        distance_x = end[0] - start[0]
+        distance_y = end[1] - start[1]
+        if math.hypot(distance_x - self.cm_per_degree * way_x,
+                      distance_y - self.cm_per_degree * way_y) > self.MAX_POSITION_ERROR:
+            return False
+        # both fits only change together
+        self.turn_weight = turn_weight
+        self.turn_sum = turn_sum
+        self.distance_weight = self.FORGET * self.distance_weight + way_x * way_x + way_y * way_y
+        self.distance_sum = self.FORGET * self.distance_sum + way_x * distance_x + way_y * distance_y
+        self.paths += 1
+        return True
+
+    def save(self, path: str):
+        """
+        writes the state of the fit, the file is replaced at once so a crash does not leave half a file
+        """
+        with open(path + ".tmp", "w") as file:
+            json.dump({"turn": [self.turn_weight, self.turn_sum],
+                       "distance": [self.distance_weight, self.distance_sum], "paths": self.paths}, file)
+        os.replace(path + ".tmp", path)
+
+    @classmethod
+    def load(cls, path: str, dist_btw_wheels: float = 9.2, wheel_circumference: float = 3 * math.pi):
+        """
+        reads the state written by save, starts with the given parameters if there is no valid file
+        """
+        calibration = cls(dist_btw_wheels, wheel_circumference)
+        try:
+            with open(path) as file:
+                state = json.load(file)
+            turn_weight, turn_sum = state["turn"]
+            distance_weight, distance_sum = state["distance"]
+            paths = state["paths"]
+        except (OSError, ValueError, KeyError, TypeError):
+            return calibration
+        if turn_weight > 0 and turn_sum > 0 and distance_weight > 0 and distance_sum > 0:
+            calibration.turn_weight, calibration.turn_sum = turn_weight, turn_sum
+            calibration.distance_weight, calibration.distance_sum = distance_weight, distance_sum
+            calibration.paths = paths
+        return calibration
+
 
 class Odometry:
-    def __init__(self, gamma: float, pos_x: float, pos_y: float, dist_btw_wheels):
+    def __init__(self, gamma: float, pos_x: float, pos_y: float, dist_btw_wheels, fixed_point: bool = False,
+                 wheel_circumference: float = 3 * math.pi, calibration: OdometryCalibration = None):
         """
         Initializes odometry module
+        fixed_point -- integrate samples with the FixedPointKernel instead of calculate_part
+        calibration -- takes dist_btw_wheels and wheel_circumference from calibration and records the samples of
+        every path for confirm_path
         """
+        self.calibration = calibration
+        if calibration is not None:
+            dist_btw_wheels, wheel_circumference = calibration.parameters()
         self.dist_btw_wheels: float = dist_btw_wheels
+        self.wheel_circumference: float = wheel_circumference
         self.debug = debug.Debug()
         self.gamma: float = gamma
         self.posX: float = pos_x
@@ -21,6 +249,14 @@ class Odometry:
         self.new_m2 = 0
         self.old_m1 = 0
         self.old_m2 = 0
+        # samples integrated by add_sample since start_path
+        self.samples = 0
+        # motor degrees per sample since start_path, only recorded with a calibration
+        self.right_ticks = array('l')
+        self.left_ticks = array('l')
+        self.kernel = FixedPointKernel(self.ditance_per_tick(1), dist_btw_wheels) if fixed_point else None
+        # whether the pose of the current path is in the kernel instead of posX, posY and gamma
+        self.kernel_loaded = False
 
     def gamma_to_direction(self, gamma) -> Direction:
         """
@@ -67,11 +303,41 @@ class Odometry:
             self.posX += d_x
             self.posY += d_y
 
+    def calculate_parts(self, dist_right, dist_left):
+        """
+        calculates many parts at once with numpy, same result as calculate_part for every sample
+        used to replay recorded motor degrees offline
+        dist_right -- array of distances travelled by the right wheel in degree
+        dist_left -- array of distances travelled by the left wheel in degree
+        returns x, y and gamma after every sample as arrays
+        """
+        if numpy is None:
+            raise ImportError("calculate_parts needs numpy")
+        dist_right = self.ditance_per_tick(numpy.asarray(dist_right, dtype=numpy.float64))
+        dist_left = self.ditance_per_tick(numpy.asarray(dist_left, dtype=numpy.float64))
+        alpha = (dist_left - dist_right) / self.dist_btw_wheels
+        beta = alpha / 2
+        turning = alpha != 0
+        straight_distance = dist_right.copy()
+        straight_distance[turning] = (dist_right[turning] + dist_left[turning]) / alpha[turning] \
+            * numpy.sin(beta[turning])
+        # gamma before every sample
+        gamma_after = self.gamma - numpy.cumsum(alpha)
+        gamma_before = numpy.concatenate(([self.gamma], gamma_after[:-1]))
+        x = self.posX + numpy.cumsum(numpy.sin(gamma_before + beta) * straight_distance)
+        y = self.posY + numpy.cumsum(numpy.cos(gamma_before + beta) * straight_distance)
+        gamma = gamma_after % (2 * math.pi)
+        if len(x):
+            self.posX = float(x[-1])
+            self.posY = float(y[-1])
+            self.gamma = float(gamma[-1])
+        return x, y, gamma
+
     def ditance_per_tick(self, degree: int) -> float:
         """
         converts motordegree to centimeters
         """
-        return (3 * math.pi) / 360 * degree
+        return self.wheel_circumference / 360 * degree
 
     def calculate_new_position(self, moves: List[Tuple[int, int]]):
         """
@@ -79,10 +345,110 @@ class Odometry:
         """
 
         for i in moves:
-            self.calculate_part(i[0], i[1])
+            self.integrate(i[0], i[1])
+        self.finish_path()
+
+    def integrate(self, dist_right: int, dist_left: int):
+        """
+        calculates one part with the kernel selected by fixed_point
+        """
+        if self.kernel is None:
+            self.calculate_part(dist_right, dist_left)
+            return
+        if not self.kernel_loaded:
+            self.kernel.load(self.posX, self.posY, self.gamma)
+            self.kernel_loaded = True
+        self.kernel.step(dist_right, dist_left)
+
+    def start_path(self):
+        """
+        starts integrating a new path, the motor positions have to be reset to 0 as well
+        """
+        self.old_m1 = 0
+        self.old_m2 = 0
+        self.new_m1 = 0
+        self.new_m2 = 0
+        self.samples = 0
+        self.kernel_loaded = False
+        self.right_ticks = array('l')
+        self.left_ticks = array('l')
+
+    def add_sample(self, m1: int, m2: int):
+        """
+        integrates the movement since the last sample at once, instead of collecting it for calculate_new_position
+        m1 -- current position of the right motor in degree
+        m2 -- current position of the left motor in degree
+        """
+        self.old_m1 = self.new_m1
+        self.old_m2 = self.new_m2
+        self.new_m1 = m1
+        self.new_m2 = m2
+        self.integrate(m1 - self.old_m1, m2 - self.old_m2)
+        self.samples += 1
+        if self.calibration is not None:
+            self.right_ticks.append(m1 - self.old_m1)
+            self.left_ticks.append(m2 - self.old_m2)
+
+    def pose(self) -> Tuple[float, float, float]:
+        """
+        returns the current position in centimeters and gamma in radians while a path is integrated
+        """
+        if self.kernel_loaded:
+            return self.kernel.pose()
+        return self.posX, self.posY, self.gamma
+
+    def finish_path(self, grid: NodeGrid = None, start: Tuple[Tuple[int, int], Direction] = None):
+        """
+        converts the integrated pose to grid coordinates and a Direction when a node is reached
+        grid -- known nodes of the planet, the pose is snapped to the most likely end of the path instead of rounded
+        start -- ((startX, startY), startDirection) of the path, needed with grid
+        """
+        if self.kernel_loaded:
+            self.posX, self.posY, self.gamma = self.kernel.pose()
+            self.kernel_loaded = False
+        if grid is not None:
+            # the pose is relative to the start node, a grid unit is 50 cm
+            (node_x, node_y), end_direction = grid.snap(start[0][0] + self.posX / 50, start[0][1] + self.posY / 50,
+                                                        math.degrees(self.gamma), exclude=start)
+            self.posX = node_x - start[0][0]
+            self.posY = node_y - start[0][1]
+            self.gamma = Direction((end_direction + 180) % 360)
+            self.debug.bprint(f"{Color.green}X = {self.posX}, Y = {self.posY}, gamma = {self.gamma}{Color.reset}")
+            return
         self.gamma = self.gamma_to_direction(self.gamma * 180 / math.pi)
         # print(f"not rounded X,Y = {self.pos_x}, {self.pos_y}")
         self.posX = round(self.posX / 50)
         self.posY = round(self.posY / 50)
 
         self.debug.bprint(f"{Color.green}X = {self.posX}, Y = {self.posY}, gamma = {self.gamma}{Color.reset}")
+
+    def set_parameters(self, dist_btw_wheels: float, wheel_circumference: float):
+        """
+        changes the distance between the wheels and the wheel circumference, the fixed point tables are rebuilt
+        """
+        if self.kernel_loaded:
+            self.posX, self.posY, self.gamma = self.kernel.pose()
+            self.kernel_loaded = False
+        self.dist_btw_wheels = dist_btw_wheels
+        self.wheel_circumference = wheel_circumference
+        if self.kernel is not None:
+            self.kernel = FixedPointKernel(self.ditance_per_tick(1), dist_btw_wheels)
+
+    def confirm_path(self, start: Tuple[Tuple[int, int], Direction], target: Tuple[Tuple[int, int], Direction]):
+        """
+        fits the calibration to the path driven since start_path and uses the new parameters
+        start -- ((startX, startY), startDirection) of the path
+        target -- ((endX, endY), endDirection) as confirmed by the server
+        """
+        if self.calibration is None or not self.right_ticks:
+            return
+        # the robot arrives facing the opposite of the end direction, a grid unit is 50 cm
+        used = self.calibration.observe(self.right_ticks, self.left_ticks,
+                                        (start[0][0] * 50, start[0][1] * 50, math.radians(start[1])),
+                                        (target[0][0] * 50, target[0][1] * 50, math.radians(target[1] + 180)))
+        self.right_ticks = array('l')
+        self.left_ticks = array('l')
+        if used:
+            self.set_parameters(*self.calibration.parameters())
+            self.debug.bprint(f"dist_btw_wheels = {self.dist_btw_wheels:.2f}, "
+                              f"wheel_circumference = {self.wheel_circumference:.2f}")
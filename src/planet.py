@@ -1,9 +1,13 @@
 #!/usr/bin/env python3
 
 # Attention: Do not import the ev3dev.ev3 module in this file
+import heapq
 import math
+from array import array
+from collections.abc import Mapping
 from enum import IntEnum, unique
-from typing import List, Tuple, Dict, Union, Optional
+from types import MappingProxyType
+from typing import List, Tuple, Dict, Union, Optional, Iterator
 import debug
 
 Weight = int
@@ -25,21 +29,404 @@ class Direction(IntEnum):
     WEST = 270
 
 
+# slot of a direction within the four paths of a node in CompactPaths
+DIRECTION_SLOTS = {direction: slot for slot, direction in enumerate(Direction)}
+SLOT_DIRECTIONS = tuple(Direction)
+
+
+class CompactNodePaths(Mapping):
+    """
+    Read-only view on the paths of a node stored in CompactPaths, behaves like the path dict of a node in Planet.paths
+    """
+    __slots__ = ("storage", "base", "matches")
+
+    def __init__(self, storage: "CompactPaths", base: int, matches=None):
+        """
+        :param storage: CompactPaths
+        :param base: Integer: first slot of the node
+        :param matches: Optional[Callable[[int], bool]]: only paths with a matching weight are part of the view
+        """
+        self.storage = storage
+        self.base = base
+        self.matches = matches
+
+    def __getitem__(self, direction: Direction) -> Tuple[Tuple[int, int], Direction, Weight]:
+        path = self.storage.get_slot(self.base + DIRECTION_SLOTS[direction])
+        if self.matches is not None and not self.matches(path[2]):
+            raise KeyError(direction)
+        return path
+
+    def __iter__(self) -> Iterator[Direction]:
+        if self.matches is None:
+            return iter(SLOT_DIRECTIONS)
+        weights = self.storage.weights
+        return (direction for slot, direction in enumerate(SLOT_DIRECTIONS, self.base) if self.matches(weights[slot]))
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+    def __repr__(self) -> str:
+        return repr(dict(self))
+
+
+class MutableCompactNodePaths(CompactNodePaths):
+    """
+    View on the four paths of a node stored in CompactPaths which allows to set paths
+    """
+    __slots__ = ()
+
+    def __setitem__(self, direction: Direction, path: Tuple[Tuple[int, int], Direction, Weight]):
+        self.storage.set_slot(self.base + DIRECTION_SLOTS[direction], path)
+
+
+class CompactPaths(Mapping):
+    """
+    Memory saving storage for Planet.paths
+
+    Coordinates are interned to integer ids, the target node id, target direction and weight of every path are kept
+    in flat arrays with four slots per node. Reading a path creates its 3-Tuple on demand.
+    """
+    __slots__ = ("ids", "coords", "node_bases", "node_ids", "target_ids", "target_dirs", "weights")
+
+    def __init__(self):
+        self.ids: Dict[Tuple[int, int], int] = {}
+        self.coords: List[Tuple[int, int]] = []
+        self.node_bases = array('i')  # first slot of the node with this id, -1 if the coordinate is no node
+        self.node_ids = array('i')  # ids of all nodes in insertion order
+        self.target_ids = array('i')
+        self.target_dirs = array('b')
+        self.weights = array('i')
+
+    def intern(self, coord: Tuple[int, int]) -> int:
+        """
+        Returns the id of a coordinate, unknown coordinates get a new id
+        """
+        coord_id = self.ids.get(coord)
+        if coord_id is None:
+            coord_id = len(self.coords)
+            self.ids[coord] = coord_id
+            self.coords.append(coord)
+            self.node_bases.append(-1)
+        return coord_id
+
+    def get_slot(self, slot: int) -> Tuple[Tuple[int, int], Direction, Weight]:
+        return self.coords[self.target_ids[slot]], SLOT_DIRECTIONS[self.target_dirs[slot]], self.weights[slot]
+
+    def set_slot(self, slot: int, path: Tuple[Tuple[int, int], Direction, Weight]):
+        self.target_ids[slot] = self.intern(path[0])
+        self.target_dirs[slot] = DIRECTION_SLOTS[path[1]]
+        self.weights[slot] = path[2]
+
+    def node_base(self, node: Tuple[int, int]) -> int:
+        """
+        Returns the first slot of a node
+        """
+        coord_id = self.ids.get(node)
+        if coord_id is None or self.node_bases[coord_id] < 0:
+            raise KeyError(node)
+        return self.node_bases[coord_id]
+
+    def __getitem__(self, node: Tuple[int, int]) -> MutableCompactNodePaths:
+        return MutableCompactNodePaths(self, self.node_base(node))
+
+    def __setitem__(self, node: Tuple[int, int], paths):
+        """
+        Adds a node with unknown paths if necessary and sets the given paths of the node
+        """
+        coord_id = self.intern(node)
+        if self.node_bases[coord_id] < 0:
+            self.node_bases[coord_id] = len(self.weights)
+            self.node_ids.append(coord_id)
+            unknown = self.intern((0, 0))
+            for _ in SLOT_DIRECTIONS:
+                self.target_ids.append(unknown)
+                self.target_dirs.append(0)
+                self.weights.append(-2)
+        node_paths = self[node]
+        for direction, path in dict(paths).items():
+            node_paths[direction] = path
+
+    def __contains__(self, node) -> bool:
+        coord_id = self.ids.get(node)
+        return coord_id is not None and self.node_bases[coord_id] >= 0
+
+    def __iter__(self) -> Iterator[Tuple[int, int]]:
+        coords = self.coords
+        return (coords[coord_id] for coord_id in self.node_ids)
+
+    def __len__(self) -> int:
+        return len(self.node_ids)
+
+    def __repr__(self) -> str:
+        return repr(dict(self))
+
+
+class PathIndex:
+    """
+    Read-only view on all paths of a planet whose weight matches a filter.
+    Planet updates it on every change of a path, so reading it never copies the whole map.
+    """
+
+    def __init__(self, matches, keep_empty_nodes: bool = False):
+        """
+        :param matches: Callable[[int], bool]: returns whether a path with the given weight belongs to the index
+        :param keep_empty_nodes: bool: whether nodes without matching paths are part of the index
+        """
+        self.matches = matches
+        self.keep_empty_nodes = keep_empty_nodes
+        self.nodes: Dict[Tuple[int, int], Dict[Direction, Tuple[Tuple[int, int], Direction, Weight]]] = {}
+        self.node_views: Dict[Tuple[int, int], MappingProxyType] = {}
+        self.view = MappingProxyType(self.node_views)
+
+    def add_node(self, node: Tuple[int, int]):
+        if self.keep_empty_nodes and node not in self.nodes:
+            self.create_node(node)
+
+    def create_node(self, node: Tuple[int, int]):
+        self.nodes[node] = {}
+        self.node_views[node] = MappingProxyType(self.nodes[node])
+
+    def update(self, node: Tuple[int, int], direction: Direction, path: Tuple[Tuple[int, int], Direction, Weight]):
+        """
+        Adds, replaces or removes the path of node in direction depending on its weight
+        """
+        if self.matches(path[2]):
+            if node not in self.nodes:
+                self.create_node(node)
+            node_paths = self.nodes[node]
+            node_paths[direction] = path
+            if list(node_paths) != sorted(node_paths):
+                # keep the direction order of Planet.paths, planners prefer the first of equally weighted paths
+                ordered = sorted(node_paths.items())
+                node_paths.clear()
+                node_paths.update(ordered)
+        elif node in self.nodes and direction in self.nodes[node]:
+            del self.nodes[node][direction]
+            if not self.nodes[node] and not self.keep_empty_nodes:
+                del self.nodes[node]
+                del self.node_views[node]
+
+
+class CompactPathIndex(Mapping):
+    """
+    PathIndex for planets with CompactPaths storage, only the nodes with matching paths are stored.
+    The paths of a node are read from the storage on demand.
+    """
+
+    def __init__(self, storage: CompactPaths, matches, keep_empty_nodes: bool = False):
+        """
+        :param storage: CompactPaths: paths of the planet
+        :param matches: Callable[[int], bool]: returns whether a path with the given weight belongs to the index
+        :param keep_empty_nodes: bool: whether nodes without matching paths are part of the index
+        """
+        self.storage = storage
+        self.matches = matches
+        self.keep_empty_nodes = keep_empty_nodes
+        self.nodes: Dict[Tuple[int, int], None] = {}  # used as insertion ordered set
+        self.view = self
+
+    def add_node(self, node: Tuple[int, int]):
+        if self.keep_empty_nodes:
+            self.nodes[node] = None
+
+    def update(self, node: Tuple[int, int], direction: Direction, path: Tuple[Tuple[int, int], Direction, Weight]):
+        """
+        Adds or removes the node depending on the weights of its paths
+        """
+        if self.matches(path[2]):
+            self.nodes[node] = None
+        elif node in self.nodes and not self.keep_empty_nodes:
+            base = self.storage.node_base(node)
+            weights = self.storage.weights
+            if not any(self.matches(weights[slot]) for slot in range(base, base + len(SLOT_DIRECTIONS))):
+                del self.nodes[node]
+
+    def __getitem__(self, node: Tuple[int, int]) -> CompactNodePaths:
+        if node not in self.nodes:
+            raise KeyError(node)
+        return CompactNodePaths(self.storage, self.storage.node_base(node), self.matches)
+
+    def __contains__(self, node) -> bool:
+        return node in self.nodes
+
+    def __iter__(self) -> Iterator[Tuple[int, int]]:
+        return iter(self.nodes)
+
+    def __len__(self) -> int:
+        return len(self.nodes)
+
+    def __repr__(self) -> str:
+        return repr({node: dict(self[node]) for node in self})
+
+
+class Frontier:
+    """
+    Exploration frontier of the DFS: all paths which are detected or unknown, keyed by (node, direction).
+    Status updates are O(1), the most recently added entry is found in amortized O(1) via a LIFO index.
+    """
+
+    def __init__(self):
+        self.entries: Dict[Tuple[Tuple[int, int], Direction], int] = {}
+        self.lifo: List[Tuple[Tuple[int, int], Direction]] = []
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, position: Tuple[Tuple[int, int], Direction]) -> bool:
+        return position in self.entries
+
+    def push(self, position: Tuple[Tuple[int, int], Direction], weight: int):
+        """
+        Adds a path to the frontier or updates its weight without changing its position in the LIFO order
+        """
+        if position not in self.entries:
+            self.lifo.append(position)
+        self.entries[position] = weight
+
+    def discard(self, position: Tuple[Tuple[int, int], Direction]):
+        """
+        Removes a path from the frontier, the LIFO index is cleaned up lazily
+        """
+        self.entries.pop(position, None)
+        if len(self.lifo) > 2 * len(self.entries) + 16:
+            self.compact()
+
+    def compact(self):
+        """
+        Rebuilds the LIFO index without discarded entries, so it stays within twice the size of the frontier
+        Called by discard when the index grew too big, amortized O(1) per discard.
+        """
+        self.lifo = [position for position in self.lifo if position in self.entries]
+
+    def latest(self) -> Iterator[Tuple[Tuple[int, int], Direction]]:
+        """
+        Yields all paths of the frontier, most recently added first
+        """
+        # drop entries which were discarded in the meantime from the top of the LIFO index
+        while self.lifo and self.lifo[-1] not in self.entries:
+            self.lifo.pop()
+        seen = set()
+        for position in reversed(self.lifo):
+            if position in self.entries and position not in seen:
+                seen.add(position)
+                yield position
+
+
+class NodeGrid:
+    """
+    Spatial index of the known nodes: grid coordinates -> directions in which a path may still end at the node.
+    Planet updates it on every change of a path. snap uses it to find the node an odometry pose most likely belongs to.
+    """
+    # window of nodes around the rounded pose which are considered, in grid units
+    RADIUS = 1
+
+    def __init__(self):
+        # bit d // 90 is set if the path of the node in direction d is unknown or detected but not explored yet
+        self.open: Dict[Tuple[int, int], int] = {}
+
+    def __contains__(self, node) -> bool:
+        return node in self.open
+
+    def __len__(self) -> int:
+        return len(self.open)
+
+    def update(self, node: Tuple[int, int], direction: Direction, path: Tuple[Tuple[int, int], Direction, Weight]):
+        bit = 1 << (direction // 90)
+        if path[2] in (0, -2):
+            self.open[node] = self.open.get(node, 0) | bit
+        else:
+            self.open[node] = self.open.get(node, 0) & ~bit
+
+    def open_directions(self, node: Tuple[int, int]) -> List[Direction]:
+        """
+        Returns the directions in which a path may end at node, all directions for an unknown node
+        """
+        mask = self.open.get(node, 0b1111)
+        return [direction for direction in Direction if mask & (1 << (direction // 90))]
+
+    def snap(self, x: float, y: float, heading: float, exclude: Optional[Tuple[Tuple[int, int], Direction]] = None,
+             position_error: float = 0.25, heading_error: float = 25, new_node: float = 0.5) \
+            -> Tuple[Tuple[int, int], Direction]:
+        """
+        Returns the most likely end of a path for an odometry pose
+        A known node is only a candidate in the directions where a path may still end, an unknown node in every
+        direction but less likely by new_node.
+        :param x: Float: estimated x in grid units
+        :param y: Float: estimated y in grid units
+        :param heading: Float: estimated direction the robot faces in degree, it arrives opposite to the end direction
+        :param exclude: 2-Tuple: start of the driven path, the robot cannot end in the direction it left
+        :param position_error: Float: standard deviation of x and y in grid units
+        :param heading_error: Float: standard deviation of heading in degree
+        :param new_node: Float: prior probability of an unknown node relative to a known one
+        :return: 2-Tuple: node and end direction
+        """
+        best = None
+        best_score = -math.inf
+        center_x = round(x)
+        center_y = round(y)
+        for node_x in range(center_x - self.RADIUS, center_x + self.RADIUS + 1):
+            for node_y in range(center_y - self.RADIUS, center_y + self.RADIUS + 1):
+                node = (node_x, node_y)
+                mask = self.open.get(node)
+                prior = 0.0 if mask is not None else math.log(new_node)
+                distance = ((node_x - x) ** 2 + (node_y - y) ** 2) / (2 * position_error ** 2)
+                for direction in Direction:
+                    if mask is not None and not mask & (1 << (direction // 90)) or (node, direction) == exclude:
+                        continue
+                    # difference between heading and the opposite of direction in range -180..180
+                    turn = (heading - direction) % 360 - 180
+                    score = prior - distance - turn ** 2 / (2 * heading_error ** 2)
+                    if score > best_score:
+                        best = (node, direction)
+                        best_score = score
+        if best is None:
+            return (center_x, center_y), Direction((round(heading / 90) * 90 + 180) % 360)
+        return best
+
+
 class Planet:
     """
     Contains the representation of the map and provides certain functions to manipulate or extend
     it according to the specifications
     """
 
-    def __init__(self):
-        """ Initializes the data structure """
+    def __init__(self, compact: bool = False):
+        """
+        Initializes the data structure
+        :param compact: bool: store the paths in CompactPaths instead of nested dicts to save memory
+        """
         self.debug = debug.Debug(3)
         self.target = None
-        self.paths = {}
+        self.paths = CompactPaths() if compact else {}
         self.planet_name = ""
         self.start = None  # Tuple[Tuple[int, int], Direction]
         self.new_planet = True
-        self.stack: List[Tuple[Tuple[int, int], Direction, int]] = []
+        self.stack = Frontier()
+        self.use_dfs = False  # explore with dfs() instead of get_direction_djikstra_list()
+        # incremented whenever the weight of a path changes, cached routes of older versions are invalid
+        self.version = 0
+        self.route_cache: Dict[Tuple[Tuple[int, int], Tuple[int, int], Optional[Direction]],
+                               Tuple[Optional[List[Tuple[Tuple[int, int], Direction]]], int]] = {}
+        self.route_cache_version = 0
+        self.route_cache_hits = 0
+        self.route_cache_misses = 0
+        # smallest weight per grid unit of all free paths, scales the A* heuristic
+        self.min_weight_per_unit: Optional[float] = None
+        # number of nodes settled by the last shortest path search
+        self.expanded_nodes = 0
+        # additional cost of a 90 degree turn at a node in weight units, routes minimise driving time if > 0
+        self.turn_cost = 0.0
+        # known nodes with the directions in which a path may still end, for snapping odometry poses
+        self.node_grid = NodeGrid()
+        # indices of self.paths by path status, updated in set_path
+        if compact:
+            self.free_paths = CompactPathIndex(self.paths, lambda weight: weight > 0)
+            self.free_detected_paths = CompactPathIndex(self.paths, lambda weight: weight > -1, keep_empty_nodes=True)
+            self.detected_unknown_paths = CompactPathIndex(self.paths, lambda weight: weight in (0, -2))
+        else:
+            self.free_paths = PathIndex(lambda weight: weight > 0)
+            self.free_detected_paths = PathIndex(lambda weight: weight > -1, keep_empty_nodes=True)
+            self.detected_unknown_paths = PathIndex(lambda weight: weight in (0, -2))
 
     def add_path(self, start: Tuple[Tuple[int, int], Direction], target: Tuple[Tuple[int, int], Direction],
                  weight: int):
@@ -67,25 +454,45 @@ class Planet:
 
         # no existing path
         if weight == -3 and self.paths[start[0]][start[1]][2] == -2:
-            self.paths[start[0]][start[1]] = (start[0], start[1], -3)
+            self.set_path(start[0], start[1], (start[0], start[1], -3))
             self.set_weight_in_stack(-3, start)
             # self.debug.bprint(f"Path Not Existing: {start}: {self.paths[start[0]][start[1]]}")
         # existing path but no more information
         elif weight == 0 and self.paths[start[0]][start[1]][2] == -2:
-            self.paths[start[0]][start[1]] = (start[0], start[1], 0)
+            self.set_path(start[0], start[1], (start[0], start[1], 0))
             self.set_weight_in_stack(0, start)
             # self.debug.bprint(f"Path Detected: {start}: {self.paths[start[0]][start[1]]}")
         # blocked path
         elif weight == -1 and self.paths[start[0]][start[1]][2] in (-2, 0):
-            self.paths[start[0]][start[1]] = (target[0], target[1], -1)
+            self.set_path(start[0], start[1], (target[0], target[1], -1))
             self.set_weight_in_stack(-1, start)
+            self.version += 1
             # self.debug.bprint(f"Path Blocked: {start}: {self.paths[start[0]][start[1]]}")
         elif weight > 0 and self.paths[start[0]][start[1]][2] in (-2, 0):
-            self.paths[start[0]][start[1]] = (target[0], target[1], weight)
-            self.paths[target[0]][target[1]] = (start[0], start[1], weight)
+            self.set_path(start[0], start[1], (target[0], target[1], weight))
+            self.set_path(target[0], target[1], (start[0], start[1], weight))
             self.set_weight_in_stack(1, start)
+            self.set_weight_in_stack(1, target)
+            self.version += 1
+            grid_distance = abs(start[0][0] - target[0][0]) + abs(start[0][1] - target[0][1])
+            if grid_distance > 0:
+                weight_per_unit = weight / grid_distance
+                if self.min_weight_per_unit is None or weight_per_unit < self.min_weight_per_unit:
+                    self.min_weight_per_unit = weight_per_unit
             # self.debug.bprint(f"Path Free: {start}: {self.paths[start[0]][start[1]]}")
 
+    def set_path(self, node: Tuple[int, int], direction: Direction, path: Tuple[Tuple[int, int], Direction, Weight]):
+        """
+        Sets the path of a node in a direction and keeps the path indices up to date
+        :param node: 2-Tuple
+        :param direction: Direction
+        :param path: 3-Tuple(target node, target direction, weight)
+        :return: void
+        """
+        self.paths[node][direction] = path
+        for index in (self.free_paths, self.free_detected_paths, self.detected_unknown_paths, self.node_grid):
+            index.update(node, direction, path)
+
     def add_unknown_path(self, start: Tuple[Tuple[int, int], Direction]):
         # to backtrack unknown paths
         self.paths[start] = ()
@@ -94,21 +501,14 @@ class Planet:
     def set_weight_in_stack(self, weight, position: Tuple[Tuple[int, int], Direction]):
         """
         only used while DFS is exploration algorithm
-        changes the weight of certain elements in the stack
-        weight -- the weight which the elements should be set to
+        changes the weight of a path in the stack, known paths are removed from the stack
+        weight -- the weight which the path should be set to
         position -- the position at which the weight should be set to
         """
-        cnt = 0
-        for i in self.stack:
-            if i[0] == position[0] and i[1] == position[1]:
-                if weight in (0, -2):
-                    self.stack[cnt] = (i[0], i[1], weight)
-                else:
-                    self.stack.pop(cnt)
-                # self.debug.bprint(f"{colorCodes.red}stack after deletion:{colorCodes.reset}", self.stack)
-                return
-            cnt += 1
-        self.stack.append((position[0], position[1], weight))
+        if weight in (0, -2):
+            self.stack.push(position, weight)
+        else:
+            self.stack.discard(position)
 
     def set_attached_paths(self, node: Tuple[int, int], dirList: List[Direction]):
         """
@@ -131,15 +531,15 @@ class Planet:
         :param node: 2-Tuple (posX, posY)
         :return: void
         """
-        nodepaths = {}
+        self.paths[node] = {}
+        self.free_detected_paths.add_node(node)
         for dir in Direction:
-            nodepaths[dir] = ((0, 0), 0, -2)
-            self.stack.append((node, dir, -2))
-        self.paths[node] = nodepaths
+            self.set_path(node, dir, ((0, 0), 0, -2))
+            self.stack.push((node, dir), -2)
 
     def get_paths(self) -> Dict[Tuple[int, int], Dict[Direction, Tuple[Tuple[int, int], Direction, Weight]]]:
         """
-        Returns all paths
+        Returns all free paths as read-only view
 
         Example:
             {
@@ -156,55 +556,28 @@ class Planet:
             }
         :return: Dict
         """
-        pathdict = {}
-        for node in self.paths:
-            for dir in self.paths[node]:
-                if self.paths[node][dir][2] > 0:
-                    if node not in pathdict:
-                        pathdict[node] = {}
-                    pathdict[node][dir] = self.paths[node][dir]
-        return pathdict
+        return self.free_paths.view
 
     def get_paths_free_blocked_detected(self):
         """
-        Get all free, blocked and detected path
+        Get all free, blocked and detected path as read-only view
         :return: Dict
         """
-        pathdict = {}
-        for node in self.paths:
-            pathdict[node] = {}
-            for dir in self.paths[node]:
-                if self.paths[node][dir][2] > -1:
-                    pathdict[node][dir] = self.paths[node][dir]
-        return pathdict
+        return self.free_detected_paths.view
 
     def get_paths_free_detected(self):
         """
-        Get all free and detected path
+        Get all free and detected path as read-only view
         :return: Dict
         """
-        pathdict = {}
-        for node in self.paths:
-            for dir in self.paths[node]:
-                if self.paths[node][dir][2] > 0:
-                    if node not in pathdict:
-                        pathdict[node] = {}
-                    pathdict[node][dir] = self.paths[node][dir]
-        return pathdict
+        return self.free_paths.view
 
     def get_paths_detected_unknown(self):
         """
-        Get all detected and unknown path
+        Get all detected and unknown path as read-only view
         :return: Dict
         """
-        pathdict = {}
-        for node in self.paths:
-            for dir in self.paths[node]:
-                if self.paths[node][dir][2] in (0, -2):
-                    if node not in pathdict:
-                        pathdict[node] = {}
-                    pathdict[node][dir] = self.paths[node][dir]
-        return pathdict
+        return self.detected_unknown_paths.view
 
     def set_start(self, coord: List[int], orientation: Direction):
         """
@@ -267,7 +640,7 @@ class Planet:
             return None
         return self.paths[node][direction][0], self.paths[node][direction][1]
 
-    def shortest_path(self, start: Tuple[int, int], target: Tuple[int, int]) -> Union[
+    def shortest_path(self, start: Tuple[int, int], target: Tuple[int, int], strategy: str = "dijkstra") -> Union[
         None, List[Tuple[Tuple[int, int], Direction]]]:
         """
         Returns a shortest path between two nodes
@@ -277,9 +650,21 @@ class Planet:
             shortest_path((0,0), (1,2)) returns: None
         :param start: 2-Tuple
         :param target: 2-Tuple
+        :param strategy: String: "dijkstra", "tutor", "astar", "bidirectional" or "turns"
         :return: 2-Tuple[List, Direction]
         """
-        return self.shortest_path_dijkstra(start, target)
+        if strategy == "tutor":
+            return self.shortest_path_tutor(start, target)
+        elif strategy == "astar":
+            return self.shortest_path_astar(start, target)
+        elif strategy == "bidirectional":
+            return self.shortest_path_bidirectional(start, target)
+        elif strategy == "turns":
+            heading = self.start[1] if self.start is not None and self.start[0] == start else None
+            return self.shortest_path_turns(start, target, heading)
+        elif strategy == "dijkstra":
+            return self.shortest_path_dijkstra(start, target)
+        raise ValueError(f"Unknown shortest path strategy: {strategy}")
 
     def shortest_path_dijkstra(self, start: Tuple[int, int], target: Tuple[int, int]) -> Union[
         None, List[Tuple[Tuple[int, int], Direction]]]:
@@ -361,50 +746,289 @@ class Planet:
         if target == start:
             return []
 
-        distance: Dict[Tuple[int, int], int] = dict()
-        predecessor: Dict[Tuple[int, int], Tuple[int, int]] = dict()
         all_paths = self.get_paths()
-        unchecked_verts = set(all_paths.keys())
+        if target not in all_paths or start not in all_paths:
+            return None
+
+        predecessor: Dict[Tuple[int, int], Optional[Tuple[int, int]]] = {}
+        self.expanded_nodes = 0
+        for node, _ in self.dijkstra_heap(start, all_paths, predecessor):
+            self.expanded_nodes += 1
+            if node == target:
+                return self.build_shortest_path_tutor(target, predecessor, all_paths)
+        return None
+
+    def shortest_path_astar(self, start: Tuple[int, int], target: Tuple[int, int]) -> Optional[
+            List[Tuple[Tuple[int, int], Direction]]]:
+        """
+        Returns a shortest path between two nodes using A*
+
+        The heuristic is the Manhattan distance to the target multiplied with the smallest known weight per grid
+        unit. No known path is cheaper per grid unit, so the heuristic never overestimates and the route is as short
+        as the one of shortest_path_tutor (on equally short routes another one may be chosen).
+        Without a path between two different nodes no scale is known and shortest_path_tutor is used.
+        :param start: 2-Tuple
+        :param target: 2-Tuple
+        :return: List, Direction
+        """
+        scale = self.min_weight_per_unit
+        if scale is None:
+            return self.shortest_path_tutor(start, target)
+        if target == start:
+            return []
 
-        if target not in unchecked_verts:
+        all_paths = self.get_paths()
+        if target not in all_paths or start not in all_paths:
             return None
 
-        self.init_dicts_tutor(start, distance, predecessor, unchecked_verts)
-        while unchecked_verts:
-            cur_vertex = None
-            min_dist = math.inf
-            for tup in unchecked_verts:
-                if distance[tup] < min_dist:
-                    min_dist = distance[tup]
-                    cur_vertex = tup
-            if cur_vertex is None:
-                return None
-            unchecked_verts.remove(cur_vertex)
+        def heuristic(node: Tuple[int, int]) -> float:
+            return scale * (abs(node[0] - target[0]) + abs(node[1] - target[1]))
+
+        distance: Dict[Tuple[int, int], int] = {start: 0}
+        predecessor: Dict[Tuple[int, int], Optional[Tuple[int, int]]] = {start: None}
+        closed = set()
+        # equal estimates prefer the node with the longer known distance, the counter keeps the heap stable
+        heap = [(heuristic(start), 0, 0, start)]
+        counter = 1
+        self.expanded_nodes = 0
+        while heap:
+            _, neg_dist, _, cur_vertex = heapq.heappop(heap)
+            if cur_vertex in closed:
+                continue
+            closed.add(cur_vertex)
+            self.expanded_nodes += 1
             if cur_vertex == target:
+                return self.build_shortest_path_tutor(target, predecessor, all_paths)
+            for neighbor, weight in self.get_neighbor_tutor(cur_vertex, all_paths):
+                if neighbor in closed:
+                    continue
+                alternative_dist = -neg_dist + weight
+                if alternative_dist < distance.get(neighbor, math.inf):
+                    distance[neighbor] = alternative_dist
+                    predecessor[neighbor] = cur_vertex
+                    heapq.heappush(heap, (alternative_dist + heuristic(neighbor), -alternative_dist, counter, neighbor))
+                    counter += 1
+        return None
+
+    def shortest_path_bidirectional(self, start: Tuple[int, int], target: Tuple[int, int]) -> Optional[
+            List[Tuple[Tuple[int, int], Direction]]]:
+        """
+        Returns a shortest path between two nodes using Dijkstra from start and from target at the same time
+
+        Every free path is stored in both directions, so the backward search uses the same paths. The search stops
+        as soon as the smallest distances of both sides together are not shorter than the best known route.
+        On equally short routes another one than the one of shortest_path_tutor may be chosen.
+        :param start: 2-Tuple
+        :param target: 2-Tuple
+        :return: List, Direction
+        """
+        if target == start:
+            return []
+
+        all_paths = self.get_paths()
+        if target not in all_paths or start not in all_paths:
+            return None
+
+        # index 0: search from start, index 1: search from target
+        distance: Tuple[Dict[Tuple[int, int], int], ...] = ({start: 0}, {target: 0})
+        predecessor: Tuple[Dict[Tuple[int, int], Optional[Tuple[int, int]]], ...] = ({start: None}, {target: None})
+        settled = (set(), set())
+        heaps = ([(0, start)], [(0, target)])
+        best_distance = math.inf
+        meeting_node = None
+        self.expanded_nodes = 0
+        while heaps[0] and heaps[1]:
+            if heaps[0][0][0] + heaps[1][0][0] >= best_distance:
                 break
-            for neighbor in self.get_neighbor_tutor(cur_vertex, all_paths):
-                if neighbor[0] in unchecked_verts:
-                    self.update_distance_tutor(cur_vertex, neighbor, distance, predecessor)
-        return self.build_shortest_path_tutor(target, predecessor, all_paths)
+            side = 0 if heaps[0][0][0] <= heaps[1][0][0] else 1
+            dist, cur_vertex = heapq.heappop(heaps[side])
+            if cur_vertex in settled[side]:
+                continue
+            settled[side].add(cur_vertex)
+            self.expanded_nodes += 1
+            for neighbor, weight in self.get_neighbor_tutor(cur_vertex, all_paths):
+                if neighbor == cur_vertex or neighbor in settled[side]:
+                    # self-loops never shorten a route
+                    continue
+                alternative_dist = dist + weight
+                if alternative_dist < distance[side].get(neighbor, math.inf):
+                    distance[side][neighbor] = alternative_dist
+                    predecessor[side][neighbor] = cur_vertex
+                    heapq.heappush(heaps[side], (alternative_dist, neighbor))
+                    if neighbor in distance[1 - side] and \
+                            alternative_dist + distance[1 - side][neighbor] < best_distance:
+                        best_distance = alternative_dist + distance[1 - side][neighbor]
+                        meeting_node = neighbor
+        if meeting_node is None:
+            return None
 
-    def init_dicts_tutor(self, start, distance, predecessor, unchecked_verts):
-        # *** Method from Tutor Planet ***
-        for tup in unchecked_verts:
-            distance[tup] = math.inf
-            predecessor[tup] = None
-        distance[start] = 0
+        # join both halves: the backward predecessors point towards the target
+        joined = dict(predecessor[0])
+        cur_vertex = meeting_node
+        while predecessor[1][cur_vertex] is not None:
+            joined[predecessor[1][cur_vertex]] = cur_vertex
+            cur_vertex = predecessor[1][cur_vertex]
+        return self.build_shortest_path_tutor(target, joined, all_paths)
+
+    def shortest_path_turns(self, start: Tuple[int, int], target: Tuple[int, int],
+                            heading: Optional[Direction] = None) -> Optional[List[Tuple[Tuple[int, int], Direction]]]:
+        """
+        Returns the route with the shortest driving time, every 90 degree turn at a node costs self.turn_cost
+
+        The search runs on (node, heading) states, the heading is the direction the robot faces after arriving.
+        :param start: 2-Tuple
+        :param target: 2-Tuple
+        :param heading: Direction the robot faces at start, None if the first turn is free
+        :return: List, Direction
+        """
+        if target == start:
+            return []
+
+        all_paths = self.get_paths()
+        if target not in all_paths or start not in all_paths:
+            return None
+
+        predecessor: Dict[Tuple[Tuple[int, int], Optional[Direction]],
+                          Optional[Tuple[Tuple[Tuple[int, int], Optional[Direction]], Direction]]] = {}
+        self.expanded_nodes = 0
+        for state, _ in self.dijkstra_states(start, heading, all_paths, predecessor):
+            self.expanded_nodes += 1
+            if state[0] == target:
+                return self.build_route_states(state, predecessor)
+        return None
+
+    def turns(self, heading: Optional[Direction], direction: Direction) -> int:
+        """
+        Returns how many 90 degree turns the robot needs at a node, Follow.turn always turns right
+        :param heading: Direction the robot faces, None if unknown
+        :param direction: Direction of the path to take
+        :return: Integer
+        """
+        if heading is None:
+            return 0
+        return ((direction - heading) % 360) // 90
+
+    def dijkstra_states(self, start: Tuple[int, int], heading: Optional[Direction], all_paths: Dict,
+                        predecessor: Dict) -> Iterator[Tuple[Tuple[Tuple[int, int], Optional[Direction]], float]]:
+        """
+        Dijkstra on (node, heading) states, yields every state with its driving cost as soon as it is settled
+        :param start: 2-Tuple: node to start the search from
+        :param heading: Direction the robot faces at start, None if the first turn is free
+        :param all_paths: Dict: free paths as returned by get_paths()
+        :param predecessor: Dict: filled with (previous state, direction) of every reached state
+        :return: Iterator[2-Tuple(state, cost)]
+        """
+        start_state = (start, heading)
+        distance = {start_state: 0}
+        predecessor[start_state] = None
+        settled = set()
+        heap = [(0, 0, start_state)]
+        counter = 1
+        while heap:
+            dist, _, state = heapq.heappop(heap)
+            if state in settled:
+                continue
+            settled.add(state)
+            yield state, dist
+            node, cur_heading = state
+            for direction, (end_node, end_direction, weight) in all_paths[node].items():
+                next_state = (end_node, Direction((end_direction + 180) % 360))
+                if next_state in settled:
+                    continue
+                alternative_dist = dist + weight + self.turn_cost * self.turns(cur_heading, direction)
+                if alternative_dist < distance.get(next_state, math.inf):
+                    distance[next_state] = alternative_dist
+                    predecessor[next_state] = (state, direction)
+                    heapq.heappush(heap, (alternative_dist, counter, next_state))
+                    counter += 1
+
+    def build_route_states(self, state, predecessor: Dict) -> List[Tuple[Tuple[int, int], Direction]]:
+        """
+        Builds the route to a state settled by dijkstra_states
+        """
+        route: List[Tuple[Tuple[int, int], Direction]] = []
+        while predecessor[state] is not None:
+            state, direction = predecessor[state]
+            route.append((state[0], direction))
+        route.reverse()
+        return route
+
+    def shortest_path_cached(self, start: Tuple[int, int], target: Tuple[int, int],
+                             heading: Optional[Direction] = None) -> Optional[List[Tuple[Tuple[int, int], Direction]]]:
+        """
+        Returns the same as shortest_path_tutor (shortest_path_turns if self.turn_cost is set), but reuses routes as
+        long as no path weight changed
+
+        Every node on a computed route is cached with the position of its suffix, so driving along a known route
+        does not need any further search.
+        :param start: 2-Tuple
+        :param target: 2-Tuple
+        :param heading: Direction the robot faces at start, only used with self.turn_cost
+        :return: List, Direction
+        """
+        if self.route_cache_version != self.version:
+            self.route_cache.clear()
+            self.route_cache_version = self.version
+        if not self.turn_cost:
+            heading = None
+        if (start, target, heading) in self.route_cache:
+            self.route_cache_hits += 1
+            route, offset = self.route_cache[(start, target, heading)]
+            return None if route is None else route[offset:]
+
+        self.route_cache_misses += 1
+        if self.turn_cost:
+            route = self.shortest_path_turns(start, target, heading)
+        else:
+            route = self.shortest_path_tutor(start, target)
+        self.route_cache[(start, target, heading)] = (route, 0)
+        if route is not None:
+            for offset, (node, direction) in enumerate(route):
+                self.route_cache[(node, target, heading)] = (route, offset)
+                if self.turn_cost:
+                    # heading after arriving at the next node of the route
+                    heading = Direction((self.paths[node][direction][1] + 180) % 360)
+        return route
+
+    def dijkstra_heap(self, start: Tuple[int, int], all_paths: Dict,
+                      predecessor: Dict[Tuple[int, int], Optional[Tuple[int, int]]]) \
+            -> Iterator[Tuple[Tuple[int, int], int]]:
+        """
+        Binary heap Dijkstra with lazy deletion, yields every node with its distance as soon as it is settled
+
+        Nodes with the same distance are settled in the iteration order of set(all_paths), which is the order the
+        linear minimum search of the tutor implementation used. Therefore the returned routes are identical.
+        The caller may stop iterating at any time, the predecessors of all yielded nodes are final.
+        :param start: 2-Tuple: node to start the search from
+        :param all_paths: Dict: free paths as returned by get_paths()
+        :param predecessor: Dict: filled with the predecessor of every reached node
+        :return: Iterator[2-Tuple(node, distance)]
+        """
+        rank = {node: i for i, node in enumerate(set(all_paths))}
+        distance: Dict[Tuple[int, int], int] = {start: 0}
+        predecessor[start] = None
+        settled = set()
+        heap = [(0, rank[start], start)]
+        while heap:
+            dist, _, cur_vertex = heapq.heappop(heap)
+            if cur_vertex in settled:
+                # stale heap entry, node was already settled with a smaller distance
+                continue
+            settled.add(cur_vertex)
+            yield cur_vertex, dist
+            for neighbor, weight in self.get_neighbor_tutor(cur_vertex, all_paths):
+                if neighbor in settled:
+                    continue
+                alternative_dist = dist + weight
+                if alternative_dist < distance.get(neighbor, math.inf):
+                    distance[neighbor] = alternative_dist
+                    predecessor[neighbor] = cur_vertex
+                    heapq.heappush(heap, (alternative_dist, rank[neighbor], neighbor))
 
     def get_neighbor_tutor(self, cur_vertex, all_paths):
         # *** Method from Tutor Planet ***
         return {(tup, weight) for tup, _, weight in all_paths[cur_vertex].values()}
 
-    def update_distance_tutor(self, cur_vertex, neighbor, distance, predecessor):
-        # *** Method from Tutor Planet ***
-        alternative_dist = distance[cur_vertex] + neighbor[1]
-        if alternative_dist < distance[neighbor[0]]:
-            distance[neighbor[0]] = alternative_dist
-            predecessor[neighbor[0]] = cur_vertex
-
     def build_shortest_path_tutor(self, target, predecessor, all_paths):
         # *** Method from Tutor Planet ***
         work_path = [target]
@@ -444,62 +1068,91 @@ class Planet:
         takes a list with all known path beginnings and removes them from the stack
         discovered -- paths that should be reomved from the stack
         """
-        for beginning in self.stack:
-            if (beginning[0], beginning[1]) in discovered:
-                self.stack.remove(beginning)
-
-    def dfs(self) -> Direction:
-        for path in self.stack:
-            if path[2] != 0 and path[2] != -2:
-                # remove all paths that are either blocked, not there or already known
-                self.stack.remove(path)
-        # paths = self.getPathsDetectedUnknown()
-        # for path in paths.values():
-        #     for i in path.values():
-        #         if i not in self.stack and (i[2] == 0 or i[2] == -2):
-        #             self.stack.append(i)
-        if not self.stack == []:
-            return self.stack[-1][1]
+        for beginning in discovered:
+            self.stack.discard(beginning)
 
-        else:
-            return
+    def dfs(self) -> Optional[Direction]:
+        """
+        Returns the next direction of a depth first exploration
+
+        Unexplored paths of the current node are taken first, otherwise the robot drives back to the node of the most
+        recently detected path which is still unexplored and reachable.
+        return: Direction or None if no reachable path is left
+        """
+        for dir in reversed(Direction):
+            if (self.start[0], dir) in self.stack:
+                return dir
+        unreachable = set()
+        for node, _ in self.stack.latest():
+            if node in unreachable:
+                continue
+            path = self.shortest_path_tutor(self.start[0], node)
+            if path:
+                return path[0][1]
+            unreachable.add(node)
+        return None
 
     def get_direction_djikstra_list(self):
+        if self.turn_cost:
+            return self.get_direction_turns()
+
         # current node
         for dir in self.paths[self.start[0]]:
             if self.paths[self.start[0]][dir][2] in [0, -2]:
                 return dir
 
-        # other nodes
-        unknownNode: Dict = self.get_paths_detected_unknown()
-        if unknownNode == {}:
+        # other nodes: single search from the current node which stops at the nearest node with unexplored paths
+        all_paths = self.get_paths()
+        if self.start[0] not in all_paths:
             return None
-        unknownNode: List = unknownNode.keys()
-        unknownNodeDistance: Dict = {}
-        unknownNodeDir: Dict = {}
-        for node in unknownNode:
-            pathSteps: List = self.shortest_path_tutor(self.start[0], node)
-            if pathSteps is None:
-                continue
-            weight = 0
-            for step in pathSteps:
-                weight += self.paths[step[0]][step[1]][2]
-            unknownNodeDistance[node] = weight
-            unknownNodeDir[node] = pathSteps[0][1]
-        self.debug.bprint(f"unknownNodeDistance: {unknownNodeDistance}")
-        if unknownNodeDistance == {}:
+        predecessor: Dict[Tuple[int, int], Optional[Tuple[int, int]]] = {}
+        candidates = set()
+        distance = None
+        for node, dist in self.dijkstra_heap(self.start[0], all_paths, predecessor):
+            if distance is not None and dist > distance:
+                break
+            if self.has_unexplored_path(node):
+                candidates.add(node)
+                distance = dist
+        if not candidates:
             # if only unreachable nodes are left
             return None
-        # distance = sorted(unknownNodeDistance.values())[0]
 
-        result_node = min(unknownNodeDistance, key=unknownNodeDistance.get)
-        distance = unknownNodeDistance[result_node]
+        # equally distant nodes are chosen in the order they were added to the planet
+        result_node = next(node for node in self.paths if node in candidates)
         self.debug.bprint(f"Target node to explored: {result_node} (Distance: {distance})")
-        for node in unknownNodeDistance:
-            if unknownNodeDistance[node] == distance:
-                return unknownNodeDir[node]
+        return self.build_shortest_path_tutor(result_node, predecessor, all_paths)[0][1]
+
+    def get_direction_turns(self) -> Optional[Direction]:
+        """
+        Returns the direction to the unexplored path with the shortest driving time including turns
+        return: Direction or None if no reachable path is left
+        """
+        heading = self.start[1]
+        # current node: the unexplored path with the fewest turns
+        unexplored = [dir for dir in Direction if self.paths[self.start[0]][dir][2] in (0, -2)]
+        if unexplored:
+            return min(unexplored, key=lambda dir: self.turns(heading, dir))
+
+        # other nodes
+        all_paths = self.get_paths()
+        if self.start[0] not in all_paths:
+            return None
+        predecessor: Dict = {}
+        for state, dist in self.dijkstra_states(self.start[0], heading, all_paths, predecessor):
+            if self.has_unexplored_path(state[0]):
+                self.debug.bprint(f"Target node to explored: {state[0]} (Cost: {dist})")
+                return self.build_route_states(state, predecessor)[0][1]
         return None
 
+    def has_unexplored_path(self, node: Tuple[int, int]) -> bool:
+        """
+        Returns whether a node has detected or unknown paths
+        :param node: 2-Tuple
+        :return: bool
+        """
+        return node in self.detected_unknown_paths.view
+
     def get_next_direction(self) -> Direction:
         """
         Return next direction.
@@ -507,7 +1160,7 @@ class Planet:
         """
         nextDir = None
         if self.target is not None:
-            shortestPath = self.shortest_path_tutor(self.start[0], self.target[0])
+            shortestPath = self.shortest_path_cached(self.start[0], self.target, self.start[1])
             if shortestPath is not None:
                 if shortestPath != []:
                     # self.debug.bprint(f"shortestPath: {shortestPath}")
@@ -518,8 +1171,9 @@ class Planet:
                 # self.debug.bprint("shortestPath is None")
                 pass
         if nextDir is None:
-            # self.debug.bprint("nextDir =",self.DFS(), "stack =", self.stack)
-            # return self.DFS()
-            nextDir = self.get_direction_djikstra_list()
+            if self.use_dfs:
+                nextDir = self.dfs()
+            else:
+                nextDir = self.get_direction_djikstra_list()
             # self.debug.bprint("nextDir =", nextDir)
         return nextDir
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+
+# Attention: Do not import the ev3dev.ev3 module in this file
+import math
+import random
+from typing import List, Tuple
+
+from planet import Planet, Direction
+
+
+def generate_planet(node_count: int, seed: int = 0, extra_path_chance: float = 0.5, min_weight: int = 1,
+                    max_weight: int = 20, explored: float = 0.0, compact: bool = False, self_loop_chance: float = 0.0,
+                    blocked_chance: float = 0.0, island_share: float = 0.0) -> Planet:
+    """
+    Generates a grid-like planet with node_count nodes
+
+    Every row is connected from west to east and the first column from south to north, so every node is reachable.
+    Additional vertical paths create loops with a probability of extra_path_chance.
+    Optionally a share of the nodes forms an island east of the main grid which is not reachable from it, and
+    unused directions of a node become self-loops or blocked paths.
+
+    Example:
+        generate_planet(100, seed=42)
+    :param node_count: Integer: number of nodes of the planet
+    :param seed: Integer: seed for the random generator, same seed returns the same planet
+    :param extra_path_chance: Float: probability of a path between two vertical neighbours
+    :param min_weight: Integer: minimum weight of a path
+    :param max_weight: Integer: maximum weight of a path
+    :param explored: Float: share of nodes which are already scanned, all other nodes keep unknown paths
+    :param compact: bool: use the CompactPaths storage of Planet
+    :param self_loop_chance: Float: probability of a self-loop between two unused directions of a node
+    :param blocked_chance: Float: probability of a blocked path in an unused direction of a node
+    :param island_share: Float: share of the nodes which belong to the unreachable island
+    :return: Planet
+    """
+    rng = random.Random(seed)
+    planet = Planet(compact)
+    planet.debug.debug_lvl = 0
+    island_count = round(node_count * island_share)
+    nodes = add_grid(planet, rng, node_count - island_count, 0, extra_path_chance, min_weight, max_weight)
+    if island_count:
+        offset = max(x for x, _ in nodes) + 2
+        nodes += add_grid(planet, rng, island_count, offset, extra_path_chance, min_weight, max_weight)
+    if self_loop_chance or blocked_chance:
+        for node in nodes:
+            unused = [dir for dir in Direction if planet.paths[node][dir][2] == -2]
+            if len(unused) >= 2 and rng.random() < self_loop_chance:
+                planet.add_path((node, unused[0]), (node, unused[1]), rng.randint(min_weight, max_weight))
+                unused = unused[2:]
+            if unused and rng.random() < blocked_chance:
+                planet.add_path((node, unused[0]), (node, unused[0]), -1)
+    for node in nodes:
+        if rng.random() < explored:
+            free_dirs = [dir for dir in Direction if planet.paths[node][dir][2] > 0]
+            planet.set_attached_paths(node, free_dirs)
+    return planet
+
+
+def add_grid(planet: Planet, rng: random.Random, node_count: int, offset: int, extra_path_chance: float,
+             min_weight: int, max_weight: int) -> List[Tuple[int, int]]:
+    """
+    Adds a connected grid of node_count nodes starting at (offset, 0) to the planet
+    :return: List of the added nodes
+    """
+    width = max(1, math.ceil(math.sqrt(node_count)))
+    nodes = [(offset + i % width, i // width) for i in range(node_count)]
+    known = set(nodes)
+    for x, y in nodes:
+        if x > offset:
+            weight = rng.randint(min_weight, max_weight)
+            planet.add_path(((x - 1, y), Direction.EAST), ((x, y), Direction.WEST), weight)
+        if y > 0 and (x == offset or rng.random() < extra_path_chance) and (x, y - 1) in known:
+            weight = rng.randint(min_weight, max_weight)
+            planet.add_path(((x, y - 1), Direction.NORTH), ((x, y), Direction.SOUTH), weight)
+    return nodes
+
+
+def simulate_exploration(truth: Planet, start: Tuple[int, int], use_dfs: bool = False, compact: bool = False,
+                         turn_cost: float = 0.0) \
+        -> Tuple[Planet, List[Tuple[Tuple[int, int], Direction]]]:
+    """
+    Explores the planet truth without robot and server, like main.run does node by node
+
+    At every node the attached paths are scanned, the next direction is chosen by the planner and the path is
+    driven, the server answer is taken from truth.
+    :param truth: Planet: planet with all paths known, e.g. from generate_planet
+    :param start: 2-Tuple: start node
+    :param use_dfs: bool: explore with Planet.dfs instead of Planet.get_direction_djikstra_list
+    :param compact: bool: use the CompactPaths storage for the explored planet
+    :param turn_cost: Float: Planet.turn_cost of the explored planet
+    :return: 2-Tuple(explored Planet, all driven paths)
+    """
+    planet = Planet(compact)
+    planet.debug.debug_lvl = 0
+    planet.use_dfs = use_dfs
+    planet.turn_cost = turn_cost
+    planet.set_start(start, Direction.NORTH)
+    driven: List[Tuple[Tuple[int, int], Direction]] = []
+    while True:
+        node = planet.start[0]
+        if node not in planet.paths or not planet.is_known_node(node):
+            # blocked paths look like any other path while scanning
+            seen_dirs = [dir for dir in Direction if truth.paths[node][dir][2] > 0 or truth.paths[node][dir][2] == -1]
+            planet.set_attached_paths(node, seen_dirs)
+        direction = planet.get_next_direction()
+        if direction is None:
+            return planet, driven
+        end_node, end_dir, weight = truth.paths[node][direction]
+        if weight == -1:
+            # the robot turns around in front of the obstacle
+            end_node, end_dir = node, direction
+        planet.add_path((node, direction), (end_node, end_dir), weight)
+        driven.append((node, direction))
+        planet.set_start(end_node, Direction((end_dir + 180) % 360))
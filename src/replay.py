@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+
+# Attention: Do not import the ev3dev.ev3 module in this file
+import argparse
+import json
+import logging
+import statistics
+import time
+from typing import List, Optional, Tuple
+
+import paho.mqtt.client as mqtt
+
+from communication import Communication
+from journal import read_journal
+from planet import Planet, Direction
+
+
+class ReplayClient:
+    """
+    Stand-in for paho.mqtt.client.Client during a replay, the recorded session already contains all answers
+    """
+
+    def __init__(self):
+        self.on_message = None
+        self.on_connect = None
+        self.on_disconnect = None
+
+    def tls_set(self, *args, **kwargs):
+        pass
+
+    def enable_logger(self, *args, **kwargs):
+        pass
+
+    def username_pw_set(self, *args, **kwargs):
+        pass
+
+    def connect(self, *args, **kwargs):
+        pass
+
+    def connect_async(self, *args, **kwargs):
+        self.on_connect(self, None, {}, 0)
+
+    def reconnect_delay_set(self, *args, **kwargs):
+        pass
+
+    def subscribe(self, *args, **kwargs):
+        pass
+
+    def loop_start(self):
+        pass
+
+    def publish(self, topic, payload=None, qos=0):
+        pass
+
+
+class Decision:
+    """
+    Direction chosen at a node during the recorded session and during the replay
+    """
+    __slots__ = ("node", "recorded", "replayed", "recorded_latency", "replay_latency")
+
+    def __init__(self, node: Tuple[int, int], recorded: Optional[int], replayed: Optional[int],
+                 recorded_latency: float, replay_latency: float):
+        """
+        :param node: 2-Tuple: node of the decision
+        :param recorded: Integer: direction of the recorded pathSelect message, None for explorationCompleted
+        :param replayed: Integer: direction returned by Planet.get_next_direction in the replay
+        :param recorded_latency: Float: seconds from the last received message until the robot sent its choice
+        :param replay_latency: Float: seconds get_next_direction needed in the replay
+        """
+        self.node = node
+        self.recorded = recorded
+        self.replayed = replayed
+        self.recorded_latency = recorded_latency
+        self.replay_latency = replay_latency
+
+    @property
+    def same(self) -> bool:
+        return self.recorded == self.replayed
+
+
+def replay(path: str, realtime: bool = False) -> Tuple[Planet, List[Decision]]:
+    """
+    Feeds a session recorded by MessageJournal through Communication.on_message into a new Planet
+
+    Before every pathSelect or explorationCompleted message of the robot, get_next_direction is called and its
+    result is compared to the recorded choice. The recorded choice is applied afterwards, so a different choice does
+    not change the rest of the replay.
+    :param path: String: session file, e.g. logs/messages.log
+    :param realtime: bool: keep the recorded time between the messages, otherwise replay as fast as possible
+    :return: 2-Tuple: replayed planet, decisions in recorded order
+    """
+    planet = Planet()
+    planet.debug.debug_lvl = 0
+    communication = Communication(ReplayClient(), 'replay', logging.getLogger('RoboLab.replay'), planet, tls=False)
+    communication.debug.debug_lvl = 0
+    decisions: List[Decision] = []
+    first_timestamp = None
+    begin = time.monotonic()
+    last_received = None
+    for timestamp, direction, topic, payload in read_journal(path):
+        if first_timestamp is None:
+            first_timestamp = timestamp
+        if realtime:
+            time.sleep(max(0.0, timestamp - first_timestamp - (time.monotonic() - begin)))
+        if direction == "in":
+            message = mqtt.MQTTMessage(topic=topic.encode())
+            message.payload = payload
+            communication.on_message(None, None, message)
+            last_received = timestamp
+        elif direction == "scan":
+            scan = json.loads(payload)
+            planet.set_attached_paths((scan["x"], scan["y"]), [Direction(d) for d in scan["directions"]])
+        elif direction == "out":
+            message = json.loads(payload)
+            if message["type"] not in ("pathSelect", "explorationCompleted") or communication.error_msg_received:
+                continue
+            node = planet.start[0]
+            decision_begin = time.perf_counter()
+            replayed = planet.get_next_direction()
+            replay_latency = time.perf_counter() - decision_begin
+            recorded = None
+            if message["type"] == "pathSelect":
+                recorded = message["payload"]["startDirection"]
+                planet.start = ((message["payload"]["startX"], message["payload"]["startY"]), Direction(recorded))
+            recorded_latency = timestamp - last_received if last_received is not None else 0.0
+            decisions.append(Decision(node, recorded, replayed, recorded_latency, replay_latency))
+    return planet, decisions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Replays a session recorded by the message journal")
+    parser.add_argument("session", help="session file, e.g. logs/messages.log")
+    parser.add_argument("--realtime", action="store_true", help="keep the recorded time between the messages")
+    parser.add_argument("--nodes", action="store_true", help="print every decision")
+    args = parser.parse_args()
+
+    replay_begin = time.perf_counter()
+    _, replay_decisions = replay(args.session, args.realtime)
+    replay_time = time.perf_counter() - replay_begin
+    if args.nodes:
+        print(f"{'node':>12} {'recorded':>8} {'replayed':>8} {'recorded [ms]':>13} {'replay [ms]':>11}")
+        for decision in replay_decisions:
+            print(f"{str(decision.node):>12} {str(decision.recorded):>8} {str(decision.replayed):>8} "
+                  f"{decision.recorded_latency * 1000:>13.1f} {decision.replay_latency * 1000:>11.3f}"
+                  f"{'' if decision.same else '  differs'}")
+    different = [decision for decision in replay_decisions if not decision.same]
+    print(f"{len(replay_decisions)} decisions replayed in {replay_time:.3f} s, {len(different)} differ")
+    if replay_decisions:
+        recorded_latencies = [decision.recorded_latency for decision in replay_decisions]
+        replay_latencies = [decision.replay_latency * 1000 for decision in replay_decisions]
+        print(f"decision latency recorded: median {statistics.median(recorded_latencies):.3f} s, "
+              f"replayed: median {statistics.median(replay_latencies):.3f} ms, max {max(replay_latencies):.3f} ms")
+    if different:
+        raise SystemExit(1)
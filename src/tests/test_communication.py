@@ -1,10 +1,23 @@
 #!/usr/bin/env python3
 
+import json
+import logging
+import os
+import tempfile
 import unittest.mock
 import paho.mqtt.client as mqtt
+import time
 import uuid
 
-from communication import Communication
+from codec import CODEC, encode_message, encode_path, encode_path_select, encode_ready, load_codec
+from communication import Communication, CommunicationError, MESSAGE_FIELDS
+from planet import Direction, Planet
+from planet_generator import generate_planet
+from journal import MessageJournal, close_session, open_session, read_journal, start_queue_logging
+from mothership import LocalClient, LocalMothership, explore, load_planet, save_planet
+from message_schema import MessageError, MessageValidator, load_schema
+from replay import replay
+from benchmark_communication import CorrectingClient, EchoClient, LossyClient, create_communication
 
 
 class TestRoboLabCommunication(unittest.TestCase):
@@ -53,5 +66,378 @@ class TestRoboLabCommunication(unittest.TestCase):
         self.fail('implement me!')
 
 
+class TestCommunicationWaits(unittest.TestCase):
+    def test_echo_ends_wait(self):
+        """
+        This test should check that sending returns as soon as the echo of the message arrived
+        """
+        communication = create_communication(EchoClient(0.01))
+        communication.reply_timeout = 1
+        communication.send_robot_message('{"from": "client", "type": "ready"}', "explorer/217")
+        self.assertFalse(communication.pending[("client", "ready")])
+
+    def test_reply_timeout(self):
+        """
+        This test should check that a missing reply raises an error after the configured timeout
+        """
+        communication = create_communication(unittest.mock.MagicMock())
+        communication.reply_timeout = 0.05
+        with self.assertRaises(CommunicationError):
+            communication.send_robot_message('{"from": "client", "type": "ready"}', "explorer/217")
+
+    def test_handler_error(self):
+        """
+        This test should check that an error of a handler in the paho thread reaches only the thread waiting for the
+        message and does not escape on_message
+        """
+        communication = create_communication(unittest.mock.MagicMock())
+        communication.planet.planet_name = "Test"
+        reply = communication.request_path(((0, 0), Direction.NORTH), ((0, 1), Direction.SOUTH), "free")
+        echo = communication.expect("client", "ready")
+        # Direction has no member 225, handle_path raises ValueError
+        with self.assertLogs(communication.logger, logging.ERROR):
+            deliver(communication, {"from": "server", "type": "path", "payload": {
+                "startX": 0, "startY": 0, "startDirection": 0, "endX": 0, "endY": 1, "endDirection": 45,
+                "pathStatus": "free", "pathWeight": 1}})
+        with self.assertRaises(CommunicationError) as raised:
+            communication.wait_for(reply, "path message")
+        self.assertIsInstance(raised.exception.__cause__, ValueError)
+        self.assertFalse(echo.done())
+
+    def test_quiet_period(self):
+        """
+        This test should check that timeout() sleeps until the correction window is over and records the time
+        """
+        communication = create_communication(EchoClient(0.01))
+        communication.quiet_period = 0.05
+        communication.planet.set_start((1, 2), 0)
+        communication.last_connection_time = time.monotonic()
+        self.assertFalse(communication.is_quiet())
+        communication.timeout()
+        self.assertTrue(communication.is_quiet())
+        self.assertGreaterEqual(communication.quiet_wait_time[(1, 2)], 0.04)
+
+    def test_reply_correlation(self):
+        """
+        This test should check that concurrent requests are resolved by the server message of their own type
+        """
+        communication = create_communication(unittest.mock.MagicMock())
+        communication.planet.planet_name = "Test"
+        path = communication.request_path(((0, 0), 0), ((0, 1), 180), "free")
+        done = communication.request_target_reached()
+        deliver(communication, {"from": "server", "type": "done", "payload": {"message": "Finish"}})
+        self.assertTrue(done.done())
+        self.assertFalse(path.done())
+        deliver(communication, {"from": "server", "type": "path", "payload": {
+            "startX": 0, "startY": 0, "startDirection": 0, "endX": 0, "endY": 1, "endDirection": 180,
+            "pathStatus": "free", "pathWeight": 1}})
+        self.assertEqual(path.result(0)["pathWeight"], 1)
+        self.assertEqual(communication.planet.paths[(0, 0)][0], ((0, 1), 180, 1))
+
+    def test_server_error(self):
+        """
+        This test should check that an error message of the server ends all pending waits
+        """
+        communication = create_communication(unittest.mock.MagicMock())
+        ready = communication.request_ready()
+        deliver(communication, {"from": "debug", "type": "error", "payload": {"message": "wrong"}})
+        self.assertTrue(communication.error_msg_received)
+        self.assertIsNone(communication.wait_for(ready, "planet message"))
+
+    def test_speculate_path_select(self):
+        """
+        This test should check that a speculative path selection resolves with the correction or with None after the
+        correction window, without counting the window as waiting time at the node
+        """
+        for chance, expected in ((1, 90), (0, None)):
+            communication = create_communication(CorrectingClient(0.01, chance))
+            communication.quiet_period = 0.05
+            communication.planet.planet_name = "Test"
+            communication.planet.add_path(((0, 0), 0), ((0, 1), 180), 1)
+            communication.planet.add_path(((0, 0), 90), ((1, 0), 270), 1)
+            correction = communication.speculate_path_select(((0, 0), 0))
+            self.assertFalse(correction.done())
+            result = correction.result(1)
+            self.assertEqual(result if result is None else result["startDirection"], expected)
+            self.assertEqual(communication.planet.start[1], 0 if expected is None else expected)
+            self.assertFalse(communication.pending[("server", "pathSelect")])
+            if expected is None:
+                # the robot drove during the window, it did not wait at the node
+                self.assertEqual(communication.quiet_wait_time, {})
+
+    def test_retry(self):
+        """
+        This test should check that a message without echo is published again after a reconnect, not before
+        """
+        client = LossyClient(0.01, lose=1)
+        communication = create_communication(client)
+        communication.reply_timeout = 1
+        echo = communication.publish("ready", '{"from": "client", "type": "ready"}', "explorer/217")
+        time.sleep(0.05)
+        self.assertEqual(client.published, 1)
+        with unittest.mock.patch.object(communication.logger, "warning"):
+            client.drop_connection(0.01)
+        communication.wait_for(echo, "echo of the sent message")
+        stats = communication.outbox.stats()
+        self.assertEqual((stats["published"], stats["retries"], stats["acknowledged"], stats["queued"]), (2, 1, 1, 0))
+
+    def test_duplicate_echo(self):
+        """
+        This test should check that the second echo of a message published again after a reconnect is dropped
+        instead of resolving the next message of the same type
+        """
+        client = LossyClient(0.05)
+        communication = create_communication(client)
+        communication.reply_timeout = 1
+        first = communication.publish("ready", '{"from": "client", "type": "ready"}', "explorer/217")
+        # reconnect before the echo arrived, both publishes are echoed
+        with unittest.mock.patch.object(communication.logger, "warning"):
+            client.on_disconnect(client, None, 1)
+        client.on_connect(client, None, {}, 0)
+        communication.wait_for(first, "echo of the sent message")
+        second = communication.expect("client", "ready")
+        time.sleep(0.15)
+        self.assertFalse(second.done())
+        self.assertEqual(client.published, 2)
+        self.assertFalse(communication.outbox.duplicates)
+
+    def test_reconnect(self):
+        """
+        This test should check that messages are kept while disconnected and all topics are subscribed again
+        """
+        client = LossyClient(0.01)
+        communication = create_communication(client)
+        communication.reply_timeout = 1
+        communication.subscribe("planet/Test/217")
+        client.subscribe = unittest.mock.MagicMock()
+        with unittest.mock.patch.object(communication.logger, "warning"):
+            client.drop_connection(0.05)
+            communication.send_robot_message('{"from": "client", "type": "ready"}', "explorer/217")
+        client.subscribe.assert_has_calls([unittest.mock.call("explorer/217", qos=1),
+                                           unittest.mock.call("planet/Test/217", qos=1)])
+        self.assertEqual(communication.outbox.stats()["retries"], 0)
+        self.assertEqual(client.published, 1)
+
+    def test_outbox_full(self):
+        """
+        This test should check that the outbound queue is bounded
+        """
+        communication = create_communication(unittest.mock.MagicMock())
+        communication.outbox.max_queued = 2
+        communication.request_ready()
+        communication.request_ready()
+        with self.assertRaises(CommunicationError):
+            communication.request_ready()
+
+    def test_malformed_message(self):
+        """
+        This test should check that a message without a field its handler reads is dropped before the handler runs,
+        only the thread waiting for this message gets an error
+        """
+        communication = create_communication(unittest.mock.MagicMock())
+        ready = communication.request_ready()
+        echo = communication.expect("client", "ready")
+        with self.assertLogs(communication.logger, logging.ERROR):
+            deliver(communication, {"from": "server", "type": "planet", "payload": {"planetName": "Test"}})
+            deliver(communication, {"from": "server", "type": "pathUnveiled", "payload": {"startX": 1}})
+        self.assertEqual(communication.planet.planet_name, "")
+        with self.assertRaises(CommunicationError):
+            communication.wait_for(ready, "planet message")
+        self.assertFalse(echo.done())
+
+    def test_journal(self):
+        """
+        This test should check that sent and received messages are written to the journal by the listener thread
+        """
+        logger = logging.getLogger('RoboLab.test_journal')
+        logger.propagate = False
+        logger.setLevel(logging.INFO)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "messages.log")
+            handler = logging.FileHandler(path)
+            listener = start_queue_logging(logger, handler)
+            communication = create_communication(EchoClient(0.01))
+            communication.journal = MessageJournal(logger)
+            communication.reply_timeout = 1
+            communication.send_robot_message('{"from": "client", "type": "ready"}', "explorer/217")
+            listener.stop()
+            handler.close()
+            logger.handlers.clear()
+            records = list(read_journal(path))
+        self.assertEqual([(direction, topic) for _, direction, topic, _ in records],
+                         [("out", "explorer/217"), ("in", "explorer/217")])
+        self.assertEqual(records[1][3], b'{"from": "client", "type": "ready"}')
+        self.assertLessEqual(records[0][0], records[1][0])
+
+    def test_journal_disabled(self):
+        """
+        This test should check that no record is created if the journal logger discards it
+        """
+        logger = logging.getLogger('RoboLab.test_journal_disabled')
+        logger.setLevel(logging.WARNING)
+        with unittest.mock.patch("journal.JournalEntry") as entry:
+            MessageJournal(logger).record("in", "explorer/217", b"{}")
+        entry.assert_not_called()
+
+
+class TestMessageValidator(unittest.TestCase):
+    def setUp(self):
+        self.validator = MessageValidator(load_schema(), MESSAGE_FIELDS)
+
+    def test_schema(self):
+        """
+        This test should check that the message types and field types are read from schema.json
+        """
+        schema = load_schema()
+        self.assertIn("explorationCompleted", schema["client"][0])
+        self.assertEqual(schema["server"][1]["pathWeight"], int)
+        self.assertEqual(schema["server"][1]["planetName"], str)
+        self.assertIn("adjust", schema["debug"][0])
+
+    def test_validate(self):
+        """
+        This test should check that valid messages pass and malformed ones raise MessageError
+        """
+        self.assertEqual(self.validator.validate({"from": "server", "type": "target",
+                                                  "payload": {"targetX": 1, "targetY": 2}}),
+                         ("server", "target", {"targetX": 1, "targetY": 2}))
+        self.assertEqual(self.validator.validate({"from": "client", "type": "ready"}), ("client", "ready", {}))
+        for message in ([], {"from": "server", "type": "unknown"}, {"type": "ready"},
+                        {"from": "server", "type": "target", "payload": {"targetX": 1}},
+                        {"from": "server", "type": "target", "payload": {"targetX": 1, "targetY": "2"}},
+                        {"from": "server", "type": "done", "payload": []}):
+            with self.assertRaises(MessageError):
+                self.validator.validate(message)
+
+    def test_undefined_field(self):
+        """
+        This test should check that a handler can not require a field schema.json does not define
+        """
+        with self.assertRaises(MessageError):
+            MessageValidator(load_schema(), {("server", "target"): ("targetZ",)})
+
+
+class TestCodec(unittest.TestCase):
+    def test_templates(self):
+        """
+        This test should check that the payload templates encode the same messages as building them as dicts
+        """
+        start = ((-2, 13), Direction.WEST)
+        target = ((0, 14), Direction.SOUTH)
+        self.assertEqual(json.loads(encode_ready()), {"from": "client", "type": "ready"})
+        self.assertEqual(json.loads(encode_path(start, target, "blocked")), {
+            "from": "client", "type": "path", "payload": {
+                "startX": -2, "startY": 13, "startDirection": 270, "endX": 0, "endY": 14, "endDirection": 180,
+                "pathStatus": "blocked"}})
+        self.assertEqual(json.loads(encode_path_select(start)), {
+            "from": "client", "type": "pathSelect", "payload": {"startX": -2, "startY": 13, "startDirection": 270}})
+        self.assertEqual(json.loads(encode_message("targetReached", 'say "hi"')),
+                         {"from": "client", "type": "targetReached", "payload": {"message": 'say "hi"'}})
+        with self.assertRaises(ValueError):
+            encode_path(start, target, "unknown")
+
+    def test_fallback(self):
+        """
+        This test should check that the standard library is used if no fast JSON library is installed
+        """
+        codec = load_codec(("not_installed_json",))
+        self.assertEqual(codec.name, "json")
+        for codec in (codec, CODEC):
+            self.assertEqual(codec.loads(b'{"a": [1, "b"]}'), {"a": [1, "b"]})
+            self.assertEqual(json.loads(codec.dumps({"a": [1, "\u00e4"]})), {"a": [1, "\u00e4"]})
+
+
+class TestLocalMothership(unittest.TestCase):
+    def explore(self, mothership: LocalMothership, latency: float = 0.0,
+                journal: MessageJournal = None) -> Communication:
+        planet = Planet()
+        planet.debug.debug_lvl = 0
+        communication = Communication(LocalClient(mothership, latency), '217', logging.getLogger('RoboLab'), planet,
+                                      reply_timeout=2, quiet_period=0, tls=False, journal=journal)
+        communication.debug.debug_lvl = 0
+        explore(communication, mothership)
+        return communication
+
+    def test_exploration(self):
+        """
+        This test should check that exploring through the local mothership finds every path of the planet, also with
+        corrections, unveiled paths and answers from the network thread
+        """
+        truth = generate_planet(30, seed=3, blocked_chance=0.3, self_loop_chance=0.3)
+        known = {(node, direction): path for node, directions in truth.paths.items()
+                 for direction, path in directions.items() if path[2] > 0 or path[2] == -1}
+        for latency, correction_chance in ((0.0, 0.0), (0.0, 0.3), (0.001, 0.3)):
+            mothership = LocalMothership(truth, "Test", ((0, 0), Direction.NORTH), correction_chance=correction_chance,
+                                         unveil_chance=0.2)
+            communication = self.explore(mothership, latency)
+            self.assertFalse(communication.error_msg_received)
+            self.assertEqual(mothership.received["explorationCompleted"], 1)
+            self.assertEqual(communication.planet.planet_name, "Test")
+            for (node, direction), path in known.items():
+                self.assertEqual(communication.planet.paths[node][direction], path)
+
+    def test_target(self):
+        """
+        This test should check that the exploration ends with targetReached once the target of the server is reached
+        """
+        mothership = LocalMothership(generate_planet(20, seed=1), "Test", ((0, 0), Direction.NORTH), target=(2, 1))
+        communication = self.explore(mothership)
+        self.assertEqual(communication.planet.target, (2, 1))
+        self.assertEqual(communication.planet.start[0], (2, 1))
+        self.assertEqual(mothership.received["targetReached"], 1)
+
+    def test_replay(self):
+        """
+        This test should check that a recorded session replays to the same planet and the same decisions
+        """
+        truth = generate_planet(30, seed=4, blocked_chance=0.3)
+        mothership = LocalMothership(truth, "Test", ((0, 0), Direction.NORTH), correction_chance=0.3,
+                                     unveil_chance=0.2)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "session.log")
+            journal, listener = open_session(path)
+            communication = self.explore(mothership, 0.001, journal)
+            close_session(listener)
+            planet, decisions = replay(path)
+            with open(path) as file:
+                lines = file.readlines()
+            # the robot chose another direction at the first node
+            select = next(i for i, line in enumerate(lines) if '\\"pathSelect\\"' in line and '"out"' in line)
+            lines[select] = lines[select].replace('\\"startDirection\\":0', '\\"startDirection\\":90')
+            with open(path, "w") as file:
+                file.writelines(lines)
+            _, changed = replay(path)
+        self.assertEqual(len(decisions), mothership.received["pathSelect"] + 1)
+        self.assertTrue(all(decision.same for decision in decisions))
+        self.assertIsNone(decisions[-1].recorded)
+        for node, directions in communication.planet.paths.items():
+            self.assertEqual(dict(planet.paths[node]), dict(directions))
+        self.assertFalse(changed[0].same)
+
+    def test_planet_file(self):
+        """
+        This test should check that a saved planet definition loads to the same paths
+        """
+        truth = generate_planet(15, seed=2, blocked_chance=0.5, self_loop_chance=0.5)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "planet.json")
+            save_planet(path, truth, "Test", ((0, 0), Direction.EAST), (1, 1))
+            planet, name, start, target = load_planet(path)
+        self.assertEqual((name, start, target), ("Test", ((0, 0), Direction.EAST), (1, 1)))
+        for node, directions in truth.paths.items():
+            for direction, path in directions.items():
+                if path[2] > 0 or path[2] == -1:
+                    self.assertEqual(planet.paths[node][direction], path)
+
+
+def deliver(communication: Communication, payload: dict):
+    """
+    Passes a message to the communication like the paho network thread does
+    """
+    message = mqtt.MQTTMessage(topic=b"explorer/217")
+    message.payload = json.dumps(payload).encode()
+    communication.on_message(None, None, message)
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+
+import math
+import os
+import tempfile
+import unittest
+
+import odometry
+from benchmark_odometry import create_odometry, generate_ticks
+from odometry import Odometry, OdometryCalibration
+from planet import Direction, Planet
+
+
+class TestStreamingOdometry(unittest.TestCase):
+    def test_same_as_movement_list(self):
+        """
+        This test should check that integrating every sample while driving ends at the same pose as replaying the
+        movement list at the node
+        """
+        ticks = generate_ticks(3000, seed=5)
+        batch = create_odometry()
+        batch.gamma = math.radians(90)
+        batch.calculate_new_position(ticks)
+
+        streaming = create_odometry()
+        streaming.gamma = math.radians(90)
+        streaming.start_path()
+        m1 = m2 = 0
+        for right, left in ticks:
+            m1 += right
+            m2 += left
+            streaming.add_sample(m1, m2)
+        self.assertEqual(streaming.samples, len(ticks))
+        self.assertNotEqual(streaming.pose(), (0, 0, math.radians(90)))
+        streaming.finish_path()
+        self.assertEqual((streaming.posX, streaming.posY, streaming.gamma), (batch.posX, batch.posY, batch.gamma))
+
+    def test_straight(self):
+        """
+        This test should check that driving straight north for one grid unit ends one node further north
+        """
+        odometry = create_odometry()
+        odometry.start_path()
+        # 50 cm with 3 * pi cm per wheel rotation
+        degree = round(50 / (3 * math.pi) * 360)
+        for step in range(1, 101):
+            odometry.add_sample(degree * step // 100, degree * step // 100)
+        odometry.finish_path()
+        self.assertEqual((odometry.posX, odometry.posY, odometry.gamma), (0, 1, Direction.NORTH))
+
+    def test_snap_to_known_node(self):
+        """
+        This test should check that the end of a path is snapped to a known node with an open direction when the pose
+        is closer to an unknown one
+        """
+        planet = Planet()
+        planet.set_attached_paths((2, 1), [Direction.SOUTH, Direction.WEST])
+        odometry = create_odometry()
+        odometry.gamma = math.radians(90)
+        odometry.start_path()
+        # 55 cm east of (1, 1), the robot arrives facing east
+        degree = round(55 / (3 * math.pi) * 360)
+        for step in range(1, 101):
+            odometry.add_sample(degree * step // 100, degree * step // 100)
+        odometry.finish_path(planet.node_grid, ((1, 1), Direction.EAST))
+        self.assertEqual((odometry.posX, odometry.posY, odometry.gamma), (1, 0, Direction.EAST))
+
+
+class TestFixedPointOdometry(unittest.TestCase):
+    def test_within_error_bound(self):
+        """
+        This test should check that the fixed point kernel stays within its documented error bound of calculate_part
+        and ends at the same node
+        """
+        for seed in range(5):
+            ticks = generate_ticks(2000, seed=seed)
+            poses = []
+            for fixed_point in (False, True):
+                odometry = create_odometry(fixed_point)
+                odometry.gamma = 1.0
+                odometry.start_path()
+                m1 = m2 = 0
+                for right, left in ticks + [(40, -45)]:
+                    m1 += right
+                    m2 += left
+                    odometry.add_sample(m1, m2)
+                poses.append(odometry.pose())
+                odometry.finish_path()
+                poses.append((odometry.posX, odometry.posY, odometry.gamma))
+            (x, y, gamma), node, (fixed_x, fixed_y, fixed_gamma), fixed_node = poses
+            driven = sum(abs(right) + abs(left) for right, left in ticks) * odometry.ditance_per_tick(1) / 2
+            self.assertLess(math.hypot(fixed_x - x, fixed_y - y), driven * math.pi / odometry.kernel.STEPS)
+            self.assertAlmostEqual(math.cos(fixed_gamma), math.cos(gamma), places=4)
+            self.assertEqual(fixed_node, node)
+
+
+class TestOdometryCalibration(unittest.TestCase):
+    def drive(self, calibration: OdometryCalibration, seed: int, dist_btw_wheels: float, wheel_circumference: float):
+        """
+        Observes a path of a robot with the given parameters which starts at 0, 0 facing north-east
+        """
+        ticks = generate_ticks(1500, seed=seed)
+        truth = Odometry(math.pi / 4, 0, 0, dist_btw_wheels, wheel_circumference=wheel_circumference)
+        truth.debug.debug_lvl = 0
+        for right, left in ticks:
+            truth.calculate_part(right, left)
+        return calibration.observe([right for right, _ in ticks], [left for _, left in ticks], (0, 0, math.pi / 4),
+                                   (truth.posX, truth.posY, truth.gamma))
+
+    def test_converges(self):
+        """
+        This test should check that the parameters of a robot are found after a few paths
+        """
+        calibration = OdometryCalibration(9.2, 3 * math.pi)
+        for seed in range(15):
+            self.assertTrue(self.drive(calibration, seed, 9.8, 3 * math.pi * 1.04))
+        dist_btw_wheels, wheel_circumference = calibration.parameters()
+        self.assertAlmostEqual(dist_btw_wheels, 9.8, delta=0.05)
+        self.assertAlmostEqual(wheel_circumference, 3 * math.pi * 1.04, delta=0.05)
+        self.assertEqual(calibration.paths, 15)
+
+    def test_same_model_as_calculate_part(self):
+        """
+        This test should check that the fit models a path like calculate_part, so paths integrated by calculate_part
+        keep the true parameters and recover them from the defaults
+        """
+        wheel_circumference = 3 * math.pi * 1.04
+        calibration = OdometryCalibration(9.8, wheel_circumference)
+        for seed in range(5):
+            self.assertTrue(self.drive(calibration, seed, 9.8, wheel_circumference))
+        dist_btw_wheels, circumference = calibration.parameters()
+        self.assertAlmostEqual(dist_btw_wheels, 9.8, delta=1e-9)
+        self.assertAlmostEqual(circumference, wheel_circumference, delta=1e-9)
+
+        calibration = OdometryCalibration()
+        for seed in range(60):
+            self.assertTrue(self.drive(calibration, seed, 9.8, wheel_circumference))
+        dist_btw_wheels, circumference = calibration.parameters()
+        self.assertAlmostEqual(dist_btw_wheels, 9.8, delta=1e-4)
+        self.assertAlmostEqual(circumference, wheel_circumference, delta=1e-4)
+
+    def test_rejected_path(self):
+        """
+        This test should check that a path ending far from the odometry estimate changes neither fit
+        """
+        calibration = OdometryCalibration()
+        ticks = generate_ticks(1500, seed=3)
+        truth = Odometry(0, 0, 0, 9.2)
+        truth.debug.debug_lvl = 0
+        for right, left in ticks:
+            truth.calculate_part(right, left)
+        # same heading, but one grid unit further east, e.g. the robot followed another line
+        self.assertFalse(calibration.observe([right for right, _ in ticks], [left for _, left in ticks], (0, 0, 0),
+                                             (truth.posX + 50, truth.posY, truth.gamma)))
+        self.assertEqual(calibration.parameters(), OdometryCalibration().parameters())
+        self.assertEqual(calibration.paths, 0)
+
+    def test_save_load(self):
+        """
+        This test should check that the fit continues with the state of the last run
+        """
+        calibration = OdometryCalibration()
+        self.drive(calibration, 1, 9.5, 9.7)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "odometry.json")
+            self.assertEqual(OdometryCalibration.load(path).parameters(), OdometryCalibration().parameters())
+            calibration.save(path)
+            loaded = OdometryCalibration.load(path)
+        self.assertEqual(loaded.parameters(), calibration.parameters())
+        self.assertEqual(loaded.paths, 1)
+
+    def test_confirm_path(self):
+        """
+        This test should check that a path confirmed by the server changes the parameters and the fixed point tables
+        """
+        odometry = Odometry(0, 0, 0, 9.2, fixed_point=True, calibration=OdometryCalibration(9.2))
+        odometry.debug.debug_lvl = 0
+        unit = odometry.kernel.unit
+        odometry.start_path()
+        # 90 degree to the left, the wheels are 10 cm apart instead of 9.2
+        degree = round(10 * math.pi / 4 / (3 * math.pi) * 360)
+        for step in range(1, 101):
+            odometry.add_sample(-degree * step // 100, degree * step // 100)
+        odometry.finish_path()
+        odometry.confirm_path(((0, 0), Direction.NORTH), ((0, 0), Direction.EAST))
+        self.assertGreater(odometry.dist_btw_wheels, 9.2)
+        self.assertLess(odometry.kernel.unit, unit)
+        self.assertEqual(len(odometry.right_ticks), 0)
+
+
+@unittest.skipIf(odometry.numpy is None, "numpy is not installed")
+class TestBatchOdometry(unittest.TestCase):
+    def test_same_as_calculate_part(self):
+        """
+        This test should check that calculate_parts computes the same poses as calculate_part sample by sample
+        """
+        ticks = generate_ticks(5000, seed=7) + [(3, 3), (0, 0), (-2, 2)]
+        scalar = create_odometry()
+        scalar.gamma = 2.5
+        poses = []
+        for right, left in ticks:
+            scalar.calculate_part(right, left)
+            poses.append((scalar.posX, scalar.posY, scalar.gamma))
+
+        batch = create_odometry()
+        batch.gamma = 2.5
+        x, y, gamma = batch.calculate_parts([right for right, _ in ticks], [left for _, left in ticks])
+        for i, (pose_x, pose_y, pose_gamma) in enumerate(poses):
+            self.assertAlmostEqual(x[i], pose_x, places=9)
+            self.assertAlmostEqual(y[i], pose_y, places=9)
+            self.assertAlmostEqual(math.cos(gamma[i]), math.cos(pose_gamma), places=9)
+        self.assertAlmostEqual(batch.posX, scalar.posX, places=9)
+        self.assertAlmostEqual(batch.gamma, scalar.gamma, places=9)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -3,6 +3,8 @@
 import unittest
 from pprint import pprint
 from planet import Direction, Planet
+from planet_generator import generate_planet, simulate_exploration
+from benchmark import shortest_path_linear, route_weight, direction_frontier_per_node, explored_start_nodes
 from typing import List, Tuple, Dict, Union
 
 
@@ -183,6 +185,186 @@ class TestRoboLabPlanet(unittest.TestCase):
         """
         assert self.planet.shortest_path([0, 0], [5, 5]) == 0, "s.p.a.: target is unreachable"
 
+    def test_shortest_path_tutor(self):
+        """
+        This test should check that the heap based shortest path returns the cheapest route and the first direction of
+        equally weighted parallel paths
+        """
+        self.assertEqual(self.planet.shortest_path_tutor((0, 0), (1, 1)),
+                         [((0, 0), Direction.NORTH), ((0, 1), Direction.NORTH)])
+        self.assertEqual(self.planet.shortest_path_tutor((1, 1), (2, 1)), [((1, 1), Direction.NORTH)])
+        self.assertEqual(self.planet.shortest_path_tutor((0, 0), (0, 0)), [])
+
+    def test_shortest_path_tutor_generated(self):
+        """
+        This test should check that the heap based shortest path returns the same routes as the linear tutor version
+        """
+        planet = generate_planet(200, seed=1)
+        nodes = list(planet.paths)
+        for start, target in zip(nodes[::7], nodes[::-5]):
+            self.assertEqual(planet.shortest_path_tutor(start, target), shortest_path_linear(planet, start, target))
+
+    def test_direction_djikstra_list_generated(self):
+        """
+        This test should check that the single frontier search chooses the same direction as one search per node
+        """
+        planet = generate_planet(300, seed=2, explored=0.5)
+        for node in explored_start_nodes(planet, 20, seed=2):
+            planet.set_start(node, Direction.NORTH)
+            self.assertEqual(planet.get_direction_djikstra_list(), direction_frontier_per_node(planet))
+
+    def test_path_index(self):
+        """
+        This test should check that the path getters are read-only and follow later changes of the planet
+        """
+        paths = self.planet.get_paths()
+        unknown = self.planet.get_paths_detected_unknown()
+        self.assertEqual(unknown[(2, 1)], {Direction.SOUTH: ((2, 1), Direction.SOUTH, 0)})
+        with self.assertRaises(TypeError):
+            paths[(5, 5)] = {}
+
+        self.planet.add_path(((2, 1), Direction.SOUTH), ((3, 3), Direction.NORTH), 5)
+        self.assertEqual(paths[(2, 1)][Direction.SOUTH], ((3, 3), Direction.NORTH, 5))
+        self.assertEqual(list(paths[(3, 3)]), [Direction.NORTH, Direction.EAST])
+        self.assertNotIn((2, 1), unknown)
+        self.assertEqual(self.planet.get_paths_free_blocked_detected()[(2, 1)], paths[(2, 1)])
+
+    def test_stack(self):
+        """
+        This test should check that the stack contains every unexplored path once and drops known paths
+        """
+        planet = Planet()
+        planet.add_node((0, 0))
+        planet.add_node((0, 0))
+        self.assertEqual(len(planet.stack), 4)
+        planet.add_path(((0, 0), Direction.NORTH), ((0, 1), Direction.SOUTH), 2)
+        self.assertNotIn(((0, 0), Direction.NORTH), planet.stack)
+        self.assertNotIn(((0, 1), Direction.SOUTH), planet.stack)
+        planet.set_attached_paths((0, 1), [Direction.SOUTH, Direction.EAST])
+        self.assertEqual(list(planet.stack.latest())[0], ((0, 1), Direction.EAST))
+
+    def test_dfs_generated(self):
+        """
+        This test should check that the dfs exploration discovers every path of a planet
+        """
+        truth = generate_planet(150, seed=3)
+        planet, _ = simulate_exploration(truth, (0, 0), use_dfs=True)
+        self.assertEqual(planet.get_paths(), truth.get_paths())
+        self.assertEqual(len(planet.stack), 0)
+
+    def test_route_cache(self):
+        """
+        This test should check that routes and their suffixes are reused until a path weight changes
+        """
+        self.planet.target = (2, 1)
+        self.planet.start = ((0, 0), Direction.NORTH)
+        self.assertEqual(self.planet.get_next_direction(), Direction.NORTH)
+        self.planet.set_start_coord((0, 1))
+        self.assertEqual(self.planet.get_next_direction(), Direction.NORTH)
+        self.assertEqual((self.planet.route_cache_hits, self.planet.route_cache_misses), (1, 1))
+
+        # a known path does not change the version, a new free path does
+        self.planet.add_path(((0, 1), Direction.NORTH), ((1, 1), Direction.SOUTH), 3)
+        self.assertEqual(self.planet.shortest_path_cached((0, 1), (2, 1)),
+                         [((0, 1), Direction.NORTH), ((1, 1), Direction.NORTH)])
+        self.assertEqual(self.planet.route_cache_hits, 2)
+        self.planet.add_path(((2, 1), Direction.SOUTH), ((3, 3), Direction.NORTH), 1)
+        self.assertEqual(self.planet.shortest_path_cached((0, 1), (3, 3)),
+                         [((0, 1), Direction.NORTH), ((1, 1), Direction.NORTH), ((2, 1), Direction.SOUTH)])
+        self.assertEqual(self.planet.route_cache_misses, 2)
+
+    def test_compact_paths(self):
+        """
+        This test should check that a planet with CompactPaths storage behaves like a planet with dict storage
+        """
+        truth = generate_planet(150, seed=4)
+        planet, driven = simulate_exploration(truth, (0, 0))
+        compact_planet, compact_driven = simulate_exploration(truth, (0, 0), compact=True)
+        self.assertEqual(compact_driven, driven)
+        self.assertEqual({node: dict(paths) for node, paths in compact_planet.paths.items()}, planet.paths)
+        self.assertEqual(compact_planet.get_paths(), planet.get_paths())
+        self.assertEqual(compact_planet.get_paths_free_blocked_detected(), planet.get_paths_free_blocked_detected())
+
+    def test_shortest_path_astar(self):
+        """
+        This test should check that A* returns routes as short as Dijkstra and falls back without a known scale
+        """
+        self.assertEqual(self.planet.shortest_path((0, 0), (2, 1), "astar"),
+                         [((0, 0), Direction.NORTH), ((0, 1), Direction.NORTH), ((1, 1), Direction.NORTH)])
+        self.assertIsNone(self.planet.shortest_path((0, 0), (3, 4), "astar"))
+
+        planet = generate_planet(400, seed=5, min_weight=10)
+        nodes = list(planet.paths)
+        for start, target in zip(nodes[::9], nodes[::-11]):
+            self.assertEqual(route_weight(planet, planet.shortest_path(start, target, "astar")),
+                             route_weight(planet, planet.shortest_path(start, target, "tutor")))
+
+        planet = Planet()
+        planet.add_path(((0, 0), Direction.NORTH), ((0, 0), Direction.WEST), 1)
+        self.assertIsNone(planet.min_weight_per_unit)
+        self.assertEqual(planet.shortest_path((0, 0), (0, 0), "astar"), [])
+
+    def test_shortest_path_bidirectional(self):
+        """
+        This test should check that the bidirectional search returns routes as short as Dijkstra, also with self-loops
+        """
+        self.planet.add_path(((2, 1), Direction.SOUTH), ((2, 1), Direction.SOUTH), 1)
+        self.assertEqual(self.planet.shortest_path((0, 0), (2, 1), "bidirectional"),
+                         [((0, 0), Direction.NORTH), ((0, 1), Direction.NORTH), ((1, 1), Direction.NORTH)])
+        self.assertEqual(self.planet.shortest_path((2, 1), (0, 1), "bidirectional"),
+                         [((2, 1), Direction.EAST), ((1, 1), Direction.SOUTH)])
+        self.assertIsNone(self.planet.shortest_path((0, 0), (3, 4), "bidirectional"))
+
+        planet = Planet()
+        planet.add_path(((0, 3), Direction.NORTH), ((0, 3), Direction.WEST), 1)
+        planet.add_path(((0, 3), Direction.EAST), ((1, 3), Direction.WEST), 2)
+        self.assertEqual(planet.shortest_path((0, 3), (1, 3), "bidirectional"), [((0, 3), Direction.EAST)])
+
+        planet = generate_planet(400, seed=6)
+        nodes = list(planet.paths)
+        for start, target in zip(nodes[::9], nodes[::-11]):
+            self.assertEqual(route_weight(planet, planet.shortest_path(start, target, "bidirectional")),
+                             route_weight(planet, planet.shortest_path(start, target, "tutor")))
+
+    def test_shortest_path_turns(self):
+        """
+        This test should check that turn costs prefer a longer route with fewer turns
+        """
+        planet = Planet()
+        planet.add_path(((0, 0), Direction.NORTH), ((0, 1), Direction.SOUTH), 2)
+        planet.add_path(((0, 1), Direction.EAST), ((1, 1), Direction.WEST), 2)
+        planet.add_path(((0, 0), Direction.EAST), ((1, 0), Direction.WEST), 1)
+        planet.add_path(((1, 0), Direction.NORTH), ((1, 1), Direction.SOUTH), 1)
+        planet.set_start((0, 0), Direction.NORTH)
+        self.assertEqual(planet.shortest_path((0, 0), (1, 1), "turns"),
+                         [((0, 0), Direction.EAST), ((1, 0), Direction.NORTH)])
+
+        planet.turn_cost = 1
+        self.assertEqual(planet.shortest_path((0, 0), (1, 1), "turns"),
+                         [((0, 0), Direction.NORTH), ((0, 1), Direction.EAST)])
+        planet.target = (1, 1)
+        self.assertEqual(planet.get_next_direction(), Direction.NORTH)
+        planet.set_start((0, 1), Direction.NORTH)
+        self.assertEqual(planet.get_next_direction(), Direction.EAST)
+        self.assertEqual(planet.route_cache_hits, 1)
+
+    def test_generate_planet(self):
+        """
+        This test should check that generated planets are reproducible and contain self-loops, blocked paths and an
+        unreachable island
+        """
+        planet = generate_planet(200, seed=7, self_loop_chance=0.3, blocked_chance=0.3, island_share=0.1)
+        self.assertEqual(planet.paths, generate_planet(200, seed=7, self_loop_chance=0.3, blocked_chance=0.3,
+                                                       island_share=0.1).paths)
+        paths = [(node, path) for node in planet.paths for path in planet.paths[node].values()]
+        self.assertTrue(any(node == path[0] and path[2] > 0 for node, path in paths), "no self-loop")
+        self.assertTrue(any(path[2] == -1 for _, path in paths), "no blocked path")
+        island = max(planet.paths)
+        self.assertIsNone(planet.shortest_path_tutor((0, 0), island))
+
+        explored, _ = simulate_exploration(planet, (0, 0))
+        self.assertEqual(len(explored.paths), 180)
+
     def test_exploration_completed_unreached_node(self):
         """
 
@@ -196,5 +378,35 @@ class TestRoboLabPlanet(unittest.TestCase):
         # pprint(self.planet.paths)
         self.assertIsNone(self.planet.get_direction_djikstra_list(), "Fail!")
 
+    def test_frontier_bounded(self):
+        """
+        This test should check that discarding paths keeps the LIFO index of the frontier small
+        """
+        planet = Planet()
+        for x in range(100):
+            planet.set_attached_paths((x, 0), [Direction.NORTH, Direction.EAST, Direction.SOUTH, Direction.WEST])
+            for direction in Direction:
+                planet.stack.discard(((x, 0), direction))
+        self.assertEqual(len(planet.stack), 0)
+        self.assertLessEqual(len(planet.stack.lifo), 16)
+
+    def test_node_grid(self):
+        """
+        This test should check that the node grid follows the paths of the planet and snaps a pose to a node whose
+        direction is still open instead of the closest one
+        """
+        planet = Planet()
+        planet.set_attached_paths((0, 0), [Direction.NORTH, Direction.EAST])
+        planet.set_attached_paths((1, 1), [Direction.WEST, Direction.SOUTH])
+        planet.add_path(((0, 0), Direction.EAST), ((1, 1), Direction.SOUTH), 3)
+        self.assertEqual(planet.node_grid.open_directions((1, 1)), [Direction.WEST])
+        self.assertEqual(planet.node_grid.open_directions((5, 5)), list(Direction))
+
+        # rounded to (1, 1) from the south, but only its west direction is open
+        self.assertEqual(planet.node_grid.snap(0.8, 0.9, 40, exclude=((0, 0), Direction.NORTH)),
+                         ((1, 1), Direction.WEST))
+        # no known node around, rounded
+        self.assertEqual(planet.node_grid.snap(4.1, 3.8, 93), ((4, 4), Direction.WEST))
+
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file